@@ -6,19 +6,26 @@ from cached_property import cached_property
 
 from tracelog import TRACELOG
 from .bead import UnpackableBead
+from . import catalog
+from . import chunk_store
+from . import local_cache
 from . import meta
+from . import summary
 from . import tech
 
-from .ziparchive import ZipArchive
 from .exceptions import InvalidArchive
+from .ziparchive import VERIFY_FULL
 
 persistence = tech.persistence
 
 __all__ = ('Archive', 'InvalidArchive')
 
 
-CACHE_CONTENT_ID = 'content_id'
-CACHE_INPUT_MAP = 'input_map'
+CACHE_CONTENT_ID = summary.CONTENT_ID
+CACHE_INPUT_MAP = summary.INPUT_MAP
+
+# all keys in a fully populated cache
+CACHE_KEYS = summary.KEYS
 
 
 def _cached_zip_attribute(cache_key: str, ziparchive_attribute):
@@ -36,37 +43,64 @@ def _cached_zip_attribute(cache_key: str, ziparchive_attribute):
 
 
 class Archive(UnpackableBead):
-    def __init__(self, filename, box_name=''):
+    '''
+    Bead archive file with lazily loaded metadata.
+
+    Creating an Archive does no I/O: metadata is read on first access,
+    from the cache (box catalog or .xmeta file) or the summary in the archive comment
+    if available, otherwise from the zip.
+    Invalid archives raise InvalidArchive only when their metadata is accessed.
+    '''
+
+    def __init__(self, filename, box_name='', cache=None):
         self.archive_filename = filename
         self.archive_path = pathlib.Path(filename)
         self.box_name = box_name
         self.name = bead_name_from_file_path(filename)
-        self.cache = {}
-        self.load_cache()
+        # None: not loaded yet
+        # otherwise already known metadata, e.g. from a box index
+        self._cache = None if cache is None else dict(cache)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = {}
+            self.load_cache()
+        return self._cache
 
-        # Check that we can get access to metadata
-        #  - either through the cache or through the archive
-        # The resulting archive can still be invalid and die unexpectedly later with
-        # InvalidArchive exception, as these are potentially cached values
-        self.meta_version
-        self.freeze_time
-        self.kind
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
 
     def load_cache(self):
+        cache = catalog.lookup(self.archive_filename, self.name)
+        if cache is not None:
+            self.cache = cache
+            return
         try:
-            try:
-                self.cache = persistence.loads(self.cache_path.read_text())
-            except persistence.ReadError:
-                TRACELOG(f"Ignoring existing, malformed bead meta cache {self.cache_path}")
+            self.cache = _read_cache(self.cache_path)
         except FileNotFoundError:
             pass
+        if not self._cache:
+            # reading the end of the archive is still much cheaper than opening it
+            self.cache = summary.read(self.archive_filename) or {}
 
     def save_cache(self):
         try:
-            self.cache_path.write_text(persistence.dumps(self.cache))
+            self.cache_path.write_text(persistence.dumps(self.populate_cache()))
         except FileNotFoundError:
             pass
 
+    def populate_cache(self):
+        '''
+        Make sure, that all CACHE_KEYS are cached and return the cache.
+
+        The archive is opened only if something is missing from the cache.
+        '''
+        if not all(key in self.cache for key in CACHE_KEYS):
+            self.ziparchive
+        return self.cache
+
     @property
     def cache_path(self):
         if self.archive_path.suffix != '.zip':
@@ -93,12 +127,37 @@ class Archive(UnpackableBead):
 
     @cached_property
     def ziparchive(self):
-        ziparchive = ZipArchive(self.archive_filename, self.box_name)
+        ziparchive = chunk_store.open_ziparchive(self.archive_filename, self.box_name)
 
         self._check_and_populate_cache(ziparchive)
 
         return ziparchive
 
+    @cached_property
+    def data_ziparchive(self):
+        '''
+        Zip archive to extract content from - a local copy, if the local archive cache is enabled.
+
+        The archive itself is opened for its content_id (reading only its metadata),
+        so a stale cache can not select the copy of another archive.
+        '''
+        archive_cache = local_cache.from_environment()
+        if archive_cache is None:
+            return self.ziparchive
+        content_id = self.ziparchive.content_id
+        filename = archive_cache.fetch(content_id, self.archive_filename)
+        if filename == self.archive_filename:
+            return self.ziparchive
+        try:
+            ziparchive = chunk_store.open_ziparchive(
+                filename, self.box_name, self.archive_filename)
+            self._check_and_populate_cache(ziparchive)
+            return ziparchive
+        except InvalidArchive:
+            TRACELOG(f'Damaged cached copy {filename} of {self.archive_filename} - removed')
+            local_cache.discard(filename)
+            return self.ziparchive
+
     def _check_and_populate_cache(self, ziparchive):
         def ensure(cache_key, value):
             try:
@@ -117,8 +176,8 @@ class Archive(UnpackableBead):
         # need not match
         self.cache.setdefault(CACHE_INPUT_MAP, ziparchive.input_map)
 
-    def validate(self):
-        self.ziparchive.validate()
+    def validate(self, max_workers=None, mode=VERIFY_FULL):
+        self.ziparchive.validate(max_workers, mode)
 
     @property
     def inputs(self):
@@ -128,22 +187,85 @@ class Archive(UnpackableBead):
             return self.ziparchive.inputs
 
     def extract_dir(self, zip_dir, fs_dir):
-        return self.ziparchive.extract_dir(zip_dir, fs_dir)
+        return self.data_ziparchive.extract_dir(zip_dir, fs_dir)
 
     def extract_file(self, zip_path, fs_path):
-        return self.ziparchive.extract_file(zip_path, fs_path)
+        return self.data_ziparchive.extract_file(zip_path, fs_path)
+
+    def validate_and_unpack_data_to(self, fs_dir, max_workers=None):
+        ziparchive = self.data_ziparchive
+        try:
+            ziparchive.validate_and_unpack_data_to(fs_dir, max_workers)
+        except InvalidArchive:
+            if ziparchive is self.ziparchive:
+                raise
+            # the copy has the content_id of the archive, but damaged content
+            TRACELOG(f'Damaged cached copy {ziparchive.archive_filename} - removed')
+            local_cache.discard(ziparchive.archive_filename)
+            self.data_ziparchive = self.ziparchive
+            self.ziparchive.validate_and_unpack_data_to(fs_dir, max_workers)
 
     def unpack_code_to(self, fs_dir):
-        self.ziparchive.unpack_code_to(fs_dir)
+        self.data_ziparchive.unpack_code_to(fs_dir)
 
     def unpack_data_to(self, fs_dir):
-        self.ziparchive.unpack_data_to(fs_dir)
+        self.data_ziparchive.unpack_data_to(fs_dir)
 
     def unpack_meta_to(self, workspace):
         workspace.meta = self.ziparchive.meta
         workspace.input_map = self.input_map
 
 
+# outcomes of refresh_xmeta
+XMETA_CREATED = 'created'
+XMETA_REGENERATED = 'regenerated'
+XMETA_UP_TO_DATE = 'up to date'
+XMETA_INVALID_ARCHIVE = 'invalid archive'
+
+
+def refresh_xmeta(archive_filename) -> str:
+    '''
+    Create missing, complete partial or regenerate stale .xmeta file for an archive.
+
+    The cache is checked against the archive (see Archive._check_and_populate_cache).
+    The input map of an existing cache is kept, as it is allowed to differ from the archive's.
+
+    Returns one of the XMETA_* outcomes.
+    '''
+    cache = _read_cache(pathlib.Path(archive_filename).with_suffix('.xmeta'))
+    try:
+        try:
+            archive = Archive(archive_filename, cache=cache)
+            archive.ziparchive
+        except InvalidArchive:
+            if not cache:
+                raise
+            # stale or disagreeing cache
+            archive = Archive(archive_filename, cache={})
+            archive.populate_cache()
+            if CACHE_INPUT_MAP in cache:
+                archive.cache[CACHE_INPUT_MAP] = cache[CACHE_INPUT_MAP]
+            archive.save_cache()
+            return XMETA_REGENERATED
+    except InvalidArchive:
+        return XMETA_INVALID_ARCHIVE
+
+    if archive.cache == cache:
+        return XMETA_UP_TO_DATE
+    archive.save_cache()
+    return XMETA_REGENERATED if cache else XMETA_CREATED
+
+
+def _read_cache(cache_path: pathlib.Path):
+    try:
+        return persistence.loads(cache_path.read_text())
+    except persistence.ReadError:
+        TRACELOG(f"Ignoring existing, malformed bead meta cache {cache_path}")
+    except FileNotFoundError:
+        pass
+    return {}
+
+
 def bead_name_from_file_path(path):
     '''
     Parse bead name from a file path.
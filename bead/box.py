@@ -14,21 +14,34 @@ Boxes can be used to:
   (this is naive access control, but could work)
 '''
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 from glob import iglob, escape as glob_escape
+import itertools
 import os
-from typing import Iterator, Iterable, Sequence
-
-from .archive import Archive, InvalidArchive
+from time import monotonic
+from typing import Callable, Dict, Iterator, Iterable, List, Optional, Sequence, Tuple
+import zipfile
+
+from cached_property import cached_property
+
+from tracelog import TRACELOG
+from .archive import Archive, InvalidArchive, CACHE_KEYS, bead_name_from_file_path
+from .box_index import BoxIndex, scan_bead
+from . import catalog
+from . import chunk_store
+from .chunk_store import ChunkStore
+from . import signature
+from .journal import Journal
+from . import journal as journal_record
+from . import layouts
 from . import spec as bead_spec
 from .tech.timestamp import time_from_timestamp
 from .import tech
 Path = tech.fs.Path
 
 
-# private and specific to Box implementation, when Box gains more power,
-# it should change how it handles queries (e.g. using BEAD_NAME, KIND,
-# or CONTENT_ID directly through an index)
+# in-memory filtering of archives, used when the BoxIndex can not be stored in the box
 
 
 def _make_checkers():
@@ -56,11 +69,23 @@ def _make_checkers():
 
 _CHECKERS = _make_checkers()
 
+# relative cost of checks on a lazy Archive:
+# the name comes from the file name, other attributes from the cache or the zip
+_CHECK_COSTS = {
+    bead_spec.BEAD_NAME:  0,
+    bead_spec.KIND:       1,
+    bead_spec.CONTENT_ID: 1,
+}
+
 
 def compile_conditions(conditions):
     '''
     Compile list of (check-type, check-param)-s into a match function.
+
+    Cheaper checks are done first, so non-matching archives are rejected
+    with the least I/O.
     '''
+    conditions = sorted(conditions, key=lambda condition: _CHECK_COSTS[condition[0]])
     checkers = [_CHECKERS[check_type](check_param) for check_type, check_param in conditions]
 
     def match(bead):
@@ -71,6 +96,27 @@ def compile_conditions(conditions):
     return match
 
 
+# box directory layouts
+# all archives are directly in the box directory
+FLAT = 'flat'
+# archives are in per bead name subdirectories: <box>/<name>/<name>_<timestamp>.zip
+# queries by bead name need to list only the directory of that name
+BY_NAME = 'by-name'
+LAYOUTS = (FLAT, BY_NAME)
+
+# box storage modes
+# archives are standard zip files
+ZIP = 'zip'
+# new archives are stored thin, their content is in the box's chunk store, see bead.chunk_store
+CHUNKED = 'chunked'
+STORAGES = (ZIP, CHUNKED)
+
+
+# number of threads opening archives - on network file systems
+# more parallel requests can hide latency
+LOAD_WORKERS = int(os.environ.get('BEAD_LOAD_WORKERS', 8))
+
+
 ARCHIVE_COMMENT = '''
 This file is a BEAD zip archive.
 
@@ -104,9 +150,14 @@ class Box:
     Store Beads.
     """
 
-    def __init__(self, name=None, location=None):
+    # the box is a local (or mounted) directory, see also HttpBox
+    is_local = True
+
+    def __init__(self, name=None, location=None, timeout=None):
         self.location = location
         self.name = name
+        # seconds to wait for answers from this box when querying more boxes, None: no limit
+        self.timeout = timeout
 
     @property
     def directory(self):
@@ -117,58 +168,315 @@ class Box:
         '''
         return Path(self.location)
 
+    @cached_property
+    def journal(self):
+        return Journal(self.directory / layouts.Box.JOURNAL)
+
+    @cached_property
+    def index(self):
+        return BoxIndex(self.directory, self.name, self.journal, sharded=self.sharded)
+
+    @cached_property
+    def layout(self) -> str:
+        '''
+        Directory layout of the box, one of LAYOUTS, FLAT if not marked otherwise.
+        '''
+        try:
+            layout = tech.fs.read_file(self.directory / layouts.Box.LAYOUT).strip()
+        except FileNotFoundError:
+            return FLAT
+        if layout not in LAYOUTS:
+            # sharded scans see top level archives as well
+            TRACELOG(f'Unknown layout {layout!r} of box {self.name} - assuming {BY_NAME}')
+            return BY_NAME
+        return layout
+
+    @cached_property
+    def storage(self) -> str:
+        '''
+        Storage mode for new archives, one of STORAGES, ZIP if not marked otherwise.
+        '''
+        try:
+            storage = tech.fs.read_file(self.directory / layouts.Box.STORAGE).strip()
+        except FileNotFoundError:
+            return ZIP
+        if storage not in STORAGES:
+            TRACELOG(f'Unknown storage {storage!r} of box {self.name} - assuming {ZIP}')
+            return ZIP
+        return storage
+
+    @cached_property
+    def chunk_store(self) -> ChunkStore:
+        return ChunkStore(self.directory / layouts.Box.CHUNKS)
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout != FLAT
+
+    def _archive_directory(self, name) -> Path:
+        '''
+        Directory for the archives of bead `name`.
+        '''
+        if self.sharded:
+            return self.directory / name
+        return self.directory
+
+    def _file_name(self, path) -> Path:
+        '''
+        Path of an archive relative to the box directory - as known by the index.
+        '''
+        return Path(os.path.relpath(path, self.directory))
+
+    def archive_paths(self) -> List[Path]:
+        '''
+        Paths of all potential archive files in this Box - without opening them.
+        '''
+        return [
+            self.directory / file_name
+            for file_name in sorted(signature.scan(self.directory, self.sharded))]
+
     def find_bead(self, name, content_id):
+        if not self.index.may_contain(content_id):
+            return None
         query = ((bead_spec.BEAD_NAME, name), (bead_spec.CONTENT_ID, content_id))
         for bead in self._beads(query):
             return bead
 
-    def all_beads(self) -> Iterator[Archive]:
+    def all_beads(self, max_workers=None, ordered=True) -> Iterator[Archive]:
         '''
         Iterator for all beads in this Box
+
+        New or changed archives are opened by `max_workers` threads
+        (default: LOAD_WORKERS).
+        With ordered=False the beads are not sorted by file name.
         '''
-        return iter(self._beads([]))
+        return iter(self._beads([], max_workers=max_workers, ordered=ordered))
 
-    def _beads(self, conditions) -> Iterable[Archive]:
+    def _beads(self, conditions, max_workers=None, ordered=True) -> Iterable[Archive]:
         '''
         Retrieve matching beads.
         '''
-        match = compile_conditions(conditions)
-
         bead_names = set(
             value
             for tag, value in conditions
             if tag == bead_spec.BEAD_NAME)
-        if bead_names:
-            if len(bead_names) > 1:
-                # easy path: names disagree
-                return []
-            # beadname_20170615T075813302092+0200.zip
-            glob = bead_names.pop() + '_????????T????????????[-+]????.zip'
-        else:
-            glob = '*'
+        if len(bead_names) > 1:
+            # easy path: names disagree
+            return []
+
+        if not self.index.is_persistent:
+            # nothing to remember all archives in - open only the matching ones
+            if self.sharded and bead_names:
+                name, = bead_names
+                paths = [
+                    self.directory / file_name
+                    for file_name in sorted(scan_bead(self.directory, name))]
+            else:
+                paths = self.archive_paths()
+            return self._archives_from(
+                paths, max_workers=max_workers, ordered=ordered,
+                match=compile_conditions(conditions))
+
+        def load_archives(paths):
+            return self._archives_from(paths, max_workers=max_workers, ordered=ordered)
+        return self.index.beads(conditions, load_archives, ordered=ordered)
 
-        paths = iglob(Path(glob_escape(self.directory)) / glob)
-        beads = self._archives_from(paths)
-        candidates = (bead for bead in beads if match(bead))
-        return candidates
+    def _archives_from(self, paths, max_workers=None, ordered=True, match=None):
+        '''
+        Open archives with their metadata fully loaded, skipping invalid ones.
 
-    def _archives_from(self, paths):
-        for path in paths:
+        With `match`, archives not matching are skipped - before loading their metadata,
+        if possible.
+        '''
+        def load(path):
             try:
                 archive = Archive(path, self.name)
-            except InvalidArchive:
-                # TODO: log/report problem
-                pass
-            else:
-                yield archive
+                if match is not None and not match(archive):
+                    return None
+                archive.populate_cache()
+                return archive
+            except InvalidArchive as e:
+                TRACELOG(f'Invalid archive {path}: {e!r}')
+                return None
+
+        if max_workers is None:
+            max_workers = LOAD_WORKERS
+        archives = tech.parallel.map_bounded(load, paths, max_workers, ordered)
+        return (archive for archive in archives if archive is not None)
 
     def store(self, workspace, freeze_time):
         # -> Bead
-        zipfilename = (
-            self.directory / f'{workspace.name}_{freeze_time}.zip')
-        workspace.pack(zipfilename, freeze_time=freeze_time, comment=ARCHIVE_COMMENT)
+        directory = self._archive_directory(workspace.name)
+        tech.fs.ensure_directory(directory)
+        zipfilename = directory / f'{workspace.name}_{freeze_time}.zip'
+        if self.storage == CHUNKED:
+            with tech.fs.temp_dir(self.directory / layouts.Box.META) as temp_dir:
+                packed = temp_dir / os.path.basename(zipfilename)
+                workspace.pack(packed, freeze_time=freeze_time, comment=ARCHIVE_COMMENT)
+                chunk_store.thin_archive(packed, zipfilename, self.chunk_store)
+        else:
+            workspace.pack(zipfilename, freeze_time=freeze_time, comment=ARCHIVE_COMMENT)
+        self._journal_stored(zipfilename)
         return zipfilename
 
+    def _journal_stored(self, zipfilename):
+        archive = Archive(zipfilename, self.name)
+        stat = os.stat(zipfilename)
+        record = dict(archive.populate_cache())
+        record.update({
+            journal_record.FILE_NAME: self._file_name(zipfilename),
+            journal_record.NAME: archive.name,
+            journal_record.SIZE: stat.st_size,
+            journal_record.MTIME: stat.st_mtime_ns,
+        })
+        try:
+            self.journal.append(record)
+        except OSError as e:
+            # the bead is stored, it is just harder to discover
+            TRACELOG(f'Could not append to journal {self.journal.path}: {e}')
+
+    def beads_since(self, offset=0) -> Tuple[List[Archive], int]:
+        '''
+        Beads stored since journal offset, and the offset to continue from.
+
+        Beads already removed from the box are skipped.
+        '''
+        records, offset = self.journal.read(offset)
+        beads = []
+        for record in records:
+            path = self.directory / record[journal_record.FILE_NAME]
+            if os.path.exists(path):
+                cache = {key: record[key] for key in CACHE_KEYS}
+                beads.append(Archive(path, self.name, cache=cache))
+        return beads, offset
+
+    def invalid_archives(self) -> List[Path]:
+        '''
+        Paths of archive files in this box, that can not be loaded.
+        '''
+        return self.index.invalid_archives(self._archives_from)
+
+    def write_catalog(self):
+        '''
+        Write the metadata of all archives into the box level catalog.
+
+        See `bead.catalog`.
+        '''
+        signatures = signature.scan(self.directory, self.sharded)
+        entries = {}
+        for bead in self.all_beads():
+            file_name = self._file_name(bead.archive_filename)
+            if file_name in signatures:
+                entries[file_name] = (signatures[file_name], bead.cache)
+        catalog.write(self.directory / layouts.Box.CATALOG, entries)
+
+    def _timeline(self, name) -> List[Tuple[datetime, str]]:
+        '''
+        Sorted (freeze time, file name)-s of archives of bead `name`, without opening them.
+
+        Sharded boxes might have archives at the top level as well (see `scan_bead`).
+        '''
+        name_timeline: List[Tuple[datetime, str]] = [
+            (freeze_time, self._file_name(self.directory / file_name))
+            for freeze_time, file_name in timeline(self.directory, name)]
+        if self.sharded:
+            name_timeline = sorted(
+                name_timeline
+                + [(freeze_time, self._file_name(self.directory / name / file_name))
+                   for freeze_time, file_name in timeline(self.directory / name, name)])
+        return name_timeline
+
+    def _beads_for_files(self, file_names) -> List[Archive]:
+        '''
+        Beads of the given archive files, missing or invalid archives are left out.
+        '''
+        return self.index.beads_for(file_names, self._archives_from)
+
+    def reshard(self, layout):
+        '''
+        Change the directory layout of the box in place.
+
+        Archives (with their .xmeta files) are moved, they remain visible during the move.
+        '''
+        assert layout in LAYOUTS, layout
+        sharded = layout != FLAT
+        if sharded:
+            # sharded boxes see top level archives as well
+            self._set_layout(layout)
+        renames = {}
+        for file_name in sorted(signature.scan(self.directory, sharded=True)):
+            if not file_name.endswith(ARCHIVE_EXTENSION):
+                continue
+            name = bead_name_from_file_path(file_name)
+            target_directory = self.directory / name if sharded else self.directory
+            target = self._file_name(target_directory / os.path.basename(file_name))
+            if target != file_name and self._move_archive(file_name, target):
+                renames[file_name] = target
+        self.index.rename_files(renames)
+        if not sharded:
+            self._set_layout(layout)
+        if os.path.exists(self.directory / layouts.Box.CATALOG):
+            self.write_catalog()
+
+    def set_storage(self, storage):
+        '''
+        Change the storage mode of the box, converting existing archives.
+
+        Archives are converted one by one, each replaced atomically.
+        Chunks are not removed when converting back to standard zip archives.
+        '''
+        assert storage in STORAGES, storage
+        if storage == CHUNKED:
+            # thin archives find their chunk store by its existence
+            tech.fs.ensure_directory(self.chunk_store.directory)
+        for path in self.archive_paths():
+            if path.endswith(ARCHIVE_EXTENSION):
+                self._convert_archive(path, storage)
+        tech.fs.ensure_directory(self.directory / layouts.Box.META)
+        tech.fs.write_file_atomic(self.directory / layouts.Box.STORAGE, storage + '\n')
+        self.storage = storage
+
+    def _convert_archive(self, path, storage):
+        try:
+            if chunk_store.is_thin(path) == (storage == CHUNKED):
+                return
+        except (zipfile.BadZipFile, OSError) as e:
+            TRACELOG(f'Not converting invalid archive {path}: {e!r}')
+            return
+        converted = Path(os.path.dirname(path)) / f'.{os.path.basename(path)}.{storage}'
+        try:
+            if storage == CHUNKED:
+                chunk_store.thin_archive(path, converted, self.chunk_store)
+            else:
+                chunk_store.reconstruct(path, converted, self.chunk_store)
+            os.replace(converted, path)
+        finally:
+            if os.path.exists(converted):
+                os.remove(converted)
+
+    def _move_archive(self, file_name, target) -> bool:
+        source_path = self.directory / file_name
+        target_path = self.directory / target
+        if os.path.exists(target_path):
+            TRACELOG(f'Not moving {source_path}: {target_path} already exists')
+            return False
+        tech.fs.ensure_directory(os.path.dirname(target_path))
+        os.rename(source_path, target_path)
+        source_xmeta = Path(os.path.splitext(source_path)[0] + signature.XMETA_SUFFIX)
+        if os.path.exists(source_xmeta):
+            os.rename(
+                source_xmeta, os.path.splitext(target_path)[0] + signature.XMETA_SUFFIX)
+        source_directory = os.path.dirname(source_path)
+        if source_directory != self.directory and not os.listdir(source_directory):
+            os.rmdir(source_directory)
+        return True
+
+    def _set_layout(self, layout):
+        tech.fs.ensure_directory(self.directory / layouts.Box.META)
+        tech.fs.write_file_atomic(self.directory / layouts.Box.LAYOUT, layout + '\n')
+        self.layout = layout
+        self.index.sharded = self.sharded
+
     def find_names(self, kind, content_id, timestamp):
         '''
         -> (exact_match, best_guess, best_guess_freeze_time, names)
@@ -179,13 +487,7 @@ class Box:
             names                  = sequence of names (kind matched)
         '''
         assert isinstance(timestamp, datetime)
-        try:
-            filenames = os.listdir(self.directory)
-        except FileNotFoundError:
-            filenames = []
-        paths = (self.directory / fname for fname in filenames)
-        beads = self._archives_from(paths)
-        candidates = (bead for bead in beads if bead.kind == kind)
+        candidates = self._beads([(bead_spec.KIND, kind)])
 
         exact_match            = None
         best_guess             = None
@@ -219,23 +521,143 @@ class Box:
     def get_context(self, check_type, check_param, time):
         # in theory timestamps can be [intentionally] duplicated, but let's
         # treat that as an error condition to be fixed ASAP
+        if check_type == bead_spec.BEAD_NAME:
+            context = self._get_context_from_timeline(check_param, time)
+            if context is not None:
+                return context
         conditions = [(check_type, check_param)]
         return make_context(time, self._beads(conditions))
 
+    def _get_context_from_timeline(self, name, time):
+        '''
+        Find context using freeze times encoded in file names.
+
+        Only the selected archives are opened (or looked up in the index).
+        Returns None if the archives disagree with their file names.
+        '''
+        name_timeline = self._timeline(name)
+        if not name_timeline:
+            raise LookupError
+        selected = select_around(name_timeline, time)
+        beads = self._beads_for_files([file_name for _, file_name in selected])
+        if len(beads) != len(selected):
+            return None
+        for bead, (freeze_time, _) in zip(beads, selected):
+            if bead.freeze_time != freeze_time:
+                return None
+        return make_context(time, beads)
+
+
+def select_around(name_timeline, time):
+    '''
+    Timeline entries at time, and the ones just before and after.
+    '''
+    times = [freeze_time for freeze_time, _ in name_timeline]
+    first_match = bisect_left(times, time)
+    after_match = bisect_right(times, time)
+    return (
+        name_timeline[first_match:after_match]
+        + name_timeline[max(first_match - 1, 0):first_match]
+        + name_timeline[after_match:after_match + 1])
+
+
+# beadname_20170615T075813302092+0200.zip
+TIMESTAMP_GLOB = '????????T????????????[-+]????'
+ARCHIVE_EXTENSION = '.zip'
+
+
+def timeline(directory, name) -> List[Tuple[datetime, str]]:
+    '''
+    Sorted (freeze time, file name)-s of archives of bead `name` in directory.
+
+    Freeze times are parsed from file names, archives are not opened.
+    '''
+    prefix = name + '_'
+    file_name_glob = glob_escape(prefix) + TIMESTAMP_GLOB + ARCHIVE_EXTENSION
+    glob = Path(glob_escape(directory)) / file_name_glob
+    return timeline_from_file_names((os.path.basename(path) for path in iglob(glob)), name)
+
+
+def timeline_from_file_names(file_names, name) -> List[Tuple[datetime, str]]:
+    '''
+    Sorted (freeze time, file name)-s of archives of bead `name` among file names.
+    '''
+    prefix = name + '_'
+    name_timeline = []
+    for file_name in file_names:
+        if not (file_name.startswith(prefix) and file_name.endswith(ARCHIVE_EXTENSION)):
+            continue
+        try:
+            freeze_time = time_from_timestamp(
+                file_name[len(prefix):-len(ARCHIVE_EXTENSION)])
+        except ValueError:
+            continue
+        name_timeline.append((freeze_time, file_name))
+    return sorted(name_timeline)
+
+
+def _default_box_timeout():
+    timeout = os.environ.get('BEAD_BOX_TIMEOUT')
+    return float(timeout) if timeout else None
+
 
 class UnionBox:
-    def __init__(self, boxes: Sequence[Box]):
+    '''
+    Query more boxes at once.
+
+    Boxes are queried concurrently. A box not answering within its timeout
+    (`Box.timeout`, or the UnionBox default) is left out from the result,
+    and reported through `on_timeout(box, timeout)`.
+    '''
+
+    def __init__(
+        self,
+        boxes: Sequence[Box],
+        timeout: Optional[float] = None,
+        on_timeout: Optional[Callable[[Box, float], None]] = None,
+    ):
         self.boxes = tuple(boxes)
+        self.timeout = _default_box_timeout() if timeout is None else timeout
+        self.on_timeout = on_timeout
+        self.timed_out_boxes: List[Box] = []
+
+    def _box_timeout(self, box):
+        return self.timeout if box.timeout is None else box.timeout
+
+    def _query_boxes(self, query, ordered=False):
+        '''
+        Run query(box) concurrently for all boxes.
+
+        Yield (box, future) pairs for boxes answering within their timeout.
+        '''
+        start = monotonic()
+        futures = [tech.parallel.submit_daemon(query, box) for box in self.boxes]
+        deadlines = [
+            None if timeout is None else start + timeout
+            for timeout in (self._box_timeout(box) for box in self.boxes)]
+        for index, future in tech.parallel.within_deadlines(futures, deadlines, ordered):
+            box = self.boxes[index]
+            if future is None:
+                self._report_timeout(box)
+            else:
+                yield box, future
+
+    def _report_timeout(self, box):
+        TRACELOG(f'Box {box.name} ({box.location}) timed out')
+        self.timed_out_boxes.append(box)
+        if self.on_timeout is not None:
+            self.on_timeout(box, self._box_timeout(box))
 
     def get_context(self, check_type, check_param, time):
-        context = None
-        for box in self.boxes:
+        def get_box_context(box):
             try:
-                box_context = box.get_context(check_type, check_param, time)
+                return box.get_context(check_type, check_param, time)
             except LookupError:
-                continue
-            else:
-                context = merge_contexts(box_context, context)
+                return None
+
+        context = None
+        for _box, future in self._query_boxes(get_box_context):
+            context = merge_contexts(future.result(), context)
 
         if context:
             return context
@@ -245,12 +667,50 @@ class UnionBox:
         context = self.get_context(check_type, check_param, time)
         return context.best
 
-    def all_beads(self) -> Iterator[Archive]:
+    def find_bead(self, name, content_id):
+        '''
+        Bead with name and content_id from the first box having it.
+
+        Boxes are queried concurrently, boxes certainly not having content_id
+        are skipped cheaply (see BoxIndex.may_contain).
+        '''
+        def find(box):
+            return box.find_bead(name, content_id)
+
+        for _box, future in self._query_boxes(find, ordered=True):
+            bead = future.result()
+            if bead is not None:
+                return bead
+
+    def all_beads(self, max_workers=None, ordered=True) -> Iterator[Archive]:
         '''
         Iterator for all beads in this Box
+
+        See Box.all_beads for the parameters, with ordered=False beads of
+        faster boxes come first.
+        A box must produce its first bead within its timeout,
+        the rest of its beads are streamed.
+        '''
+        def box_beads(box):
+            beads = box.all_beads(max_workers=max_workers, ordered=ordered)
+            first = next(beads, None)
+            return beads if first is None else itertools.chain([first], beads)
+
+        for _box, future in self._query_boxes(box_beads, ordered=ordered):
+            yield from future.result()
+
+    def beads_since(self, offsets: Dict[str, int]) -> Tuple[List[Archive], Dict[str, int]]:
+        '''
+        Beads stored since the per box journal offsets, and the offsets to continue from.
+
+        Boxes are identified by their names in offsets, missing ones are read from the start.
         '''
+        beads: List[Archive] = []
+        new_offsets = {}
         for box in self.boxes:
-            yield from box.all_beads()
+            box_beads, new_offsets[box.name] = box.beads_since(offsets.get(box.name, 0))
+            beads.extend(box_beads)
+        return beads, new_offsets
 
 
 class BeadContext:
@@ -0,0 +1,147 @@
+'''
+Recompression of archives with stronger compression.
+
+content_ids are calculated from the uncompressed content (through meta/manifest),
+so archives can be repacked with a different compression without changing their identity.
+Superseded or old (cold) beads are rarely read, so they can be stored more compactly,
+reducing both storage and network transfer.
+
+Repacked archives are written next to the original, verified to have the same members
+with the same content, then swapped in atomically.
+'''
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+import zipfile
+
+from tracelog import TRACELOG
+from .archive import Archive
+from .box import Box
+from . import layouts
+
+__all__ = (
+    'compaction_candidates', 'compact_archive',
+    'METHODS', 'DEFLATED', 'BZIP2', 'LZMA')
+
+
+# compression methods
+DEFLATED = 'deflated'
+BZIP2 = 'bzip2'
+LZMA = 'lzma'
+METHODS = {
+    DEFLATED: zipfile.ZIP_DEFLATED,
+    BZIP2: zipfile.ZIP_BZIP2,
+    LZMA: zipfile.ZIP_LZMA,
+}
+
+# outcomes of compact_archive
+COMPACTED = 'compacted'
+NOT_SMALLER = 'not smaller'
+ALREADY_COMPACT = 'already compact'
+LINKED = 'skipped: hardlinked'
+INVALID = 'invalid archive'
+
+COMPACT_SUFFIX = '.compact'
+COPY_BUFFER_SIZE = 1024 ** 2
+
+
+def compaction_candidates(box: Box, older_than: Optional[timedelta] = None) -> List[str]:
+    '''
+    Paths of superseded archives in box - archives of a bead name, that are not the newest.
+
+    With `older_than`, all archives frozen before that long ago are also included.
+    '''
+    beads_by_name: Dict[str, List[Archive]] = defaultdict(list)
+    for bead in box.all_beads():
+        beads_by_name[bead.name].append(bead)
+    if older_than is not None:
+        cutoff = datetime.now(timezone.utc) - older_than
+    candidates: List[str] = []
+    for beads in beads_by_name.values():
+        beads.sort(key=lambda bead: bead.freeze_time)
+        candidates.extend(bead.archive_filename for bead in beads[:-1])
+        newest = beads[-1]
+        if older_than is not None and newest.freeze_time < cutoff:
+            candidates.append(newest.archive_filename)
+    return sorted(candidates)
+
+
+def compact_archive(path, method: str = DEFLATED, level: Optional[int] = 9) -> Tuple[str, int]:
+    '''
+    Repack archive at path with compression `method` (one of METHODS) and `level`.
+
+    The archive is replaced only if the repacked one is smaller.
+    Returns the outcome and the number of bytes saved.
+    Runs in a separate process from `bead box compact`, so it needs only picklable arguments.
+    '''
+    compression = METHODS[method]
+    temp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}{COMPACT_SUFFIX}')
+    try:
+        stat = os.stat(path)
+        if stat.st_nlink > 1:
+            # replacing would unlink it, using more space
+            return LINKED, 0
+        with zipfile.ZipFile(path) as source:
+            if compression != zipfile.ZIP_DEFLATED and all(
+                info.compress_type == compression for info in source.infolist()
+            ):
+                return ALREADY_COMPACT, 0
+            _repack(source, temp, compression, level)
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(temp) as repacked:
+            problem = _difference(source, repacked)
+        if problem:
+            raise zipfile.BadZipFile(f'Repacked {path} differs: {problem}')
+        saved = stat.st_size - os.path.getsize(temp)
+        if saved <= 0:
+            os.remove(temp)
+            return NOT_SMALLER, 0
+        shutil.copystat(path, temp)
+        os.replace(temp, path)
+        return COMPACTED, saved
+    except (zipfile.BadZipFile, KeyError, OSError) as e:
+        TRACELOG(f'Could not compact {path}: {e!r}')
+        if os.path.exists(temp):
+            os.remove(temp)
+        return INVALID, 0
+
+
+def _repack(source: zipfile.ZipFile, target, compression: int, level: Optional[int]):
+    with zipfile.ZipFile(
+        target, 'w', compression=compression, compresslevel=level, allowZip64=True
+    ) as repacked:
+        repacked.comment = source.comment
+        for info in source.infolist():
+            if info.is_dir():
+                new_info = zipfile.ZipInfo(info.filename, info.date_time)
+                repacked.writestr(new_info, b'', compress_type=compression, compresslevel=level)
+            else:
+                # members opened by name get the compression level of the ZipFile,
+                # but the default modification time
+                with source.open(info) as src, repacked.open(
+                    info.filename, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT
+                ) as dst:
+                    shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            new_info = repacked.getinfo(info.filename)
+            new_info.external_attr = info.external_attr
+            new_info.comment = info.comment
+
+
+def _difference(source: zipfile.ZipFile, repacked: zipfile.ZipFile) -> Optional[str]:
+    '''
+    Description of the first difference in content between the archives, None if equal.
+    '''
+    def members(archive):
+        return [(info.filename, info.file_size, info.CRC) for info in archive.infolist()]
+
+    if members(source) != members(repacked):
+        return 'members'
+    manifest = layouts.Archive.MANIFEST
+    if source.read(manifest) != repacked.read(manifest):
+        return 'manifest'
+    damaged = repacked.testzip()
+    if damaged is not None:
+        return f'bad CRC for {damaged}'
+    return None
@@ -0,0 +1,99 @@
+'''
+Deduplication of identical archives by hardlinks.
+
+Branched or released beads are copied into more boxes, storing the same content
+more times.
+Archives with the same content_id on the same file system, that are also identical
+byte-for-byte, are replaced by hardlinks to a single file.
+
+Only archives are linked, their .xmeta files (which may have box specific input maps)
+are kept as they are.
+'''
+
+from collections import defaultdict
+import filecmp
+import os
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from tracelog import TRACELOG
+from .box import Box
+
+__all__ = ('find_duplicates', 'dedupe', 'Duplicate')
+
+
+LINK_SUFFIX = '.link'
+
+
+class Duplicate(NamedTuple):
+    path: str
+    original: str
+    # bytes freed by linking - 0, if path has other links as well
+    reclaimable: int
+
+
+def find_duplicates(boxes: Iterable[Box]) -> List[Duplicate]:
+    '''
+    Archives in boxes, that can be replaced by a hardlink to an identical archive.
+    '''
+    # (content_id, device) -> {inode: [(path, stat)]}
+    groups: Dict[Tuple[str, int], Dict[int, List]] = defaultdict(lambda: defaultdict(list))
+    for box in boxes:
+        for bead in box.all_beads():
+            path = bead.archive_filename
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            groups[bead.content_id, stat.st_dev][stat.st_ino].append((path, stat))
+
+    duplicates: List[Duplicate] = []
+    for files_by_inode in groups.values():
+        if len(files_by_inode) < 2:
+            continue
+        # keep the file, that is already linked most
+        inodes = sorted(
+            files_by_inode.values(),
+            key=lambda files: (-files[0][1].st_nlink, files[0][0]))
+        original, _ = inodes[0][0]
+        for files in inodes[1:]:
+            path, stat = files[0]
+            if not filecmp.cmp(original, path, shallow=False):
+                TRACELOG(f'Same content_id, but different archive files: {original} {path}')
+                continue
+            reclaimable = stat.st_size if stat.st_nlink == len(files) else 0
+            duplicates.extend(
+                Duplicate(path, original, reclaimable if i == 0 else 0)
+                for i, (path, _) in enumerate(files))
+    return duplicates
+
+
+def dedupe(duplicates: Iterable[Duplicate]) -> int:
+    '''
+    Replace duplicates by hardlinks to their original.
+
+    Returns the number of bytes reclaimed.
+    '''
+    reclaimed = 0
+    for duplicate in duplicates:
+        try:
+            link(duplicate.original, duplicate.path)
+        except OSError as e:
+            TRACELOG(f'Could not link {duplicate.path} to {duplicate.original}: {e!r}')
+        else:
+            reclaimed += duplicate.reclaimable
+    return reclaimed
+
+
+def link(original, path):
+    '''
+    Atomically replace path with a hardlink to original.
+    '''
+    temp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}{LINK_SUFFIX}')
+    if os.path.lexists(temp):
+        os.remove(temp)
+    os.link(original, temp)
+    try:
+        os.replace(temp, path)
+    except OSError:
+        os.remove(temp)
+        raise
@@ -0,0 +1,556 @@
+'''
+Persistent metadata index of the archives in a box.
+
+Answering box queries by opening every archive costs O(beads) zip opens,
+which is painfully slow for big boxes on network file systems.
+
+The index keeps the cached attributes of archives (see `Archive.cache`)
+in an sqlite database within the box. It is kept up to date by comparing
+the (size, mtime) of archive files (and their .xmeta files) with the recorded
+values, so only new or changed archives are opened.
+Signatures of invalid (e.g. partially copied) archives are also recorded,
+so they are not reopened on every query, only after they have changed.
+
+When the index can not be stored in the box (e.g. the box is read only),
+a temporary in-memory database is used, which is equivalent to scanning the box.
+
+The content ids in the index are also summarized in a Bloom filter, so that
+boxes not having a content id can be skipped without updating their index.
+The filter is valid while the box directory structure is unchanged
+(archives are added, removed or renamed, but are not modified in place),
+and the invalid archives (recorded with the filter) are unchanged -
+partially copied archives are typically completed in place.
+'''
+
+import contextlib
+import os
+import sqlite3
+import struct
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from tracelog import TRACELOG
+from .archive import Archive, InvalidArchive, CACHE_CONTENT_ID, CACHE_INPUT_MAP
+from .archive import bead_name_from_file_path, CACHE_KEYS
+from .journal import Journal
+from .signature import Signature, directory_state, scan, scan_shard, stat_files
+from . import journal as journal_record
+from . import layouts
+from . import meta
+from . import spec as bead_spec
+from . import tech
+
+persistence = tech.persistence
+Path = tech.fs.Path
+
+__all__ = ('BoxIndex', 'scan_bead')
+
+
+# bump it, when SCHEMA changes - old indices are rebuilt
+SCHEMA_VERSION = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS beads (
+    file_name    TEXT PRIMARY KEY,
+    size         INTEGER NOT NULL,
+    mtime        INTEGER NOT NULL,
+    xmeta_size   INTEGER,
+    xmeta_mtime  INTEGER,
+    name         TEXT NOT NULL,
+    meta_version TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    content_id   TEXT NOT NULL,
+    freeze_time  TEXT NOT NULL,
+    inputs       TEXT NOT NULL,
+    input_map    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS beads_name ON beads (name);
+CREATE INDEX IF NOT EXISTS beads_kind ON beads (kind);
+CREATE INDEX IF NOT EXISTS beads_content_id ON beads (content_id);
+CREATE TABLE IF NOT EXISTS invalid (
+    file_name    TEXT PRIMARY KEY,
+    size         INTEGER NOT NULL,
+    mtime        INTEGER NOT NULL,
+    xmeta_size   INTEGER,
+    xmeta_mtime  INTEGER
+);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value
+);
+'''
+
+ARCHIVE_COLUMNS = 'file_name, meta_version, kind, content_id, freeze_time, inputs, input_map'
+SIGNATURE_COLUMNS = 'file_name, size, mtime, xmeta_size, xmeta_mtime'
+
+# tables
+BEADS = 'beads'
+INVALID = 'invalid'
+
+# state keys
+JOURNAL_OFFSET = 'journal_offset'
+
+# seconds to wait for a lock held by another process
+LOCK_TIMEOUT = 30
+
+# content id filter file: box directory state (see signature.directory_state),
+# then the Bloom filter
+# directory state, length of the invalid archive signatures that follow
+CONTENT_FILTER_HEADER = struct.Struct('>qI')
+CONTENT_FILTER_FALSE_POSITIVE_RATE = 0.01
+# directory mtimes closer to now might not reflect changes made in the same
+# clock tick (coarse mtime resolution, e.g. on network file systems)
+CONTENT_FILTER_SETTLE_NS = 2 * 10**9
+
+
+def _make_where_clauses():
+    def has_name(name):
+        return 'name = ?', (name,)
+
+    def has_kind(kind):
+        return 'kind = ?', (kind,)
+
+    def has_content_prefix(prefix):
+        return 'substr(content_id, 1, ?) = ?', (len(prefix), prefix)
+
+    return {
+        bead_spec.BEAD_NAME:  has_name,
+        bead_spec.KIND:       has_kind,
+        bead_spec.CONTENT_ID: has_content_prefix,
+    }
+
+
+_WHERE_CLAUSES = _make_where_clauses()
+
+
+def compile_where(conditions):
+    '''
+    Compile list of (check-type, check-param)-s into an SQL where clause and its parameters.
+    '''
+    clauses = ['1 = 1']
+    params: Tuple = ()
+    for check_type, check_param in conditions:
+        clause, clause_params = _WHERE_CLAUSES[check_type](check_param)
+        clauses.append(clause)
+        params += clause_params
+    return ' AND '.join(clauses), params
+
+
+class BoxIndex:
+    '''
+    I am an index of archive metadata for a box directory.
+    '''
+
+    def __init__(self, directory, box_name='', journal=None, sharded=False):
+        self.directory = Path(directory)
+        self.box_name = box_name
+        self.journal = journal or Journal(self.directory / layouts.Box.JOURNAL)
+        # archives are in per bead name subdirectories
+        self.sharded = sharded
+        # unknown until the first connection
+        self._persistent: Optional[bool] = None
+
+    @property
+    def path(self):
+        return self.directory / layouts.Box.INDEX
+
+    @property
+    def is_persistent(self) -> bool:
+        '''
+        Is the index stored in the box?
+
+        A temporary index is forgotten after each query, so it is no better than a scan.
+        '''
+        if self._persistent is None:
+            with self._connection():
+                pass
+        return bool(self._persistent)
+
+    def beads(
+        self,
+        conditions,
+        load_archives: Callable[[Iterable[Path]], Iterable[Archive]],
+        ordered: bool = True,
+    ) -> Iterator[Archive]:
+        '''
+        Bring the index up to date and retrieve matching beads.
+
+        `load_archives` is used to open new or changed archive files.
+        Beads are sorted by file name, unless ordered is False.
+        In sharded boxes, queries for a bead name update only the shard of that name.
+        '''
+        where, params = compile_where(conditions)
+        order_by = ' ORDER BY file_name' if ordered else ''
+        names = {value for tag, value in conditions if tag == bead_spec.BEAD_NAME}
+        shard = names.pop() if self.sharded and len(names) == 1 else None
+        with self._connection() as connection:
+            self._update(connection, load_archives, shard)
+            rows = connection.execute(
+                f'SELECT {ARCHIVE_COLUMNS} FROM beads WHERE {where}{order_by}',
+                params).fetchall()
+        return (self._archive_from_row(row) for row in rows)
+
+    def invalid_archives(
+        self,
+        load_archives: Callable[[Iterable[Path]], Iterable[Archive]],
+    ) -> List[Path]:
+        '''
+        Bring the index up to date and retrieve the paths of invalid archives.
+        '''
+        with self._connection() as connection:
+            self._update(connection, load_archives)
+            rows = connection.execute(
+                'SELECT file_name FROM invalid ORDER BY file_name').fetchall()
+        return [self.directory / file_name for file_name, in rows]
+
+    @property
+    def content_filter_path(self):
+        return self.directory / layouts.Box.CONTENT_IDS
+
+    def may_contain(self, content_id) -> bool:
+        '''
+        Could the box have a bead with content_id?
+
+        False only if it certainly does not - no scan or index update is needed to answer.
+        '''
+        try:
+            state, _ = directory_state(self.directory, self.sharded)
+            with open(self.content_filter_path, 'rb') as f:
+                data = f.read()
+            filter_state, invalid, bloom = _decode_content_filter(data)
+        except (OSError, ValueError):
+            return True
+        if filter_state != state:
+            return True
+        if invalid and stat_files(self.directory, list(invalid)) != invalid:
+            # an invalid archive has changed, e.g. its copy was completed
+            return True
+        return content_id in bloom
+
+    def rename_files(self, renames: Dict[str, str]):
+        '''
+        Update the index after archives (and their .xmeta files) were renamed.
+
+        The archives need not be reopened, as renaming keeps their signature.
+        '''
+        with self._connection() as connection:
+            for table in (BEADS, INVALID):
+                connection.executemany(
+                    f'UPDATE OR REPLACE {table} SET file_name = ? WHERE file_name = ?',
+                    ((new, old) for old, new in renames.items()))
+
+    def beads_for(
+        self,
+        file_names: Sequence[str],
+        load_archives: Callable[[Iterable[Path]], Iterable[Archive]],
+    ) -> List[Archive]:
+        '''
+        Bring the index up to date for the given files only and retrieve their beads.
+
+        The box directory is not scanned.
+        Missing or invalid archives are left out.
+        '''
+        with self._connection() as connection:
+            on_disk = stat_files(self.directory, file_names)
+            indexed = self._signatures(connection, BEADS, file_names)
+            invalid = self._signatures(connection, INVALID, file_names)
+            self._refresh(connection, on_disk, indexed, invalid, {}, load_archives)
+            rows = self._select_files(connection, ARCHIVE_COLUMNS, file_names)
+        archives = {row[0]: self._archive_from_row(row) for row in rows}
+        return [archives[file_name] for file_name in file_names if file_name in archives]
+
+    def _archive_from_row(self, row):
+        file_name, meta_version, kind, content_id, freeze_time, inputs, input_map = row
+        cache = {
+            meta.META_VERSION: meta_version,
+            meta.KIND: kind,
+            CACHE_CONTENT_ID: content_id,
+            meta.FREEZE_TIME: freeze_time,
+            meta.INPUTS: persistence.loads(inputs),
+            CACHE_INPUT_MAP: persistence.loads(input_map),
+        }
+        return Archive(self.directory / file_name, self.box_name, cache=cache)
+
+    def _update(self, connection, load_archives, shard=None):
+        '''
+        Update the index for the whole box, or only for a shard of a sharded box.
+        '''
+        if shard is not None:
+            on_disk = scan_bead(self.directory, shard)
+            indexed = self._signatures_in_shard(connection, BEADS, shard)
+            invalid = self._signatures_in_shard(connection, INVALID, shard)
+            journaled = self._read_journal(connection)
+            self._refresh(
+                connection, on_disk, indexed, invalid,
+                {file_name: record
+                 for file_name, record in journaled.items()
+                 if file_name in on_disk},
+                load_archives)
+            # the journal offset has advanced - records of other shards are applied now
+            self._apply_journaled(
+                connection,
+                {file_name: record
+                 for file_name, record in journaled.items()
+                 if file_name not in on_disk})
+            return
+
+        # before scanning - changes during the scan make the content filter stale
+        try:
+            state = directory_state(self.directory, self.sharded)
+        except OSError:
+            state = None
+        on_disk = scan(self.directory, self.sharded)
+        indexed = self._signatures(connection, BEADS)
+        invalid = self._signatures(connection, INVALID)
+        # newly stored beads are described in the journal - no need to open them
+        journaled = self._read_journal(connection)
+        self._refresh(connection, on_disk, indexed, invalid, journaled, load_archives)
+        if self._persistent and state is not None:
+            self._update_content_filter(connection, *state)
+
+    def _apply_journaled(self, connection, journaled):
+        '''
+        Index the journaled beads, whose archives are unchanged since they were stored.
+
+        Other archives are left for the next update of their shard or the whole box.
+        '''
+        if not journaled:
+            return
+        on_disk = {
+            file_name: signature
+            for file_name, signature in stat_files(self.directory, list(journaled)).items()
+            if signature == _journaled_signature(journaled[file_name])}
+        if on_disk:
+            file_names = list(on_disk)
+            self._refresh(
+                connection, on_disk,
+                self._signatures(connection, BEADS, file_names),
+                self._signatures(connection, INVALID, file_names),
+                journaled, load_archives=lambda paths: ())
+
+    def _update_content_filter(self, connection, state, newest_mtime):
+        if time.time_ns() - newest_mtime < CONTENT_FILTER_SETTLE_NS:
+            return
+        invalid = self._signatures(connection, INVALID)
+        try:
+            with open(self.content_filter_path, 'rb') as f:
+                filter_state, filter_invalid, _ = _decode_content_filter(f.read())
+            if (filter_state, filter_invalid) == (state, invalid):
+                return
+        except (OSError, ValueError):
+            pass
+        content_ids = (
+            content_id for content_id, in connection.execute('SELECT content_id FROM beads'))
+        bloom = tech.bloom.BloomFilter.from_keys(
+            content_ids, CONTENT_FILTER_FALSE_POSITIVE_RATE)
+        try:
+            tech.fs.write_file_atomic(
+                self.content_filter_path, _encode_content_filter(state, invalid, bloom))
+        except OSError as e:
+            TRACELOG(f'Can not save content id filter {self.content_filter_path}: {e}')
+
+    def _discard_content_filter(self):
+        try:
+            os.remove(self.content_filter_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            TRACELOG(f'Can not remove content id filter {self.content_filter_path}: {e}')
+
+    def _signatures(self, connection, table, file_names=None) -> Dict[str, Signature]:
+        if file_names is None:
+            rows = connection.execute(f'SELECT {SIGNATURE_COLUMNS} FROM {table}')
+        else:
+            rows = self._select_files(connection, SIGNATURE_COLUMNS, file_names, table)
+        return dict(_signature_from_row(row) for row in rows)
+
+    def _signatures_in_shard(self, connection, table, shard) -> Dict[str, Signature]:
+        '''
+        Signatures of the archives of bead `shard` - in its shard or at the top level.
+        '''
+        prefix = shard + '/'
+        rows = connection.execute(
+            f'SELECT {SIGNATURE_COLUMNS} FROM {table}'
+            " WHERE substr(file_name, 1, ?) = ? OR instr(file_name, '/') = 0",
+            (len(prefix), prefix))
+        return dict(
+            _signature_from_row(row)
+            for row in rows
+            if row[0].startswith(prefix) or bead_name_from_file_path(row[0]) == shard)
+
+    def _select_files(self, connection, columns, file_names, table=BEADS):
+        placeholders = ', '.join('?' * len(file_names))
+        return connection.execute(
+            f'SELECT {columns} FROM {table} WHERE file_name IN ({placeholders})',
+            tuple(file_names)).fetchall()
+
+    def _refresh(self, connection, on_disk, indexed, invalid, journaled, load_archives):
+        '''
+        Make indexed signatures agree with the on disk ones.
+
+        Archives known to be invalid are not reopened until they change.
+        '''
+        obsolete = _differing(indexed, on_disk)
+        obsolete_invalid = _differing(invalid, on_disk)
+        changed = [
+            file_name
+            for file_name, signature in on_disk.items()
+            if indexed.get(file_name) != signature and invalid.get(file_name) != signature]
+        TRACELOG(self.directory, obsolete=len(obsolete), changed=len(changed))
+
+        for table, file_names in ((BEADS, obsolete), (INVALID, obsolete_invalid)):
+            connection.executemany(
+                f'DELETE FROM {table} WHERE file_name = ?',
+                ((file_name,) for file_name in file_names))
+
+        to_load = []
+        for file_name in changed:
+            record = journaled.get(file_name)
+            signature = on_disk[file_name]
+            if record and _journaled_signature(record) == signature:
+                cache = {key: record[key] for key in CACHE_KEYS}
+                self._insert(connection, file_name, signature, cache)
+            else:
+                to_load.append(file_name)
+
+        failed = set(to_load)
+        paths = {self.directory / file_name: file_name for file_name in to_load}
+        for archive in load_archives(paths):
+            try:
+                cache = archive.populate_cache()
+            except InvalidArchive:
+                continue
+            file_name = paths[archive.archive_filename]
+            self._insert(connection, file_name, on_disk[file_name], cache)
+            failed.discard(file_name)
+
+        if obsolete or len(failed) < len(changed):
+            # the content ids have changed, possibly without a directory state change
+            self._discard_content_filter()
+
+        # load_archives skips the archives it could not load
+        connection.executemany(
+            'INSERT OR REPLACE INTO invalid VALUES (?, ?, ?, ?, ?)',
+            ((file_name,) + tuple(on_disk[file_name]) for file_name in failed))
+
+    def _read_journal(self, connection):
+        '''
+        Journal records since the last read, by file name.
+        '''
+        row = connection.execute(
+            'SELECT value FROM state WHERE key = ?', (JOURNAL_OFFSET,)).fetchone()
+        offset = row[0] if row else 0
+        records, offset = self.journal.read(offset)
+        connection.execute(
+            'INSERT OR REPLACE INTO state VALUES (?, ?)', (JOURNAL_OFFSET, offset))
+        return {record[journal_record.FILE_NAME]: record for record in records}
+
+    def _insert(self, connection, file_name, signature: Signature, cache):
+        connection.execute(
+            'INSERT OR REPLACE INTO beads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (file_name,) + tuple(signature) + (
+                bead_name_from_file_path(file_name),
+                cache[meta.META_VERSION],
+                cache[meta.KIND],
+                cache[CACHE_CONTENT_ID],
+                cache[meta.FREEZE_TIME],
+                persistence.dumps(cache[meta.INPUTS]),
+                persistence.dumps(cache[CACHE_INPUT_MAP])))
+
+    @contextlib.contextmanager
+    def _connection(self):
+        connection = self._connect()
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _connect(self):
+        if os.path.isdir(self.directory):
+            try:
+                tech.fs.ensure_directory(self.directory / layouts.Box.META)
+                connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+                try:
+                    _ensure_schema(connection)
+                except sqlite3.Error:
+                    connection.close()
+                    raise
+                self._persistent = True
+                return connection
+            except (OSError, sqlite3.Error) as e:
+                TRACELOG(f'Can not use box index {self.path}: {e}')
+        self._persistent = False
+        connection = sqlite3.connect(':memory:')
+        _ensure_schema(connection)
+        return connection
+
+
+def _encode_content_filter(state, invalid: Dict[str, Signature], bloom) -> bytes:
+    invalid_bytes = persistence.dumps(invalid).encode('utf-8')
+    return (
+        CONTENT_FILTER_HEADER.pack(state, len(invalid_bytes))
+        + invalid_bytes
+        + bloom.to_bytes())
+
+
+def scan_bead(directory, name) -> Dict[str, Signature]:
+    '''
+    Signatures of the archives of bead `name` in a sharded box.
+
+    Archives are in the shard of the bead, but might also be at the top level
+    (stored by clients not knowing about shards, or not yet moved by a reshard).
+    '''
+    signatures = scan_shard(directory, name)
+    signatures.update(
+        (file_name, signature)
+        for file_name, signature in scan(directory).items()
+        if bead_name_from_file_path(file_name) == name)
+    return signatures
+
+
+def _decode_content_filter(data):
+    try:
+        state, invalid_size = CONTENT_FILTER_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError('Truncated content id filter')
+    invalid_end = CONTENT_FILTER_HEADER.size + invalid_size
+    try:
+        invalid = {
+            file_name: tuple(signature)
+            for file_name, signature
+            in persistence.loads(data[CONTENT_FILTER_HEADER.size:invalid_end]).items()}
+    except (ValueError, AttributeError, TypeError):
+        raise ValueError('Malformed content id filter')
+    return state, invalid, tech.bloom.BloomFilter.from_bytes(data[invalid_end:])
+
+
+def _differing(signatures, on_disk) -> List[str]:
+    return [
+        file_name
+        for file_name, signature in signatures.items()
+        if on_disk.get(file_name) != signature]
+
+
+def _signature_from_row(row) -> Tuple[str, Signature]:
+    file_name, size, mtime, xmeta_size, xmeta_mtime = row
+    return file_name, (size, mtime, xmeta_size, xmeta_mtime)
+
+
+def _journaled_signature(record) -> Signature:
+    # beads are journaled when they are stored, before any .xmeta file could exist
+    return (record[journal_record.SIZE], record[journal_record.MTIME], None, None)
+
+
+def _ensure_schema(connection):
+    version, = connection.execute('PRAGMA user_version').fetchone()
+    if version != SCHEMA_VERSION:
+        tables = [
+            table
+            for table, in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            connection.execute(f'DROP TABLE {table}')
+        connection.executescript(SCHEMA)
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        connection.commit()
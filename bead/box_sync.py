@@ -0,0 +1,166 @@
+'''
+Copy beads between boxes.
+
+Beads are identified by (name, content_id), only archives missing from the
+destination are copied - by parallel streams, resuming partial copies of earlier runs.
+
+Archives are copied into hidden partial files next to their final place,
+verified, then renamed, so that the destination never shows incomplete archives.
+'''
+
+import os
+import shutil
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+import zipfile
+
+from tracelog import TRACELOG
+from .archive import Archive
+from .box import Box
+from . import chunk_store
+from . import layouts
+from . import signature
+from . import tech
+
+__all__ = ('missing_beads', 'sync', 'Copied', 'Failed')
+
+
+# default number of parallel copy streams
+COPY_WORKERS = 4
+PARTIAL_SUFFIX = '.part'
+COPY_BUFFER_SIZE = 1024 ** 2
+
+
+class Copied(NamedTuple):
+    bead: Archive
+    path: str
+    size: int
+
+
+class Failed(NamedTuple):
+    bead: Archive
+    reason: str
+
+
+def missing_beads(source: Box, destination: Box) -> List[Archive]:
+    '''
+    Beads in source, that are not in destination - by (name, content_id).
+    '''
+    present = {(bead.name, bead.content_id) for bead in destination.all_beads()}
+    return [
+        bead
+        for bead in source.all_beads()
+        if (bead.name, bead.content_id) not in present]
+
+
+def sync(source: Box, destination: Box, max_workers: int = COPY_WORKERS):
+    '''
+    Copy beads missing from destination, with `max_workers` parallel streams.
+
+    Yields a Copied or Failed result for each missing bead, as they are done.
+    '''
+    def copy(bead):
+        try:
+            return _copy(bead, destination)
+        except OSError as e:
+            TRACELOG(f'Could not copy {bead.archive_filename}: {e!r}')
+            return Failed(bead, str(e))
+
+    missing = missing_beads(source, destination)
+    return tech.parallel.map_bounded(copy, missing, max_workers, ordered=False)
+
+
+def _copy(bead: Archive, destination: Box):
+    source = bead.archive_filename
+    file_name = _base_name(source)
+    directory = destination._archive_directory(bead.name)
+    target = directory / file_name
+    if os.path.exists(target):
+        return Failed(bead, f'{target} already exists with different content')
+    tech.fs.ensure_directory(directory)
+
+    partial = directory / f'.{file_name}{PARTIAL_SUFFIX}'
+    resumed_at, size = _copy_resumable(source, partial)
+    problem = _verify(partial, size, bead.content_id, check_members=resumed_at > 0)
+    if problem:
+        # most probably a stale partial copy - the next run starts from scratch
+        os.remove(partial)
+        return Failed(bead, f'Copy of {source} {problem}')
+
+    xmeta = _read(os.path.splitext(source)[0] + signature.XMETA_SUFFIX)
+    if xmeta is not None:
+        tech.fs.write_file_atomic(os.path.splitext(target)[0] + signature.XMETA_SUFFIX, xmeta)
+    os.replace(partial, target)
+    destination._journal_stored(target)
+    return Copied(bead, target, os.path.getsize(target))
+
+
+def _base_name(source) -> str:
+    if tech.http.is_url(source):
+        return unquote(os.path.basename(urlsplit(source).path))
+    return os.path.basename(source)
+
+
+def _copy_resumable(source, partial) -> Tuple[int, Optional[int]]:
+    '''
+    Copy source to partial, continuing after the already copied bytes.
+
+    Returns the offset the copy was resumed at and the size of source, if known.
+    '''
+    try:
+        offset = os.path.getsize(partial)
+    except FileNotFoundError:
+        offset = 0
+    stream, offset, size = _open_from(source, offset)
+    with stream, open(partial, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.truncate()
+        shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+    return offset, size
+
+
+def _open_from(source, offset):
+    if tech.http.is_url(source):
+        return tech.http.open_from(source, offset)
+    f = open(source, 'rb')
+    size = os.fstat(f.fileno()).st_size
+    offset = min(offset, size)
+    f.seek(offset)
+    return f, offset, size
+
+
+def _verify(partial, size, content_id, check_members) -> Optional[str]:
+    '''
+    Problem with the copy at partial, None if it is complete and has the expected content.
+
+    With check_members the CRC of all members is checked, as the earlier copied part
+    of a resumed copy might come from a different file.
+    '''
+    copied_size = os.path.getsize(partial)
+    if size is not None and size != copied_size:
+        return f'has {copied_size} bytes instead of {size}'
+    try:
+        # not opened through zipopener, as the file is renamed soon
+        with zipfile.ZipFile(partial) as z:
+            if chunk_store.CHUNK_INDEX in z.NameToInfo:
+                return 'is thin, copying from chunked boxes is not supported'
+            info = z.getinfo(layouts.Archive.MANIFEST)
+            with z.open(info) as manifest:
+                if tech.securehash.file(manifest, info.file_size) != content_id:
+                    return 'has different content'
+            damaged_member = z.testzip() if check_members else None
+    except (zipfile.BadZipFile, KeyError) as e:
+        return f'is damaged: {e!r}'
+    if damaged_member is not None:
+        return f'is damaged: bad CRC for {damaged_member}'
+    return None
+
+
+def _read(source) -> Optional[bytes]:
+    if tech.http.is_url(source):
+        return tech.http.get(source)
+    try:
+        with open(source, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
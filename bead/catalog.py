@@ -0,0 +1,112 @@
+'''
+Box level catalog of archive metadata.
+
+Even with .xmeta files, scanning N archives costs N opens, reads and json parses
+of small files, which is slow on network file systems.
+The optional catalog holds the cached attributes (see `Archive.cache`) of all
+archives of a box in a single file, so that `Archive.load_cache` needs only
+one read per box (per process).
+
+Catalog entries are used only while the archive's signature (size and mtime
+of the archive and its .xmeta file) is unchanged.
+'''
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from tracelog import TRACELOG
+from . import layouts
+from . import tech
+from .signature import Signature, stat_files
+
+persistence = tech.persistence
+
+__all__ = ('Catalog', 'lookup', 'write')
+
+
+CATALOG_VERSION = 1
+
+# keys
+VERSION = 'version'
+ARCHIVES = 'archives'
+SIGNATURE = 'signature'
+CACHE = 'cache'
+
+
+class Catalog:
+
+    def __init__(self, entries: Dict[str, Dict]):
+        self.entries = entries
+
+    @classmethod
+    def load(cls, path) -> 'Catalog':
+        '''
+        Load catalog file, missing or malformed catalogs are empty.
+        '''
+        try:
+            content = persistence.file_load(path)
+            if content[VERSION] == CATALOG_VERSION:
+                return cls(content[ARCHIVES])
+            TRACELOG(f'Ignoring catalog of unknown version {path}')
+        except FileNotFoundError:
+            pass
+        except (persistence.ReadError, LookupError, TypeError):
+            TRACELOG(f'Ignoring malformed catalog {path}')
+        return cls({})
+
+    def lookup(self, box_directory, file_name) -> Optional[Dict]:
+        '''
+        Cached attributes of archive, if it is in the catalog and has not changed since.
+
+        `file_name` is relative to `box_directory`.
+        '''
+        entry = self.entries.get(file_name)
+        if entry is None:
+            return None
+        signature = stat_files(box_directory, [file_name]).get(file_name)
+        if signature is None or list(signature) != entry[SIGNATURE]:
+            return None
+        return dict(entry[CACHE])
+
+
+def write(path, entries: Dict[str, Tuple[Signature, Dict]]):
+    '''
+    Write catalog file atomically from {file_name: (signature, cache)}.
+    '''
+    content = {
+        VERSION: CATALOG_VERSION,
+        ARCHIVES: {
+            file_name: {SIGNATURE: list(signature), CACHE: cache}
+            for file_name, (signature, cache) in entries.items()}}
+    tech.fs.write_file_atomic(path, persistence.dumps(content))
+
+
+# catalog path -> ((size, mtime) of catalog file, Catalog)
+_loaded: Dict[str, Tuple[Tuple[int, int], Catalog]] = {}
+_loaded_lock = threading.Lock()
+
+
+def lookup(archive_path, bead_name) -> Optional[Dict]:
+    '''
+    Cached attributes of archive from the catalog of its box, if available and current.
+
+    Catalogs are loaded once per process, and reloaded only when changed.
+    '''
+    box_directory, file_name = os.path.split(archive_path)
+    if os.path.basename(box_directory) == bead_name:
+        # in a shard of a sharded box
+        box_directory, shard = os.path.split(box_directory)
+        file_name = f'{shard}/{file_name}'
+    path = os.path.join(box_directory, layouts.Box.CATALOG)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _loaded_lock:
+        loaded_key, catalog = _loaded.get(path, (None, None))
+        if catalog is None or loaded_key != key:
+            catalog = Catalog.load(path)
+            _loaded[path] = (key, catalog)
+    return catalog.lookup(box_directory, file_name)
@@ -0,0 +1,224 @@
+'''
+Chunked storage of archives - successive bead versions share the storage of unchanged content.
+
+Boxes with chunked storage (see `bead.box.Box.storage`) keep "thin" archives:
+valid bead zip files with only the meta members, and an index of the content-defined
+chunks (see `bead.tech.chunking`) of all other members.
+The chunks are stored once per box, in its chunk store, keyed by their secure hash.
+
+Thin archives are ordinary archives for all metadata queries,
+member content is streamed from the chunk store on demand (see ThinZipArchive),
+and a standard zip can be reconstructed from them.
+'''
+
+import io
+import os
+import shutil
+import zipfile
+import zlib
+from typing import Dict, List, Optional
+
+from .exceptions import InvalidArchive
+from .ziparchive import ZipArchive
+from . import layouts
+from . import tech
+
+Path = tech.fs.Path
+persistence = tech.persistence
+securehash = tech.securehash
+
+__all__ = (
+    'ChunkStore', 'ThinZipArchive',
+    'is_thin', 'thin_archive', 'reconstruct', 'find_store', 'open_ziparchive')
+
+
+# member of thin archives: list of chunked members
+CHUNK_INDEX = layouts.Archive.META / 'chunks'
+
+# chunk index keys
+NAME = 'name'
+SIZE = 'size'
+DATE_TIME = 'date_time'
+EXTERNAL_ATTR = 'external_attr'
+CHUNKS = 'chunks'
+
+ChunkKey = str
+
+COPY_BUFFER_SIZE = 1024 ** 2
+
+
+class ChunkStore:
+    '''
+    Directory of zlib compressed chunks, keyed by the secure hash of their content.
+    '''
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path_for(self, key: ChunkKey) -> Path:
+        return self.directory / key[:2] / key
+
+    def put(self, chunk: bytes) -> ChunkKey:
+        '''
+        Store chunk, unless already stored, and return its key.
+        '''
+        key = securehash.bytes(chunk)
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            tech.fs.ensure_directory(os.path.dirname(path))
+            tech.fs.write_file_atomic(path, zlib.compress(chunk))
+        return key
+
+    def get(self, key: ChunkKey) -> bytes:
+        with open(self.path_for(key), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def open(self, keys: List[ChunkKey]) -> io.BufferedReader:
+        '''
+        Readable file object of the concatenated content of chunks.
+        '''
+        return io.BufferedReader(_ChunkedFile(self, keys), buffer_size=64 * 1024)
+
+
+class _ChunkedFile(io.RawIOBase):
+
+    def __init__(self, store: ChunkStore, keys: List[ChunkKey]):
+        super().__init__()
+        self.store = store
+        self.keys = iter(keys)
+        self.chunk = b''
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.position == len(self.chunk):
+            key = next(self.keys, None)
+            if key is None:
+                return 0
+            self.chunk = self.store.get(key)
+            self.position = 0
+        size = min(len(buffer), len(self.chunk) - self.position)
+        buffer[:size] = self.chunk[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def _is_chunked(info: zipfile.ZipInfo) -> bool:
+    return not (info.is_dir() or info.filename.startswith(layouts.Archive.META + '/'))
+
+
+def _copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.external_attr = info.external_attr
+    copy.compress_type = info.compress_type
+    return copy
+
+
+def is_thin(path) -> bool:
+    with zipfile.ZipFile(path) as z:
+        return CHUNK_INDEX in z.NameToInfo
+
+
+def thin_archive(zip_path, thin_path, store: ChunkStore):
+    '''
+    Write the thin version of the archive at zip_path, storing its content in store.
+    '''
+    with zipfile.ZipFile(zip_path) as source, zipfile.ZipFile(
+        thin_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True
+    ) as thin:
+        thin.comment = source.comment
+        chunk_index = []
+        for info in source.infolist():
+            if not _is_chunked(info):
+                thin.writestr(_copy_info(info), source.read(info))
+                continue
+            with source.open(info) as member:
+                keys = [store.put(chunk) for chunk in tech.chunking.chunks(member)]
+            chunk_index.append({
+                NAME: info.filename,
+                SIZE: info.file_size,
+                DATE_TIME: list(info.date_time),
+                EXTERNAL_ATTR: info.external_attr,
+                CHUNKS: keys})
+        persistence.zip_dump(chunk_index, thin, CHUNK_INDEX)
+
+
+def reconstruct(thin_path, zip_path, store: ChunkStore):
+    '''
+    Write the standard zip archive for the thin archive at thin_path.
+    '''
+    with zipfile.ZipFile(thin_path) as thin, zipfile.ZipFile(
+        zip_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True
+    ) as target:
+        target.comment = thin.comment
+        for member in persistence.zip_load(thin, CHUNK_INDEX):
+            year, month, day, hour, minute, second = member[DATE_TIME]
+            info = zipfile.ZipInfo(member[NAME], (year, month, day, hour, minute, second))
+            info.external_attr = member[EXTERNAL_ATTR]
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = member[SIZE]
+            with store.open(member[CHUNKS]) as source, target.open(info, 'w') as f:
+                shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+        for info in thin.infolist():
+            if info.filename != CHUNK_INDEX:
+                target.writestr(_copy_info(info), thin.read(info))
+
+
+def find_store(archive_filename) -> ChunkStore:
+    '''
+    Chunk store of the box of a thin archive - in the box directory, or above the shard.
+    '''
+    if tech.http.is_url(archive_filename):
+        raise InvalidArchive('Thin archives can not be read remotely', archive_filename)
+    directory = os.path.dirname(os.path.abspath(archive_filename))
+    for box_directory in (directory, os.path.dirname(directory)):
+        chunks_directory = os.path.join(box_directory, layouts.Box.CHUNKS)
+        if os.path.isdir(chunks_directory):
+            return ChunkStore(chunks_directory)
+    raise InvalidArchive('No chunk store for thin archive', archive_filename)
+
+
+class ThinZipArchive(ZipArchive):
+    '''
+    ZipArchive reading the chunked members from a chunk store.
+    '''
+
+    def __init__(self, filename, box_name, store: ChunkStore):
+        super().__init__(filename, box_name)
+        self.store = store
+        self.chunk_index: Dict[str, Dict] = {
+            member[NAME]: member for member in self.zip_load(CHUNK_INDEX)}
+
+    def _names(self):
+        zip_names = [name for name in super()._names() if name != CHUNK_INDEX]
+        return list(self.chunk_index) + zip_names
+
+    def _names_with_prefix(self, prefix):
+        chunked_names = [name for name in self.chunk_index if name.startswith(prefix)]
+        return chunked_names + super()._names_with_prefix(prefix)
+
+    def _member_size(self, name):
+        if name in self.chunk_index:
+            return self.chunk_index[name][SIZE]
+        return super()._member_size(name)
+
+    def _open_member(self, name):
+        if name in self.chunk_index:
+            return self.store.open(self.chunk_index[name][CHUNKS])
+        return super()._open_member(name)
+
+
+def open_ziparchive(filename, box_name='', archive_filename: Optional[str] = None):
+    '''
+    ZipArchive for the zip file at filename, ThinZipArchive for thin archives.
+
+    `archive_filename` is the location of the archive in its box,
+    if filename is a copy elsewhere - the chunk store is found from that.
+    '''
+    ziparchive = ZipArchive(filename, box_name)
+    if CHUNK_INDEX not in ziparchive.zipfile:
+        return ziparchive
+    store = find_store(archive_filename or filename)
+    return ThinZipArchive(filename, box_name, store)
@@ -0,0 +1,226 @@
+'''
+Read only boxes served over HTTP(S), e.g. by a static web server.
+
+The box directory is expected to be served as is:
+- archives are discovered through directory listings (index pages with links)
+- metadata is taken from the box catalog (see `bead.catalog`) or .xmeta files if available
+- archives are read with Range requests (see `tech.http.RangeFile`), so that only
+  the central directory and the needed members are transferred
+'''
+
+from html.parser import HTMLParser
+import json
+import posixpath
+from typing import Dict, List, Optional, Tuple
+import urllib.parse
+
+from cached_property import cached_property
+
+from tracelog import TRACELOG
+from .archive import Archive, InvalidArchive, CACHE_KEYS, bead_name_from_file_path
+from .box import Box, FLAT, LAYOUTS, BY_NAME, LOAD_WORKERS, ARCHIVE_EXTENSION
+from .box import compile_conditions, timeline_from_file_names
+from . import catalog
+from . import journal as journal_record
+from . import layouts
+from . import spec as bead_spec
+from . import summary
+from . import tech
+
+__all__ = ('HttpBox',)
+
+
+XMETA_EXTENSION = '.xmeta'
+
+
+class _LinkParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+
+def parse_listing(html: str) -> Tuple[List[str], List[str]]:
+    '''
+    (file names, subdirectory names) linked from a directory listing page.
+
+    Only relative links to direct children are considered, hidden entries are skipped.
+    '''
+    parser = _LinkParser()
+    parser.feed(html)
+    file_names, directories = [], []
+    for link in parser.links:
+        path = urllib.parse.unquote(urllib.parse.urlsplit(link).path)
+        if not path or path.startswith(('.', '/')) or '://' in link:
+            continue
+        if path.endswith('/'):
+            if '/' not in path[:-1]:
+                directories.append(path[:-1])
+        elif '/' not in path:
+            file_names.append(path)
+    return file_names, directories
+
+
+class HttpBox(Box):
+    '''
+    Read only box at an HTTP(S) URL.
+    '''
+
+    is_local = False
+
+    @property
+    def url(self):
+        return self.location.rstrip('/') + '/'
+
+    @property
+    def directory(self):
+        raise TypeError(f'Box {self.name} at {self.location} has no local directory')
+
+    def _url_for(self, file_name) -> str:
+        return self.url + urllib.parse.quote(file_name)
+
+    def _get(self, file_name) -> Optional[bytes]:
+        '''
+        Content of a file in the box, None if it is missing or the server is unavailable.
+        '''
+        try:
+            return tech.http.get(self._url_for(file_name), self.timeout)
+        except OSError as e:
+            TRACELOG(f'Can not read {file_name} from box {self.name}: {e}')
+            return None
+
+    @cached_property
+    def layout(self) -> str:
+        content = self._get(layouts.Box.LAYOUT)
+        if content is None:
+            return FLAT
+        layout = content.decode('utf-8', errors='replace').strip()
+        return layout if layout in LAYOUTS else BY_NAME
+
+    @cached_property
+    def _catalog(self) -> Dict[str, Dict]:
+        content = self._get(layouts.Box.CATALOG)
+        if content is None:
+            return {}
+        try:
+            entries = json.loads(content)[catalog.ARCHIVES]
+            return {file_name: entry[catalog.CACHE] for file_name, entry in entries.items()}
+        except (ValueError, LookupError, TypeError):
+            TRACELOG(f'Ignoring malformed catalog of box {self.name}')
+            return {}
+
+    def _listing(self, directory='') -> Tuple[List[str], List[str]]:
+        content = self._get(directory)
+        if content is None:
+            return [], []
+        return parse_listing(content.decode('utf-8', errors='replace'))
+
+    def _file_names(self, name=None) -> List[str]:
+        '''
+        Relative paths of potential archives, only of bead `name` if given.
+        '''
+        file_names, directories = self._listing()
+        if self.sharded and name is not None:
+            # archives might be at the top level as well (see `box_index.scan_bead`)
+            file_names = [
+                file_name
+                for file_name in file_names
+                if file_name.endswith(ARCHIVE_EXTENSION)
+                and bead_name_from_file_path(file_name) == name]
+            shard_file_names, _ = self._listing(urllib.parse.quote(name) + '/')
+            file_names.extend(f'{name}/{file_name}' for file_name in shard_file_names)
+        elif self.sharded:
+            for directory in directories:
+                shard_file_names, _ = self._listing(urllib.parse.quote(directory) + '/')
+                file_names.extend(f'{directory}/{file_name}' for file_name in shard_file_names)
+        return sorted(
+            file_name for file_name in file_names if file_name.endswith(ARCHIVE_EXTENSION))
+
+    def _archive(self, file_name) -> Archive:
+        '''
+        Archive with metadata from the catalog, .xmeta file or archive comment, if possible.
+        '''
+        cache = self._catalog.get(file_name)
+        if cache is None:
+            xmeta = self._get(file_name[:-len(ARCHIVE_EXTENSION)] + XMETA_EXTENSION)
+            try:
+                cache = json.loads(xmeta) if xmeta is not None else None
+            except ValueError:
+                cache = None
+        if cache is None:
+            # only the end of the archive is transferred
+            cache = summary.read(self._url_for(file_name)) or {}
+        return self._make_archive(file_name, cache)
+
+    def _make_archive(self, file_name, cache) -> Archive:
+        archive = Archive(self._url_for(file_name), self.name, cache=cache)
+        # the name in the url is quoted
+        archive.name = bead_name_from_file_path(file_name)
+        return archive
+
+    def _load(self, file_names, match=None, max_workers=None, ordered=True) -> List[Archive]:
+        def load(file_name):
+            try:
+                archive = self._archive(file_name)
+                if match is not None and not match(archive):
+                    return None
+                archive.populate_cache()
+                return archive
+            except (InvalidArchive, OSError) as e:
+                TRACELOG(f'Invalid archive {file_name} in box {self.name}: {e!r}')
+                return None
+
+        if max_workers is None:
+            max_workers = LOAD_WORKERS
+        archives = tech.parallel.map_bounded(load, file_names, max_workers, ordered)
+        return [archive for archive in archives if archive is not None]
+
+    def _beads(self, conditions, max_workers=None, ordered=True):
+        bead_names = {value for tag, value in conditions if tag == bead_spec.BEAD_NAME}
+        if len(bead_names) > 1:
+            return []
+        name = bead_names.pop() if bead_names else None
+        return self._load(
+            self._file_names(name), compile_conditions(conditions),
+            max_workers=max_workers, ordered=ordered)
+
+    def find_bead(self, name, content_id):
+        query = ((bead_spec.BEAD_NAME, name), (bead_spec.CONTENT_ID, content_id))
+        for bead in self._beads(query):
+            return bead
+
+    def _timeline(self, name):
+        if self.sharded:
+            return sorted(
+                (freeze_time, file_name)
+                for file_name in self._file_names(name)
+                for freeze_time, _ in timeline_from_file_names(
+                    [posixpath.basename(file_name)], name))
+        return timeline_from_file_names(self._file_names(), name)
+
+    def _beads_for_files(self, file_names):
+        return self._load(file_names)
+
+    def beads_since(self, offset=0):
+        content = None
+        try:
+            content = tech.http.get_from(self._url_for(layouts.Box.JOURNAL), offset, self.timeout)
+        except OSError as e:
+            TRACELOG(f'Can not read journal of box {self.name}: {e}')
+        if not content:
+            return [], offset
+        records, offset = journal_record.parse(content, offset, self.location)
+        beads = [
+            self._make_archive(
+                record[journal_record.FILE_NAME], {key: record[key] for key in CACHE_KEYS})
+            for record in records]
+        return beads, offset
+
+    def store(self, workspace, freeze_time):
+        raise ValueError(f'Box {self.name} at {self.location} is read only')
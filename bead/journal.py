@@ -0,0 +1,88 @@
+'''
+Append-only journal of beads stored in a box.
+
+`Box.store` appends one line (a json record) per saved bead, so readers can
+learn about new beads by reading the journal from a remembered offset,
+instead of rescanning the whole box.
+
+Records are the cached attributes of the archive (see `Archive.cache`)
+extended with the file name and its (size, mtime) at the time of storing.
+'''
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+from tracelog import TRACELOG
+from . import tech
+
+Path = tech.fs.Path
+
+__all__ = ('Journal', 'FILE_NAME', 'NAME', 'SIZE', 'MTIME')
+
+
+FILE_NAME = 'file_name'
+NAME = 'name'
+SIZE = 'size'
+MTIME = 'mtime'
+
+Record = Dict
+Offset = int
+
+
+class Journal:
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def append(self, record: Record):
+        '''
+        Append record as a single line.
+
+        A single write on a file opened in append mode is used, so concurrent
+        writers do not mix their records.
+        '''
+        line = json.dumps(record, sort_keys=True, ensure_ascii=True) + '\n'
+        tech.fs.ensure_directory(os.path.dirname(self.path))
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            os.write(fd, line.encode('ascii'))
+        finally:
+            os.close(fd)
+
+    def read(self, offset: Offset = 0) -> Tuple[List[Record], Offset]:
+        '''
+        Read records appended after offset.
+
+        Returns the records and the offset to continue from next time.
+        Incomplete (being written) last line is left for the next read.
+        A journal shorter than offset is assumed to be restarted and is read from the beginning.
+        '''
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < offset:
+                    offset = 0
+                f.seek(offset)
+                content = f.read()
+        except FileNotFoundError:
+            return [], 0
+
+        return parse(content, offset, self.path)
+
+
+def parse(content: bytes, offset: Offset, source='journal') -> Tuple[List[Record], Offset]:
+    '''
+    Parse journal content read from offset.
+
+    Returns the records and the offset to continue from next time.
+    Incomplete (being written) last line is left for the next read.
+    '''
+    complete_length = content.rfind(b'\n') + 1
+    records = []
+    for line in content[:complete_length].splitlines():
+        try:
+            records.append(json.loads(line.decode('ascii')))
+        except ValueError:
+            TRACELOG(f'Ignoring malformed journal record in {source}: {line!r}')
+    return records, offset + complete_length
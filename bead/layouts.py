@@ -29,3 +29,20 @@ class Workspace:
 
     BEAD_META = META / 'bead'
     INPUT_MAP = META / 'input.map'
+
+
+class Box:
+
+    # box level (private) bookkeeping, not visible to bead queries
+    META = Path('.bead-box')
+
+    INDEX = META / 'index.sqlite3'
+    JOURNAL = META / 'journal'
+    CATALOG = META / 'catalog'
+    CONTENT_IDS = META / 'content_ids.bloom'
+    # directory layout marker, see bead.box.Box.layout
+    LAYOUT = META / 'layout'
+    # storage mode marker, see bead.box.Box.storage
+    STORAGE = META / 'storage'
+    # chunks of thin archives, see bead.chunk_store
+    CHUNKS = META / 'chunks'
@@ -0,0 +1,150 @@
+'''
+Read-through local cache of archives, for boxes on slow (e.g. network) file systems.
+
+Archives are cached as whole files keyed by their content_id, so the same bead
+is found in the cache, whichever box or file name it is accessed under.
+Copies are checked to have the content_id they are stored under.
+The cache is bounded in size, least recently used archives are evicted first
+(file mtimes are used as access times, as atime is often not maintained).
+
+The cache is enabled by the BEAD_ARCHIVE_CACHE environment variable (a directory),
+its size is limited by BEAD_ARCHIVE_CACHE_MB (default: 10240).
+'''
+
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+from tracelog import TRACELOG
+from .ziparchive import manifest_content_id
+from . import tech
+
+Path = tech.fs.Path
+
+__all__ = ('LocalArchiveCache', 'discard', 'from_environment')
+
+
+DEFAULT_MAX_SIZE_MB = 10240
+CACHED_ARCHIVE_SUFFIX = '.zip'
+
+_VALID_CONTENT_ID = re.compile('[0-9a-zA-Z_-]+')
+
+
+class LocalArchiveCache:
+
+    def __init__(self, directory, max_size: int):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def path_for(self, content_id) -> Path:
+        return self.directory / (content_id + CACHED_ARCHIVE_SUFFIX)
+
+    def fetch(self, content_id, source_path) -> Path:
+        '''
+        Path of a local copy of the archive with content_id at source_path.
+
+        The archive is copied into the cache on first access.
+        If it can not be cached, source_path is returned.
+        '''
+        if not _VALID_CONTENT_ID.fullmatch(content_id):
+            return source_path
+        path = self.path_for(content_id)
+        try:
+            # mark as recently used
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            TRACELOG(f'Can not use cached archive {path}: {e}')
+            return source_path
+
+        try:
+            return self._copy(content_id, source_path, path)
+        except OSError as e:
+            TRACELOG(f'Can not cache {source_path}: {e}')
+            return source_path
+
+    def _copy(self, content_id, source_path, path) -> Path:
+        size = os.stat(source_path).st_size
+        if size > self.max_size:
+            return source_path
+        tech.fs.ensure_directory(self.directory)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.copying-')
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(source_path, 'rb') as src:
+                shutil.copyfileobj(src, dst, 1024 ** 2)
+            if os.stat(temp_path).st_size != size:
+                TRACELOG(f'{source_path} changed while copying - not cached')
+                os.remove(temp_path)
+                return source_path
+            if _content_id_of(temp_path) != content_id:
+                TRACELOG(f'{source_path} does not have content id {content_id} - not cached')
+                os.remove(temp_path)
+                return source_path
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None):
+        '''
+        Remove least recently used archives, until the cache fits in max_size.
+
+        `keep` is not removed, even if it alone is over the limit.
+        '''
+        entries = []
+        with os.scandir(self.directory) as dir_entries:
+            for entry in dir_entries:
+                if entry.name.endswith(CACHED_ARCHIVE_SUFFIX) and not entry.name.startswith('.'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if keep is not None and os.path.normpath(path) == os.path.normpath(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # evicted by another process
+                pass
+            total_size -= size
+
+
+def _content_id_of(path) -> Optional[str]:
+    try:
+        with tech.zipreader.ZipReader(path) as zip_file:
+            return manifest_content_id(zip_file)
+    except (tech.zipreader.BadZipFile, KeyError):
+        return None
+
+
+def discard(path):
+    '''
+    Remove a (damaged) cached archive.
+    '''
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def from_environment() -> Optional[LocalArchiveCache]:
+    '''
+    The local archive cache configured by environment variables, if any.
+    '''
+    directory = os.environ.get('BEAD_ARCHIVE_CACHE')
+    if not directory:
+        return None
+    max_size_mb = int(os.environ.get('BEAD_ARCHIVE_CACHE_MB', DEFAULT_MAX_SIZE_MB))
+    return LocalArchiveCache(directory, max_size_mb * 1024 ** 2)
@@ -0,0 +1,125 @@
+'''
+File signatures - (size, mtime) of archive files and their .xmeta files.
+
+Cached archive metadata is valid as long as the signature has not changed.
+
+Archives are identified by their path relative to the box directory, which is
+a plain file name, or `<shard>/<file name>` for sharded boxes.
+'''
+
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ('Signature', 'scan', 'scan_shard', 'stat_files', 'directory_state', 'XMETA_SUFFIX')
+
+
+# (size, mtime, xmeta size, xmeta mtime)
+Signature = Tuple[int, int, Optional[int], Optional[int]]
+
+XMETA_SUFFIX = '.xmeta'
+
+
+def scan(directory, sharded=False) -> Dict[str, Signature]:
+    '''
+    Signatures of potential archive files in directory.
+
+    With sharded=True, archives in subdirectories (shards) are included as well.
+    Hidden files and directories (including the box's own bookkeeping) and .xmeta files
+    are not considered archives.
+    '''
+    signatures, subdirectories = _scan_directory(directory)
+    if sharded:
+        for shard in subdirectories:
+            shard_signatures, _ = _scan_directory(os.path.join(directory, shard))
+            signatures.update(
+                (f'{shard}/{file_name}', signature)
+                for file_name, signature in shard_signatures.items())
+    return signatures
+
+
+def scan_shard(directory, shard) -> Dict[str, Signature]:
+    '''
+    Signatures of potential archive files in a single shard of a sharded box.
+    '''
+    signatures, _ = _scan_directory(os.path.join(directory, shard))
+    return {
+        f'{shard}/{file_name}': signature
+        for file_name, signature in signatures.items()}
+
+
+def _scan_directory(directory) -> Tuple[Dict[str, Signature], List[str]]:
+    stats = {}
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_file():
+                        stats[entry.name] = entry.stat()
+                    elif entry.is_dir():
+                        subdirectories.append(entry.name)
+                except FileNotFoundError:
+                    # removed while scanning
+                    pass
+    except (FileNotFoundError, NotADirectoryError):
+        return {}, []
+
+    def xmeta_stat(file_name):
+        root, ext = os.path.splitext(file_name)
+        return stats.get(root + XMETA_SUFFIX) if ext == '.zip' else None
+
+    signatures = {
+        file_name: _signature(stat, xmeta_stat(file_name))
+        for file_name, stat in stats.items()
+        if not file_name.endswith(XMETA_SUFFIX)}
+    return signatures, subdirectories
+
+
+def directory_state(directory, sharded=False) -> Tuple[int, int]:
+    '''
+    (state, newest mtime) of the directory structure of a box.
+
+    The state changes, when archives are added, removed or renamed (but not when
+    they are modified in place). Raises OSError.
+    '''
+    mtime = os.stat(directory).st_mtime_ns
+    if not sharded:
+        return mtime, mtime
+    mtimes = [('', mtime)]
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.startswith('.') and entry.is_dir():
+                mtimes.append((entry.name, entry.stat().st_mtime_ns))
+    digest = hashlib.blake2b(repr(sorted(mtimes)).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True), max(mtime for _, mtime in mtimes)
+
+
+def stat_files(directory, file_names) -> Dict[str, Signature]:
+    '''
+    Signatures of the given archive files in directory - missing files are left out.
+    '''
+    def stat(path):
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    signatures = {}
+    for file_name in file_names:
+        archive_stat = stat(os.path.join(directory, file_name))
+        if archive_stat is not None:
+            xmeta_stat = None
+            root, ext = os.path.splitext(file_name)
+            if ext == '.zip':
+                xmeta_stat = stat(os.path.join(directory, root + XMETA_SUFFIX))
+            signatures[file_name] = _signature(archive_stat, xmeta_stat)
+    return signatures
+
+
+def _signature(stat, xmeta_stat) -> Signature:
+    if xmeta_stat is None:
+        return (stat.st_size, stat.st_mtime_ns, None, None)
+    return (stat.st_size, stat.st_mtime_ns, xmeta_stat.st_size, xmeta_stat.st_mtime_ns)
@@ -0,0 +1,114 @@
+'''
+Metadata summary in the archive comment.
+
+The zip comment is at the very end of the file, after the central directory.
+Archives created by `Workspace.pack` carry a summary of all the metadata `Archive` needs
+(see `archive.CACHE_KEYS`) in the comment, after the user's comment,
+so that it can be read from the last few KB of the file,
+without .xmeta files, and without parsing the zip directory.
+
+The summary is a marker line with a checksum, followed by the metadata as json:
+
+    <user comment>
+    bead-summary/1 <blake2b-128 hex of the json> {"content_id": ...}
+
+A summary with a bad checksum or missing keys is ignored.
+The summary is a shortcut only: opening the zip checks it (see `Archive.ziparchive`).
+'''
+
+import hashlib
+import json
+from typing import Dict, Optional
+
+from tracelog import TRACELOG
+from . import meta
+from . import tech
+
+__all__ = ('CONTENT_ID', 'INPUT_MAP', 'KEYS', 'of', 'encode', 'parse', 'add_to_comment', 'read')
+
+
+CONTENT_ID = 'content_id'
+INPUT_MAP = 'input_map'
+
+KEYS = (
+    meta.META_VERSION,
+    CONTENT_ID,
+    meta.KIND,
+    meta.FREEZE_TIME,
+    meta.INPUTS,
+    INPUT_MAP,
+)
+
+MARKER = b'\nbead-summary/1 '
+# zip comments are limited to 64KiB, archives with larger comments have no summary
+MAX_COMMENT_SIZE = 0xffff
+
+Summary = Dict
+
+
+def of(bead_meta, content_id, input_map) -> Summary:
+    return {
+        meta.META_VERSION: bead_meta[meta.META_VERSION],
+        CONTENT_ID: content_id,
+        meta.KIND: bead_meta[meta.KIND],
+        meta.FREEZE_TIME: bead_meta[meta.FREEZE_TIME],
+        meta.INPUTS: bead_meta[meta.INPUTS],
+        INPUT_MAP: input_map,
+    }
+
+
+def _checksum(content: bytes) -> bytes:
+    return hashlib.blake2b(content, digest_size=16).hexdigest().encode('ascii')
+
+
+def encode(summary: Summary) -> bytes:
+    content = json.dumps(summary, sort_keys=True, separators=(',', ':')).encode('ascii')
+    return MARKER + _checksum(content) + b' ' + content
+
+
+def parse(comment: bytes) -> Optional[Summary]:
+    '''
+    Summary from the end of an archive comment, None if there is no valid summary.
+    '''
+    position = comment.rfind(MARKER)
+    if position < 0:
+        return None
+    checksum, _, content = comment[position + len(MARKER):].partition(b' ')
+    if checksum != _checksum(content):
+        TRACELOG('Ignoring summary with bad checksum')
+        return None
+    try:
+        summary = json.loads(content.decode('ascii'))
+    except ValueError:
+        return None
+    if not isinstance(summary, dict) or not all(key in summary for key in KEYS):
+        return None
+    return summary
+
+
+def add_to_comment(comment: bytes, summary: Summary) -> bytes:
+    '''
+    Comment extended with the encoded summary - if it fits in a zip comment.
+    '''
+    comment_with_summary = comment + encode(summary)
+    if len(comment_with_summary) > MAX_COMMENT_SIZE:
+        TRACELOG('Summary does not fit in the archive comment - not added')
+        return comment
+    return comment_with_summary
+
+
+def read(archive_filename) -> Optional[Summary]:
+    '''
+    Summary of the archive at archive_filename (a path or URL), reading only its end.
+
+    Returns None for archives without a valid summary and for unreadable files.
+    '''
+    try:
+        if tech.http.is_url(archive_filename):
+            with tech.http.RangeFile(archive_filename) as remote_file:
+                comment = tech.zipreader.read_comment(remote_file)
+        else:
+            comment = tech.zipreader.read_comment(archive_filename)
+    except OSError:
+        return None
+    return parse(comment)
@@ -4,8 +4,13 @@
 Technologies
 '''
 
+from . import bloom
+from . import chunking
 from . import identifier
 from . import fs
+from . import http
+from . import parallel
 from . import persistence
 from . import securehash
 from . import timestamp
+from . import zipreader
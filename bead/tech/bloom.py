@@ -0,0 +1,71 @@
+'''
+Bloom filter - a compact set representation with false positives, but no false negatives.
+'''
+
+import hashlib
+import math
+import struct
+from typing import Iterable
+
+# format: magic, hash count, bits
+MAGIC = b'BLOOM1'
+HEADER = struct.Struct('>6sI')
+
+
+class BloomFilter:
+
+    def __init__(self, bits: bytearray, hash_count: int):
+        self.bits = bits
+        self.hash_count = hash_count
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float = 0.01) -> 'BloomFilter':
+        '''
+        Empty filter sized for `capacity` keys with the given false positive rate.
+        '''
+        capacity = max(capacity, 1)
+        bit_count = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        hash_count = max(round(bit_count / capacity * math.log(2)), 1)
+        return cls(bytearray((bit_count + 7) // 8), hash_count)
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[str], false_positive_rate: float = 0.01) -> 'BloomFilter':
+        keys = list(keys)
+        bloom = cls.for_capacity(len(keys), false_positive_rate)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key: str):
+        bit_count = len(self.bits) * 8
+        # double hashing: position_i = h1 + i * h2
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % bit_count for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(MAGIC, self.hash_count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        '''
+        Raises ValueError for malformed data.
+        '''
+        try:
+            magic, hash_count = HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError('Truncated bloom filter')
+        bits = bytearray(data[HEADER.size:])
+        if magic != MAGIC or not hash_count or not bits:
+            raise ValueError('Malformed bloom filter')
+        return cls(bits, hash_count)
@@ -37,6 +37,22 @@ def write_file(path, content):
         f.write(content)
 
 
+def write_file_atomic(path, content):
+    '''
+    Write file so that readers see either the old or the new content, never a partial one.
+    '''
+    directory, file_name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{file_name}.')
+    try:
+        os.close(fd)
+        write_file(temp_path, content)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
 def read_file(path):
     with io.open(path, 'rt', encoding='utf-8') as f:
         return f.read()
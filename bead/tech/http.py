@@ -0,0 +1,186 @@
+'''
+Minimal HTTP client for reading (parts of) remote files.
+'''
+
+import io
+import re
+from typing import Optional
+import urllib.error
+import urllib.request
+
+__all__ = ('is_url', 'get', 'get_from', 'open_from', 'RangeFile')
+
+
+# seconds to wait for a server, if not specified otherwise
+DEFAULT_TIMEOUT = 30
+
+# bytes read from the end of a file on opening: the zip end of central directory
+# record with the longest possible comment - and usually the central directory
+INITIAL_TAIL = 64 * 1024 + 22
+# sequential reads fetch exponentially more, starting from MIN_READAHEAD
+MIN_READAHEAD = 16 * 1024
+MAX_READAHEAD = 8 * 1024 * 1024
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+_UNSATISFIED_RANGE = re.compile(r'bytes \*/(\d+)')
+
+
+def is_url(location) -> bool:
+    return str(location).startswith(('http://', 'https://'))
+
+
+def _open(url, headers=None, timeout=None):
+    request = urllib.request.Request(url, headers=headers or {})
+    return urllib.request.urlopen(request, timeout=timeout or DEFAULT_TIMEOUT)
+
+
+def get(url, timeout=None) -> Optional[bytes]:
+    '''
+    Content of url, None if it does not exist.
+    '''
+    return get_from(url, 0, timeout)
+
+
+def get_from(url, offset, timeout=None) -> Optional[bytes]:
+    '''
+    Content of url from byte offset, None if it does not exist.
+
+    An offset past the end yields empty content.
+    '''
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    try:
+        with _open(url, headers, timeout) as response:
+            content = response.read()
+            if offset and response.status != 206:
+                # Range is not supported
+                content = content[offset:]
+            return content
+    except urllib.error.HTTPError as e:
+        e.close()
+        if e.code == 404:
+            return None
+        if e.code == 416:
+            # Range Not Satisfiable
+            return b''
+        raise
+
+
+def open_from(url, offset, timeout=None):
+    '''
+    Open url for streaming its content from offset.
+
+    Returns (file object, actual offset, size of the whole content or None if unknown).
+    The actual offset is 0, if the server does not support Range requests.
+    An offset at or past the end yields an empty stream.
+    '''
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    try:
+        response = _open(url, headers, timeout)
+    except urllib.error.HTTPError as e:
+        e.close()
+        if e.code == 416:
+            # Range Not Satisfiable
+            match = _UNSATISFIED_RANGE.fullmatch(e.headers.get('Content-Range', ''))
+            return io.BytesIO(), offset, int(match.group(1)) if match else None
+        raise
+    if response.status == 206:
+        match = _CONTENT_RANGE.fullmatch(response.headers.get('Content-Range', ''))
+        return response, offset, int(match.group(3)) if match else None
+    length = response.headers.get('Content-Length')
+    return response, 0, int(length) if length else None
+
+
+class RangeFile(io.RawIOBase):
+    '''
+    Read only, seekable file object for a remote file, reading only the needed parts.
+
+    Uses HTTP Range requests, with readahead growing on sequential reads.
+    Raises OSError (e.g. urllib.error.URLError) on network problems.
+    '''
+
+    def __init__(self, url, timeout=None):
+        super().__init__()
+        self.url = url
+        self.name = url
+        self.timeout = timeout
+        self._position = 0
+        self._readahead = MIN_READAHEAD
+        self._buffer_start = 0
+        self._buffer = b''
+        self.size = self._fetch_tail()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+        if position < 0:
+            raise OSError(f'Negative seek position {position}')
+        self._position = position
+        return position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._position
+        size = max(min(size, self.size - self._position), 0)
+        if not size:
+            return b''
+        start = self._position
+        buffer_end = self._buffer_start + len(self._buffer)
+        if not (self._buffer_start <= start and start + size <= buffer_end):
+            if start == buffer_end:
+                self._readahead = min(self._readahead * 2, MAX_READAHEAD)
+            else:
+                self._readahead = MIN_READAHEAD
+            end = min(start + max(size, self._readahead), self.size)
+            self._fill_buffer(start, end)
+        offset = start - self._buffer_start
+        data = self._buffer[offset:offset + size]
+        self._position += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _fetch_tail(self) -> int:
+        with _open(self.url, {'Range': f'bytes=-{INITIAL_TAIL}'}, self.timeout) as response:
+            content = response.read()
+            if response.status != 206:
+                # Range is not supported - we have the whole file
+                self._buffer_start, self._buffer = 0, content
+                return len(content)
+            match = _CONTENT_RANGE.fullmatch(response.headers.get('Content-Range', ''))
+        if match is None:
+            raise OSError(f'Invalid Content-Range from {self.url}')
+        start, _, size = (int(value) for value in match.groups())
+        self._buffer_start, self._buffer = start, content
+        return size
+
+    def _fill_buffer(self, start, end):
+        headers = {'Range': f'bytes={start}-{end - 1}'}
+        with _open(self.url, headers, self.timeout) as response:
+            content = response.read()
+            if response.status != 206:
+                self._buffer_start, self._buffer = 0, content
+                return
+        if len(content) != end - start:
+            raise OSError(f'Short read from {self.url}')
+        self._buffer_start, self._buffer = start, content
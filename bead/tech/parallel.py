@@ -0,0 +1,131 @@
+'''
+Concurrency helpers - for hiding I/O latency (e.g. network file systems).
+'''
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+# outstanding items per worker - keeps workers busy without reading all input up front
+QUEUE_DEPTH = 2
+
+
+def map_bounded(
+    function: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    ordered: bool = True,
+) -> Iterator[R]:
+    '''
+    Like `map`, but calls `function` from at most `max_workers` threads.
+
+    At most `max_workers * QUEUE_DEPTH` items are taken from `items` ahead of
+    the results, so `items` can be an arbitrarily long lazy iterable.
+
+    With ordered=False, results are yielded as soon as they are ready.
+    Exceptions raised by `function` are re-raised when their result would be yielded.
+    '''
+    if max_workers <= 1:
+        yield from map(function, items)
+        return
+
+    items = iter(items)
+    max_pending = max_workers * QUEUE_DEPTH
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_more(pending_count):
+            for _ in range(max_pending - pending_count):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                yield executor.submit(function, item)
+
+        if ordered:
+            queue = deque(submit_more(0))
+            while queue:
+                result = queue.popleft().result()
+                queue.extend(submit_more(len(queue)))
+                yield result
+        else:
+            pending = set(submit_more(0))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.update(submit_more(len(pending)))
+                for future in done:
+                    yield future.result()
+
+
+def submit_daemon(function: Callable[..., R], *args) -> 'Future[R]':
+    '''
+    Call function(*args) in a new daemon thread.
+
+    Unlike executor threads, a hanging call (e.g. on an unresponsive network mount)
+    does not prevent the process from exiting.
+    '''
+    future: 'Future[R]' = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def within_deadlines(
+    futures: Sequence['Future[R]'],
+    deadlines: Sequence[Optional[float]],
+    ordered: bool = True,
+) -> Iterator[Tuple[int, Optional['Future[R]']]]:
+    '''
+    Yield (index, future) pairs for futures done before their deadline.
+
+    Deadlines are `time.monotonic()` values, None meaning no deadline.
+    Futures missing their deadline are yielded as (index, None).
+    With ordered=False, futures are yielded as soon as they are done.
+    '''
+    def remaining(index):
+        deadline = deadlines[index]
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
+    if ordered:
+        return _within_deadlines_ordered(futures, remaining)
+    return _within_deadlines_unordered(futures, remaining)
+
+
+def _within_deadlines_ordered(futures, remaining):
+    for index, future in enumerate(futures):
+        try:
+            future.exception(timeout=remaining(index))
+        except TimeoutError:
+            yield index, None
+        else:
+            yield index, future
+
+
+def _within_deadlines_unordered(futures, remaining):
+    pending = dict((future, index) for index, future in enumerate(futures))
+    while pending:
+        timeouts = [remaining(index) for index in pending.values()]
+        timeout = min((t for t in timeouts if t is not None), default=None)
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+        for future, index in list(pending.items()):
+            if remaining(index) == 0:
+                del pending[future]
+                yield index, None
@@ -46,6 +46,31 @@ def file(file, file_size):
     return str(hash.hexdigest())
 
 
+def copy(source, target, file_size):
+    '''
+    Copy source file to target file and return sha512 hash for the content.
+
+    Like `file`, but the content is written to target while it is hashed.
+    '''
+
+    hash = hashlib.sha512()
+    _add_prefix(hash, file_size)
+
+    bytes_copied = 0
+
+    while True:
+        block = source.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        bytes_copied += len(block)
+        hash.update(block)
+        target.write(block)
+
+    # a different size results in a different hash
+    _add_suffix(hash, bytes_copied)
+    return str(hash.hexdigest())
+
+
 def bytes(bytes):
     '''
     Return sha512 hash for bytes.
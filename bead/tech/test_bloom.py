@@ -0,0 +1,32 @@
+from ..test import TestCase
+from .bloom import BloomFilter
+
+
+class Test_BloomFilter(TestCase):
+
+    # fixtures
+    def keys(self):
+        return [f'content-id-{i}' for i in range(1000)]
+
+    def bloom(self, keys):
+        return BloomFilter.from_keys(keys, 0.01)
+
+    # tests
+    def test_no_false_negatives(self, bloom, keys):
+        assert all(key in bloom for key in keys)
+
+    def test_false_positive_rate(self, bloom):
+        false_positives = sum(f'other-{i}' in bloom for i in range(1000))
+        assert false_positives < 50
+
+    def test_roundtrip(self, bloom, keys):
+        loaded = BloomFilter.from_bytes(bloom.to_bytes())
+        assert all(key in loaded for key in keys)
+        assert bloom.bits == loaded.bits
+
+    def test_empty(self):
+        assert 'anything' not in BloomFilter.from_keys([])
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(b'garbage')
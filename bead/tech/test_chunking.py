@@ -0,0 +1,50 @@
+import io
+import random
+
+from ..test import TestCase
+from . import chunking as m
+
+
+class Test_chunks(TestCase):
+
+    # fixtures
+    def content(self):
+        size = 4 * 1024 * 1024
+        return random.Random(0).getrandbits(8 * size).to_bytes(size, 'little')
+
+    def chunks(self, content):
+        return list(m.chunks(io.BytesIO(content)))
+
+    # tests
+    def test_chunks_make_up_content(self, content, chunks):
+        assert content == b''.join(chunks)
+
+    def test_chunk_sizes(self, chunks):
+        assert len(chunks) > 1
+        assert all(m.MIN_SIZE <= len(chunk) <= m.MAX_SIZE for chunk in chunks[:-1])
+
+    def test_insertion_changes_only_nearby_chunks(self, content, chunks):
+        changed = content[:1000] + b'inserted' + content[1000:]
+
+        changed_chunks = list(m.chunks(io.BytesIO(changed)))
+
+        assert chunks[1:] == changed_chunks[1:]
+
+    def test_small_content_is_single_chunk(self):
+        assert [b'small'] == list(m.chunks(io.BytesIO(b'small')))
+
+    def test_empty_content_has_no_chunks(self):
+        assert [] == list(m.chunks(io.BytesIO(b'')))
+
+    def test_boundary_on_scanned_block_border_is_found(self):
+        zero = m._BITS.index(0)
+        one = m._BITS.index(1)
+        # the boundary pattern is half zero bits then half one bits
+        border = m.MIN_SIZE + 1 - m.MASK_BITS + m._BLOCK_SIZE
+        for ones_from in range(border - m.MASK_BITS, border + m.MASK_BITS):
+            content = bytes([zero]) * ones_from + bytes([one]) * (m.MAX_SIZE - ones_from)
+            assert ones_from + m.MASK_BITS // 2 == m._cut_point(content)
+
+    def test_uniform_content_is_cut_at_max_size(self):
+        content = bytes(3 * m.MAX_SIZE)
+        assert [m.MAX_SIZE] * 3 == [len(chunk) for chunk in m.chunks(io.BytesIO(content))]
@@ -0,0 +1,76 @@
+import io
+import os
+
+from ..test import TestCase, HttpServer
+from . import http as m
+
+
+class Test_RangeFile(TestCase):
+
+    # fixtures
+    def content(self):
+        return os.urandom(500 * 1024)
+
+    def server(self, content):
+        directory = self.new_temp_dir()
+        with open(directory / 'file', 'wb') as f:
+            f.write(content)
+        return self.useFixture(HttpServer(directory))
+
+    def file(self, server):
+        return m.RangeFile(server.url + 'file')
+
+    # tests
+    def test_size(self, file, content):
+        assert len(content) == file.size
+        assert len(content) == file.seek(0, io.SEEK_END)
+
+    def test_random_access(self, file, content):
+        file.seek(1000)
+        assert content[1000:1100] == file.read(100)
+        file.seek(-10, io.SEEK_END)
+        assert content[-10:] == file.read()
+        assert b'' == file.read(10)
+
+    def test_only_needed_parts_are_transferred(self, file, server):
+        file.seek(100 * 1024)
+        file.read(10)
+        assert sum(size for _, size in server.requests) < 100 * 1024
+
+    def test_sequential_read(self, file, content):
+        chunks = []
+        while True:
+            chunk = file.read(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        assert content == b''.join(chunks)
+
+
+class Test_get(TestCase):
+
+    # fixtures
+    def server(self):
+        directory = self.new_temp_dir()
+        with open(directory / 'file', 'wb') as f:
+            f.write(b'0123456789')
+        return self.useFixture(HttpServer(directory))
+
+    # tests
+    def test_get(self, server):
+        assert b'0123456789' == m.get(server.url + 'file')
+
+    def test_get_from(self, server):
+        assert b'56789' == m.get_from(server.url + 'file', 5)
+        assert b'' == m.get_from(server.url + 'file', 10)
+
+    def test_missing(self, server):
+        assert m.get(server.url + 'missing') is None
+
+    def test_open_from(self, server):
+        stream, offset, size = m.open_from(server.url + 'file', 5)
+        with stream:
+            assert (5, 10, b'56789') == (offset, size, stream.read())
+        stream, offset, size = m.open_from(server.url + 'file', 10)
+        with stream:
+            assert (10, b'') == (offset, stream.read())
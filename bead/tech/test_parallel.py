@@ -0,0 +1,93 @@
+import threading
+import time
+
+from ..test import TestCase
+from .parallel import map_bounded, QUEUE_DEPTH, submit_daemon, within_deadlines
+
+
+class Test_map_bounded(TestCase):
+
+    def test_ordered(self):
+        assert [x * x for x in range(100)] == list(map_bounded(lambda x: x * x, range(100), 4))
+
+    def test_unordered_yields_all(self):
+        results = map_bounded(lambda x: x * x, range(100), 4, ordered=False)
+        assert sorted(x * x for x in range(100)) == sorted(results)
+
+    def test_runs_in_multiple_threads(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        def wait_for_other_thread(x):
+            barrier.wait()
+            return x
+
+        assert [1, 2] == list(map_bounded(wait_for_other_thread, [1, 2], 2))
+
+    def test_single_worker_is_sequential(self):
+        threads = set(map_bounded(lambda _: threading.get_ident(), range(10), 1))
+        assert {threading.get_ident()} == threads
+
+    def test_input_is_consumed_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(1000):
+                consumed.append(i)
+                yield i
+
+        results = map_bounded(lambda x: x, items(), 2)
+        assert 0 == next(results)
+        assert len(consumed) <= 2 * QUEUE_DEPTH + 1
+
+    def test_exception_is_reraised(self):
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        results = map_bounded(fail_on_3, range(10), 3)
+        with self.assertRaises(ValueError):
+            list(results)
+
+
+class Test_within_deadlines(TestCase):
+
+    # fixtures
+    def never(self):
+        event = threading.Event()
+        self.addCleanup(event.set)
+        return event
+
+    def futures(self, never):
+        return [
+            submit_daemon(lambda: 'fast'),
+            submit_daemon(never.wait),
+            submit_daemon(lambda: 'no deadline'),
+        ]
+
+    def deadlines(self):
+        soon = time.monotonic() + 0.1
+        return [soon, soon, None]
+
+    # tests
+    def test_ordered(self, futures, deadlines):
+        results = [
+            (index, future and future.result())
+            for index, future in within_deadlines(futures, deadlines)]
+        assert [(0, 'fast'), (1, None), (2, 'no deadline')] == results
+
+    def test_unordered(self, futures, deadlines):
+        results = [
+            (index, future and future.result())
+            for index, future in within_deadlines(futures, deadlines, ordered=False)]
+        assert {(0, 'fast'), (1, None), (2, 'no deadline')} == set(results)
+        # the late one is the last
+        assert (1, None) == results[-1]
+
+    def test_exception_is_kept_in_future(self):
+        def fail():
+            raise ValueError
+
+        (index, future), = within_deadlines([submit_daemon(fail)], [None])
+        with self.assertRaises(ValueError):
+            future.result()
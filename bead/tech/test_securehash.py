@@ -1,3 +1,4 @@
+import io
 import os
 
 from ..test import TestCase
@@ -65,3 +66,20 @@ class Test(TestCase):
 
     def then_the_hashes_are_the_same(self):
         assert self.__hashresult[0] == self.__hashresult[1]
+
+
+class Test_copy(TestCase):
+
+    def test_copy_hashes_like_bytes(self):
+        content = os.urandom(3 * 1024 ** 2 + 1)
+        target = io.BytesIO()
+
+        assert securehash.bytes(content) == securehash.copy(
+            io.BytesIO(content), target, len(content))
+        assert content == target.getvalue()
+
+    def test_short_content_has_different_hash(self):
+        content = b'content'
+
+        assert securehash.bytes(content) != securehash.copy(
+            io.BytesIO(content[:-1]), io.BytesIO(), len(content))
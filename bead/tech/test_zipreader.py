@@ -0,0 +1,169 @@
+import io
+import os
+from unittest import mock
+import warnings
+import zipfile
+
+from ..test import TestCase
+from .zipreader import ZipReader, BadZipFile, read_comment
+from . import zipreader as m
+
+
+class Test_ZipReader(TestCase):
+
+    # fixtures
+    def members(self):
+        return {
+            'meta/bead': b'{"kind": "test"}',
+            'code/stored': b'stored' * 1000,
+            'code/deflated': b'deflated' * 1000,
+            'data/bzip2': b'bzip2' * 1000,
+            'data/lzma': b'lzma' * 1000,
+            'data/random': os.urandom(300 * 1024),
+            'data/árvíztűrő': b'utf-8 name',
+        }
+
+    def zip_path(self, members):
+        path = self.new_temp_dir() / 'test.zip'
+        compressions = {
+            'code/stored': zipfile.ZIP_STORED,
+            'data/bzip2': zipfile.ZIP_BZIP2,
+            'data/lzma': zipfile.ZIP_LZMA,
+        }
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.comment = b'archive comment'
+            for name, content in members.items():
+                z.writestr(name, content, compressions.get(name, zipfile.ZIP_DEFLATED))
+        return path
+
+    def reader(self, zip_path):
+        reader = ZipReader(zip_path)
+        self.addCleanup(reader.close)
+        return reader
+
+    # tests
+    def test_members(self, reader, members):
+        for name, content in members.items():
+            assert content == reader.read(name), name
+            assert len(content) == reader.getinfo(name).file_size
+
+    def test_namelist(self, reader, zip_path):
+        with zipfile.ZipFile(zip_path) as z:
+            assert z.namelist() == reader.namelist()
+
+    def test_names_with_prefix(self, reader):
+        assert ['code/stored', 'code/deflated'] == reader.names_with_prefix('code/')
+        assert [] == reader.names_with_prefix('nothing/')
+
+    def test_missing_member(self, reader):
+        self.assertRaises(KeyError, reader.getinfo, 'meta')
+        assert 'meta' not in reader
+        assert 'meta/bead' in reader
+
+    def test_read_after_close(self, zip_path):
+        reader = ZipReader(zip_path)
+        reader.close()
+
+        self.assertRaises(ValueError, reader.read, 'meta/bead')
+
+    def test_read_after_close_of_file_object(self, zip_path):
+        with open(zip_path, 'rb') as f:
+            reader = ZipReader(f)
+            reader.close()
+
+            self.assertRaises(ValueError, reader.read, 'meta/bead')
+
+    def test_last_of_duplicate_names_wins(self, zip_path):
+        with zipfile.ZipFile(zip_path, 'a') as z:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                z.writestr('meta/bead', b'duplicate')
+
+        with ZipReader(zip_path) as reader:
+            assert b'duplicate' == reader.read('meta/bead')
+
+    def test_last_of_duplicate_names_wins_when_indexed(self, zip_path):
+        with zipfile.ZipFile(zip_path, 'a') as z:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                z.writestr('meta/bead', b'duplicate')
+
+        with ZipReader(zip_path) as reader:
+            reader.infolist()
+            assert b'duplicate' == reader.read('meta/bead')
+
+    def test_many_members_are_looked_up_without_searching_each(self):
+        path = self.new_temp_dir() / 'many.zip'
+        names = [f'data/{i:05d}' for i in range(5000)]
+        with zipfile.ZipFile(path, 'w') as z:
+            for name in names:
+                z.writestr(name, name)
+
+        with ZipReader(path) as reader:
+            with mock.patch.object(
+                reader, '_entries_named', wraps=reader._entries_named
+            ) as entries_named:
+                sizes = [reader.getinfo(name).file_size for name in names]
+                self.assertRaises(KeyError, reader.getinfo, 'data/missing')
+
+        assert [len(name) for name in names] == sizes
+        assert entries_named.call_count <= m.LOOKUPS_BEFORE_INDEX
+
+    def test_bad_crc(self, zip_path, members):
+        with open(zip_path, 'r+b') as f:
+            content = f.read()
+            f.seek(content.index(b'stored' * 10) + 600)
+            f.write(b'STORED')
+
+        with ZipReader(zip_path) as reader:
+            self.assertRaises(BadZipFile, reader.read, 'code/stored')
+
+    def test_file_object(self, zip_path, members):
+        with open(zip_path, 'rb') as f:
+            reader = ZipReader(io.BytesIO(f.read()))
+
+        assert members['data/random'] == reader.read('data/random')
+
+    def test_not_a_zip(self):
+        path = self.new_temp_dir() / 'not.zip'
+        with open(path, 'wb') as f:
+            f.write(b'not a zip file' * 100)
+
+        self.assertRaises(BadZipFile, ZipReader, path)
+
+    def test_zip64(self):
+        path = self.new_temp_dir() / 'zip64.zip'
+        with zipfile.ZipFile(path, 'w') as z:
+            with z.open('big', 'w', force_zip64=True) as f:
+                f.write(b'not really big')
+            z.writestr('small', b'small')
+
+        with ZipReader(path) as reader:
+            assert b'not really big' == reader.read('big')
+            assert b'small' == reader.read('small')
+
+
+class Test_read_comment(TestCase):
+
+    def test_comment(self):
+        path = self.new_temp_dir() / 'test.zip'
+        comment = b'comment with an end record signature PK\x05\x06 in it'
+        with zipfile.ZipFile(path, 'w') as z:
+            z.comment = comment
+            z.writestr('member', b'content')
+
+        assert comment == read_comment(path)
+
+    def test_no_comment(self):
+        path = self.new_temp_dir() / 'test.zip'
+        with zipfile.ZipFile(path, 'w') as z:
+            z.writestr('member', b'content')
+
+        assert b'' == read_comment(path)
+
+    def test_not_a_zip(self):
+        path = self.new_temp_dir() / 'not.zip'
+        with open(path, 'wb') as f:
+            f.write(b'not a zip file')
+
+        assert b'' == read_comment(path)
@@ -0,0 +1,415 @@
+'''
+Lean, read only zip file reader.
+
+`zipfile.ZipFile` creates a ZipInfo object for every entry of the central directory
+when opened, which takes seconds for archives with 100k+ files.
+Bead operations mostly need only a few members (meta/bead, meta/manifest, ...),
+or the members under a prefix.
+
+ZipReader reads the central directory as raw bytes and locates entries by
+searching for their names in it, parsing only the entries asked for.
+Members are decompressed by ZipReader itself, so the zipfile machinery is not used at all.
+'''
+
+import bz2
+import io
+import lzma
+import os
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Union
+from zipfile import BadZipFile, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+
+__all__ = ('ZipReader', 'Entry', 'BadZipFile', 'ZipSource', 'read_comment')
+
+# a path, or a seekable binary file (e.g. the remote file tech.http.RangeFile)
+ZipSource = Union[str, os.PathLike, BinaryIO, io.RawIOBase]
+
+
+# end of central directory record
+_EOCD = struct.Struct('<4s4H2LH')
+_EOCD_SIGNATURE = b'PK\x05\x06'
+# zip64 end of central directory locator and record
+_EOCD64_LOCATOR = struct.Struct('<4sLQL')
+_EOCD64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+_EOCD64 = struct.Struct('<4sQ2H2L4Q')
+_EOCD64_SIGNATURE = b'PK\x06\x06'
+# central directory file header
+_CENTRAL = struct.Struct('<4s4B4HL2L5H2L')
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+# local file header
+_LOCAL = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+
+_MAX_COMMENT = 0xffff
+_ZIP64_EXTRA_ID = 0x0001
+_FLAG_ENCRYPTED = 0x1
+_FLAG_UTF8 = 0x800
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# each name lookup searches the whole central directory,
+# after this many lookups all entries are parsed and indexed by name at once
+LOOKUPS_BEFORE_INDEX = 16
+
+
+class Entry(NamedTuple):
+    filename: str
+    flag_bits: int
+    compress_type: int
+    CRC: int
+    compress_size: int
+    file_size: int
+    header_offset: int
+
+    def is_dir(self) -> bool:
+        return self.filename.endswith('/')
+
+
+class ZipReader:
+    '''
+    Read only zip file with lazily parsed central directory.
+
+    Provides the subset of the zipfile.ZipFile reading interface used for bead archives
+    (open, getinfo, namelist, close), and lookup of names by prefix.
+    '''
+
+    def __init__(self, file: ZipSource):
+        # like zipfile, only a file opened here is closed
+        self._owns_file = False
+        if isinstance(file, (str, os.PathLike)):
+            file = open(file, 'rb')
+            self._owns_file = True
+        self._file = file
+        self._closed = False
+        self._lock = threading.Lock()
+        self._fd = _fileno(file) if hasattr(os, 'pread') else None
+        self._entries: Dict[str, Entry] = {}
+        # all entries are in _entries
+        self._indexed = False
+        self._lookups = 0
+        try:
+            self._central_directory, self._offset_shift = self._read_central_directory()
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self._closed = True
+        # the descriptor might be reused for another file after closing
+        self._fd = None
+        if self._owns_file:
+            self._file.close()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        if self._closed:
+            raise ValueError('Read from closed zip file')
+        if self._fd is not None:
+            # positional reads need no locking, concurrent member reads run in parallel
+            return os.pread(self._fd, size, offset)
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def _read_central_directory(self):
+        file_size = self._file.seek(0, io.SEEK_END)
+        tail_size = min(file_size, _EOCD.size + _MAX_COMMENT)
+        tail_offset = file_size - tail_size
+        tail = self._read_at(tail_offset, tail_size)
+        eocd_position = tail.rfind(_EOCD_SIGNATURE, 0, len(tail) - _EOCD.size + 4)
+        if eocd_position < 0:
+            raise BadZipFile('File is not a zip file')
+        (_, _, _, _, _, cd_size, cd_offset, _) = _EOCD.unpack_from(tail, eocd_position)
+        eocd_offset = tail_offset + eocd_position
+        cd_end = eocd_offset
+
+        locator_offset = eocd_offset - _EOCD64_LOCATOR.size
+        if locator_offset >= 0:
+            locator = self._read_at(locator_offset, _EOCD64_LOCATOR.size)
+            if locator.startswith(_EOCD64_LOCATOR_SIGNATURE):
+                eocd64_offset = locator_offset - _EOCD64.size
+                record = self._read_at(max(eocd64_offset, 0), _EOCD64.size)
+                if eocd64_offset < 0 or not record.startswith(_EOCD64_SIGNATURE):
+                    raise BadZipFile('Corrupt zip64 end of central directory')
+                eocd64 = _EOCD64.unpack(record)
+                cd_size, cd_offset = eocd64[8], eocd64[9]
+                cd_end = eocd64_offset
+
+        # non zero, if the zip is appended to an other file
+        offset_shift = cd_end - cd_size - cd_offset
+        if offset_shift < 0:
+            raise BadZipFile('Bad offset for central directory')
+        central_directory = self._read_at(cd_offset + offset_shift, cd_size)
+        if len(central_directory) != cd_size:
+            raise BadZipFile('Truncated central directory')
+        return central_directory, offset_shift
+
+    # entries
+
+    def _entry_at(self, position: int) -> Optional[Entry]:
+        '''
+        Entry with central directory header at position, None if there is no header there.
+        '''
+        cd = self._central_directory
+        if position < 0 or position + _CENTRAL.size > len(cd):
+            return None
+        if not cd.startswith(_CENTRAL_SIGNATURE, position):
+            return None
+        fields = _CENTRAL.unpack_from(cd, position)
+        (flag_bits, compress_type, crc, compress_size, file_size,
+         name_length, extra_length) = fields[5:7] + fields[9:14]
+        header_offset = fields[18]
+        name_start = position + _CENTRAL.size
+        raw_name = cd[name_start:name_start + name_length]
+        extra = cd[name_start + name_length:name_start + name_length + extra_length]
+        filename = raw_name.decode('utf-8' if flag_bits & _FLAG_UTF8 else 'cp437')
+        file_size, compress_size, header_offset = _apply_zip64_extra(
+            extra, file_size, compress_size, header_offset)
+        return Entry(
+            filename, flag_bits, compress_type, crc, compress_size, file_size,
+            header_offset + self._offset_shift)
+
+    def _entries_named(self, encoded_prefix: bytes, exact: bool) -> Iterator[Entry]:
+        # entry names are found by searching in the raw central directory,
+        # each match is checked to be preceded by a header
+        cd = self._central_directory
+        position = cd.find(encoded_prefix)
+        while position >= 0:
+            header = position - _CENTRAL.size
+            if header >= 0 and cd.startswith(_CENTRAL_SIGNATURE, header):
+                name_length, = struct.unpack_from('<H', cd, header + 28)
+                if not exact or name_length == len(encoded_prefix):
+                    entry = self._entry_at(header)
+                    if entry is not None:
+                        yield entry
+            position = cd.find(encoded_prefix, position + 1)
+
+    def getinfo(self, name: str) -> Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            pass
+        if not self._indexed:
+            self._lookups += 1
+            if self._lookups > LOOKUPS_BEFORE_INDEX:
+                self.infolist()
+        if self._indexed:
+            try:
+                return self._entries[name]
+            except KeyError:
+                raise KeyError(f'There is no item named {name!r} in the archive')
+        # like in zipfile, the last one wins for duplicate names
+        matches = [
+            entry
+            for entry in self._entries_named(name.encode('utf-8'), exact=True)
+            if entry.filename == name]
+        if not matches:
+            raise KeyError(f'There is no item named {name!r} in the archive')
+        self._entries[name] = matches[-1]
+        return matches[-1]
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.getinfo(name)
+            return True
+        except KeyError:
+            return False
+
+    def names_with_prefix(self, prefix: str) -> List[str]:
+        '''
+        Names of entries starting with prefix - parsing only those entries.
+        '''
+        return [
+            entry.filename
+            for entry in self._entries_named(prefix.encode('utf-8'), exact=False)
+            if entry.filename.startswith(prefix)]
+
+    def infolist(self) -> List[Entry]:
+        entries = []
+        cd = self._central_directory
+        position = 0
+        while position < len(cd):
+            entry = self._entry_at(position)
+            if entry is None:
+                raise BadZipFile('Bad magic number for central directory')
+            entries.append(entry)
+            name_length, extra_length, comment_length = struct.unpack_from(
+                '<3H', cd, position + 28)
+            position += _CENTRAL.size + name_length + extra_length + comment_length
+        if not self._indexed:
+            # like in zipfile, the last one wins for duplicate names
+            self._entries.update((entry.filename, entry) for entry in entries)
+            self._indexed = True
+        return entries
+
+    def namelist(self) -> List[str]:
+        return [entry.filename for entry in self.infolist()]
+
+    # content
+
+    def open(self, name: Union[str, Entry]) -> io.BufferedReader:
+        entry = name if isinstance(name, Entry) else self.getinfo(name)
+        if entry.flag_bits & _FLAG_ENCRYPTED:
+            raise NotImplementedError(f'Encrypted member {entry.filename}')
+        local = self._read_at(entry.header_offset, _LOCAL.size)
+        if len(local) != _LOCAL.size or not local.startswith(_LOCAL_SIGNATURE):
+            raise BadZipFile(f'Bad magic number for file header of {entry.filename}')
+        name_length, extra_length = _LOCAL.unpack(local)[10:12]
+        data_offset = entry.header_offset + _LOCAL.size + name_length + extra_length
+        member = _Member(self, entry, data_offset)
+        return io.BufferedReader(member, buffer_size=READ_BLOCK_SIZE)
+
+    def read(self, name: Union[str, Entry]) -> bytes:
+        with self.open(name) as f:
+            return f.read()
+
+
+def _fileno(file) -> Optional[int]:
+    try:
+        return file.fileno()
+    except (AttributeError, OSError):
+        # e.g. io.UnsupportedOperation for in memory or remote files
+        return None
+
+
+def read_comment(file: ZipSource) -> bytes:
+    '''
+    Archive comment of the zip file, reading only the end of the file.
+
+    Returns b'' if the file has no comment, or does not end in an end of central directory record.
+    '''
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return read_comment(f)
+    file_size = file.seek(0, io.SEEK_END)
+    tail_size = min(file_size, _EOCD.size + _MAX_COMMENT)
+    file.seek(file_size - tail_size)
+    tail = file.read(tail_size)
+    # the comment can contain the signature, the record is where the comment length fits
+    position = tail.rfind(_EOCD_SIGNATURE, 0, len(tail) - _EOCD.size + 4)
+    while position >= 0:
+        comment_length = _EOCD.unpack_from(tail, position)[-1]
+        if position + _EOCD.size + comment_length == len(tail):
+            return tail[position + _EOCD.size:]
+        position = tail.rfind(_EOCD_SIGNATURE, 0, position)
+    return b''
+
+
+def _apply_zip64_extra(extra: bytes, file_size, compress_size, header_offset):
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack_from('<2H', extra, position)
+        if header_id == _ZIP64_EXTRA_ID:
+            values = iter(struct.unpack_from(f'<{size // 8}Q', extra, position + 4))
+            # only the fields, that do not fit, are present - in this order
+            if file_size == 0xffffffff:
+                file_size = next(values)
+            if compress_size == 0xffffffff:
+                compress_size = next(values)
+            if header_offset == 0xffffffff:
+                header_offset = next(values)
+            break
+        position += 4 + size
+    return file_size, compress_size, header_offset
+
+
+def _decompressor(compress_type):
+    if compress_type == ZIP_DEFLATED:
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+    if compress_type == ZIP_BZIP2:
+        return bz2.BZ2Decompressor()
+    if compress_type == ZIP_LZMA:
+        return _LZMADecompressor()
+    raise NotImplementedError(f'Unsupported compression method {compress_type}')
+
+
+class _LZMADecompressor:
+    '''
+    Decompressor for zip's LZMA format: a properties header, followed by raw LZMA1 data.
+    '''
+
+    def __init__(self):
+        self._header = b''
+        self._decompressor = None
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._decompressor is None:
+            self._header += data
+            if len(self._header) < 4:
+                return b''
+            properties_size, = struct.unpack_from('<H', self._header, 2)
+            if len(self._header) < 4 + properties_size:
+                return b''
+            properties = self._header[4:4 + properties_size]
+            data = self._header[4 + properties_size:]
+            self._decompressor = lzma.LZMADecompressor(
+                lzma.FORMAT_RAW, filters=[_lzma1_filter(properties)])
+        return self._decompressor.decompress(data)
+
+
+def _lzma1_filter(properties: bytes):
+    pb, remainder = divmod(properties[0], 45)
+    lp, lc = divmod(remainder, 9)
+    dict_size, = struct.unpack_from('<L', properties, 1)
+    return {'id': lzma.FILTER_LZMA1, 'lc': lc, 'lp': lp, 'pb': pb, 'dict_size': dict_size}
+
+
+class _Member(io.RawIOBase):
+    '''
+    Decompressed content of a member, checked against its CRC at the end.
+    '''
+
+    def __init__(self, reader: ZipReader, entry: Entry, data_offset: int):
+        super().__init__()
+        self._reader = reader
+        self._entry = entry
+        self._offset = data_offset
+        self._compressed_left = entry.compress_size
+        self._left = entry.file_size
+        self._crc = 0
+        self._pending = b''
+        self._pending_offset = 0
+        if entry.compress_type == ZIP_STORED:
+            self._decompressor = None
+        else:
+            self._decompressor = _decompressor(entry.compress_type)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._pending_offset == len(self._pending) and self._left > 0:
+            self._pending = self._next_block()
+            self._pending_offset = 0
+        offset = self._pending_offset
+        size = min(len(buffer), len(self._pending) - offset, self._left)
+        buffer[:size] = self._pending[offset:offset + size]
+        self._pending_offset += size
+        self._left -= size
+        self._crc = zlib.crc32(buffer[:size], self._crc)
+        if self._left == 0 and self._crc != self._entry.CRC:
+            raise BadZipFile(f'Bad CRC-32 for file {self._entry.filename!r}')
+        return size
+
+    def _next_block(self) -> bytes:
+        if self._compressed_left <= 0:
+            raise BadZipFile(f'Truncated member {self._entry.filename!r}')
+        size = min(READ_BLOCK_SIZE, self._compressed_left)
+        data = self._reader._read_at(self._offset, size)
+        if len(data) != size:
+            raise BadZipFile(f'Truncated member {self._entry.filename!r}')
+        self._offset += size
+        self._compressed_left -= size
+        if self._decompressor is None:
+            return data
+        return self._decompressor.decompress(data)
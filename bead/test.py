@@ -1,8 +1,12 @@
 import contextlib
+import functools
+import http.server
 import io
 import os
 import pathlib
+import re
 import tempfile
+import threading
 
 from unittest import skip, skipIf, skipUnless
 
@@ -131,3 +135,72 @@ def CaptureStdout():
 
 def CaptureStderr():
     return _CaptureStream(contextlib.redirect_stderr)
+
+
+class _RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    SimpleHTTPRequestHandler with support for single range Range requests.
+
+    Served requests are recorded as (path, bytes sent) in the server's `requests`.
+    '''
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match is None or not os.path.isfile(path):
+            self.record(os.path.getsize(path) if os.path.isfile(path) else 0)
+            return super().do_GET()
+        with open(path, 'rb') as f:
+            content = f.read()
+        first, last = match.groups()
+        if not first:
+            first, last = max(len(content) - int(last), 0), len(content) - 1
+        else:
+            first, last = int(first), min(int(last or len(content) - 1), len(content) - 1)
+        if first >= len(content):
+            self.record(0)
+            self.send_error(416)
+            return
+        body = content[first:last + 1]
+        self.record(len(body))
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {first}-{last}/{len(content)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def record(self, size):
+        self.server.requests.append((self.path, size))
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpServer(Fixture):
+    '''
+    Serve a directory over HTTP, with Range request support.
+    '''
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+
+    def setUp(self):
+        super().setUp()
+        handler = functools.partial(_RangeRequestHandler, directory=self.directory)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.requests = []
+        thread = threading.Thread(
+            target=self.server.serve_forever, kwargs=dict(poll_interval=0.01), daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/'
+
+    @property
+    def requests(self):
+        return self.server.requests
@@ -5,6 +5,7 @@ import os
 import zipfile
 
 from . import layouts
+from .ziparchive import ZipArchive
 
 
 class Test_Archive(TestCase):
@@ -30,6 +31,31 @@ class Test_Archive(TestCase):
         self.when_content_id_is_checked()
         self.then_content_id_is_a_string()
 
+    def test_archive_is_opened_only_when_metadata_is_needed(self):
+        missing = self.new_temp_dir() / 'missing_20200913T173910000000+0000.zip'
+        bead = m.Archive(missing)
+
+        assert 'missing' == bead.name
+        with self.assertRaises(m.InvalidArchive):
+            bead.kind
+
+    def test_parallel_extract_dir(self):
+        path = self.new_temp_dir() / 'bead.zip'
+        files = {f'data/dir{i % 3}/sub{i % 2}/file{i}': os.urandom(i * 1000) for i in range(20)}
+        with zipfile.ZipFile(path, 'w') as z:
+            z.writestr(layouts.Archive.BEAD_META, b'{}')
+            z.writestr('data/empty/', b'')
+            for name, content in files.items():
+                z.writestr(name, content)
+        extracted_dir = self.new_temp_dir() / 'extracted'
+
+        ZipArchive(path).extract_dir('data', extracted_dir, max_workers=4)
+
+        assert os.path.isdir(extracted_dir / 'empty')
+        for name, content in files.items():
+            with open(extracted_dir / name[len('data/'):], 'rb') as f:
+                assert content == f.read()
+
     # implementation
 
     __bead = None
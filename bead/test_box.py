@@ -1,26 +1,35 @@
+import os
+import threading
+from unittest import mock
+
 from .test import TestCase
-from .box import Box
+from .box import Box, UnionBox, BY_NAME, CHUNKED, FLAT
 from .tech.fs import write_file, rmtree
 from .tech.timestamp import time_from_user
 from .workspace import Workspace
+from .ziparchive import ZipArchive
+from . import layouts
 from . import spec as bead_spec
+from . import summary
+
+
+def add_beads(test, box):
+    for name, kind, freeze_time in (
+        ('bead1', 'test-bead1', '20160704T000000000000+0200'),
+        ('bead2', 'test-bead2', '20160704T162800000000+0200'),
+        ('BEAD3', 'test-bead3', '20160704T162800000001+0200'),
+    ):
+        ws = Workspace(test.new_temp_dir() / name)
+        ws.create(kind)
+        box.store(ws, freeze_time)
+    return box
 
 
 class Test_box_with_beads(TestCase):
 
     # fixtures
     def box(self):
-        box = Box('test', self.new_temp_dir())
-
-        def add_bead(name, kind, freeze_time):
-            ws = Workspace(self.new_temp_dir() / name)
-            ws.create(kind)
-            box.store(ws, freeze_time)
-
-        add_bead('bead1', 'test-bead1', '20160704T000000000000+0200')
-        add_bead('bead2', 'test-bead2', '20160704T162800000000+0200')
-        add_bead('BEAD3', 'test-bead3', '20160704T162800000001+0200')
-        return box
+        return add_beads(self, Box('test', self.new_temp_dir()))
 
     def timestamp(self):
         return time_from_user('20160704T162800000000+0200')
@@ -53,6 +62,27 @@ class Test_box_with_beads(TestCase):
         matches = box.get_context(bead_spec.BEAD_NAME, 'BEAD3', timestamp)
         assert 'BEAD3' == matches.best.name
 
+    def test_beads_since(self, box):
+        beads, offset = box.beads_since()
+        assert ['bead1', 'bead2', 'BEAD3'] == [bead.name for bead in beads]
+
+        ws = Workspace(self.new_temp_dir() / 'bead4')
+        ws.create('test-bead4')
+        box.store(ws, '20160705T000000000000+0200')
+
+        beads, _ = box.beads_since(offset)
+        assert ['bead4'] == [bead.name for bead in beads]
+        assert 'test-bead4' == beads[0].kind
+
+
+class Test_chunked_box(Test_box_with_beads):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        box.set_storage(CHUNKED)
+        return add_beads(self, box)
+
 
 class Test_box_methods_tolerate_junk_in_box(Test_box_with_beads):
 
@@ -62,3 +92,318 @@ class Test_box_methods_tolerate_junk_in_box(Test_box_with_beads):
         # add junk
         write_file(box.directory / 'some-non-bead-file', 'random bits')
         return box
+
+
+class Test_sharded_box(Test_box_with_beads):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        box.reshard(BY_NAME)
+        return add_beads(self, box)
+
+    # tests
+    def test_archives_are_stored_by_name(self, box):
+        assert os.path.isfile(box.directory / 'bead1' / 'bead1_20160704T000000000000+0200.zip')
+
+    def test_top_level_archives_are_found_by_name(self, box):
+        # as stored by a client not knowing about shards
+        ws = Workspace(self.new_temp_dir() / 'bead1')
+        ws.create('test-bead1')
+        write_file(ws.directory / 'output/data', 'new data')
+        ws.pack(box.directory / 'bead1_20160705T000000000000+0200.zip',
+                '20160705T000000000000+0200', 'comment')
+
+        latest = UnionBox([box]).get_at(
+            bead_spec.BEAD_NAME, 'bead1', time_from_user('20160706T000000000000+0200'))
+        assert '20160705T000000000000+0200' == latest.freeze_time_str
+        beads = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        assert 2 == len(list(beads))
+
+    def test_top_level_archives_are_found_with_empty_shard(self, box):
+        os.rename(
+            box.directory / 'bead1' / 'bead1_20160704T000000000000+0200.zip',
+            box.directory / 'bead1_20160704T000000000000+0200.zip')
+
+        bead1 = UnionBox([box]).get_at(
+            bead_spec.BEAD_NAME, 'bead1', time_from_user('20160706T000000000000+0200'))
+        assert 'test-bead1' == bead1.kind
+
+    def test_name_query_keeps_journal_of_other_shards(self, box):
+        list(box.all_beads())
+        ws = Workspace(self.new_temp_dir() / 'bead2')
+        ws.create('test-bead2')
+        box.store(ws, '20160705T000000000000+0200')
+        box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+
+        box._archives_from = must_not_load
+        assert 4 == len(list(box.all_beads()))
+
+
+def must_not_load(paths, **kwargs):
+    assert [] == list(paths)
+    return []
+
+
+class Test_box_resharding(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Test_box_with_beads.box(self)
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        bead1.save_cache()
+        return box
+
+    def names(self, box):
+        return sorted(bead.name for bead in box.all_beads())
+
+    # tests
+    def test_reshard_moves_archives_and_xmeta(self, box, names):
+        box.reshard(BY_NAME)
+
+        assert os.path.isfile(box.directory / 'bead1' / 'bead1_20160704T000000000000+0200.zip')
+        assert os.path.isfile(box.directory / 'bead1' / 'bead1_20160704T000000000000+0200.xmeta')
+        assert names == sorted(bead.name for bead in Box('test', box.directory).all_beads())
+
+    def test_reshard_back_to_flat(self, box, names):
+        box.reshard(BY_NAME)
+        box.reshard(FLAT)
+
+        assert not os.path.exists(box.directory / 'bead1')
+        assert os.path.isfile(box.directory / 'bead1_20160704T000000000000+0200.zip')
+        assert names == sorted(bead.name for bead in Box('test', box.directory).all_beads())
+
+    def test_reshard_keeps_index(self, box):
+        list(box.all_beads())
+        box.reshard(BY_NAME)
+
+        box = Box('test', box.directory)
+        box._archives_from = must_not_load
+        assert 3 == len(list(box.all_beads()))
+
+    def test_name_query_does_not_scan_other_shards(self, box):
+        box.reshard(BY_NAME)
+        list(box.all_beads())
+        write_file(box.directory / 'bead2' / 'bead2_20160705T000000000000+0200.zip', 'junk')
+
+        box = Box('test', box.directory)
+        box._archives_from = must_not_load
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        assert 'bead1' == bead1.name
+
+
+class Test_box_without_index(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Test_box_with_beads.box(self)
+        rmtree(box.directory / layouts.Box.META)
+        # as if the index could not be stored in the box
+        box.index._persistent = False
+        return box
+
+    def opened_zips(self):
+        opened_zips = []
+
+        def recording_zip_archive(filename, box_name=''):
+            opened_zips.append(os.path.basename(filename))
+            return ZipArchive(filename, box_name)
+        patcher = mock.patch('bead.chunk_store.ZipArchive', recording_zip_archive)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return opened_zips
+
+    def read_summaries(self):
+        read_summaries = []
+        read = summary.read
+
+        def recording_read(filename):
+            read_summaries.append(os.path.basename(filename))
+            return read(filename)
+        patcher = mock.patch('bead.summary.read', recording_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return read_summaries
+
+    # tests
+    def test_name_query_reads_only_archives_with_matching_file_name(
+        self, box, opened_zips, read_summaries
+    ):
+        bead, = box._beads([(bead_spec.KIND, 'test-bead1'), (bead_spec.BEAD_NAME, 'bead1')])
+
+        assert 'bead1' == bead.name
+        assert ['bead1_20160704T000000000000+0200.zip'] == read_summaries
+        # the summary in the archive comment has all the needed metadata
+        assert [] == opened_zips
+
+    def test_kind_query(self, box):
+        bead, = box._beads([(bead_spec.KIND, 'test-bead2')])
+
+        assert 'bead2' == bead.name
+
+    def test_all_beads(self, box):
+        assert ['BEAD3', 'bead1', 'bead2'] == [bead.name for bead in box.all_beads()]
+
+
+class Test_box_context_by_timeline(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        for day in range(1, 6):
+            ws = Workspace(self.new_temp_dir() / 'bead')
+            ws.create('test-bead')
+            box.store(ws, f'2016070{day}T000000000000+0200')
+        # forget everything, so that each archive access is visible
+        rmtree(box.directory / layouts.Box.META)
+        return box
+
+    def loaded_paths(self, box):
+        loaded_paths = []
+        archives_from = box._archives_from
+
+        def recording_archives_from(paths):
+            paths = list(paths)
+            loaded_paths.extend(paths)
+            return archives_from(paths)
+        box._archives_from = recording_archives_from
+        return loaded_paths
+
+    # tests
+    def test_only_selected_archives_are_opened(self, box, loaded_paths):
+        context = box.get_context(
+            bead_spec.BEAD_NAME, 'bead', time_from_user('20160703T120000000000+0200'))
+
+        assert context.bead is None
+        assert '20160703T000000000000+0200' == context.prev.freeze_time_str
+        assert '20160704T000000000000+0200' == context.next.freeze_time_str
+        assert 2 == len(loaded_paths)
+
+    def test_exact_match(self, box, loaded_paths):
+        context = box.get_context(
+            bead_spec.BEAD_NAME, 'bead', time_from_user('20160703T000000000000+0200'))
+
+        assert '20160703T000000000000+0200' == context.best.freeze_time_str
+        assert '20160702T000000000000+0200' == context.prev.freeze_time_str
+        assert '20160704T000000000000+0200' == context.next.freeze_time_str
+        assert 3 == len(loaded_paths)
+
+    def test_unknown_name(self, box):
+        with self.assertRaises(LookupError):
+            box.get_context(
+                bead_spec.BEAD_NAME, 'unknown', time_from_user('20160703T000000000000+0200'))
+
+    def test_misleading_file_name_falls_back_to_archive_metadata(self, box):
+        os.rename(
+            box.directory / 'bead_20160703T000000000000+0200.zip',
+            box.directory / 'bead_20160709T000000000000+0200.zip')
+
+        context = box.get_context(
+            bead_spec.BEAD_NAME, 'bead', time_from_user('20160708T000000000000+0200'))
+
+        assert '20160705T000000000000+0200' == context.best.freeze_time_str
+
+
+class Test_box_parallel_loading(TestCase):
+
+    # fixtures
+    box = Test_box_with_beads.box
+
+    # tests
+
+    def test_parallel_loading_finds_all_beads(self, box):
+        rmtree(box.directory / layouts.Box.META)
+        beads = list(box.all_beads(max_workers=4, ordered=False))
+        assert ['BEAD3', 'bead1', 'bead2'] == sorted(bead.name for bead in beads)
+
+    def test_ordered_loading_is_sorted_by_file_name(self, box):
+        rmtree(box.directory / layouts.Box.META)
+        beads = list(box.all_beads(max_workers=4))
+        assert ['BEAD3', 'bead1', 'bead2'] == [bead.name for bead in beads]
+
+
+class HangingBox(Box):
+
+    def __init__(self, name, timeout=None):
+        super().__init__(name, '/non-existing', timeout)
+        self.release = threading.Event()
+
+    def get_context(self, check_type, check_param, time):
+        self.release.wait()
+        raise LookupError
+
+    def all_beads(self, max_workers=None, ordered=True):
+        self.release.wait()
+        return iter([])
+
+    def find_bead(self, name, content_id):
+        self.release.wait()
+
+
+class Test_union_box_streaming(TestCase):
+
+    # fixtures
+    box = Test_box_with_beads.box
+
+    def produced(self):
+        return []
+
+    def unionbox(self, box, produced):
+        all_beads = box.all_beads
+
+        def recording_all_beads(**kwargs):
+            for bead in all_beads(**kwargs):
+                produced.append(bead.name)
+                yield bead
+        box.all_beads = recording_all_beads
+        empty_box = Box('empty', self.new_temp_dir())
+        return UnionBox([empty_box, box])
+
+    # tests
+    def test_beads_are_not_collected_up_front(self, unionbox, produced):
+        beads = unionbox.all_beads()
+        first = next(beads)
+
+        assert [first.name] == produced
+        assert 2 == len(list(beads))
+        assert 3 == len(produced)
+
+
+class Test_union_box_with_unresponsive_box(TestCase):
+
+    # fixtures
+    box = Test_box_with_beads.box
+    timestamp = Test_box_with_beads.timestamp
+
+    def hanging_box(self):
+        box = HangingBox('hanging', timeout=0.1)
+        self.addCleanup(box.release.set)
+        return box
+
+    def timeouts(self):
+        return []
+
+    def unionbox(self, hanging_box, box, timeouts):
+        return UnionBox(
+            [hanging_box, box],
+            on_timeout=lambda box, timeout: timeouts.append((box.name, timeout)))
+
+    # tests
+    def test_get_context_skips_unresponsive_box(self, unionbox, timestamp, timeouts):
+        context = unionbox.get_context(bead_spec.BEAD_NAME, 'bead2', timestamp)
+        assert 'bead2' == context.best.name
+        assert [('hanging', 0.1)] == timeouts
+
+    def test_all_beads_skips_unresponsive_box(self, unionbox, hanging_box, timeouts):
+        assert {'bead1', 'bead2', 'BEAD3'} == {bead.name for bead in unionbox.all_beads()}
+        assert [hanging_box] == unionbox.timed_out_boxes
+        assert [('hanging', 0.1)] == timeouts
+
+    def test_find_bead_skips_unresponsive_box(self, unionbox, box, timeouts):
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+
+        bead = unionbox.find_bead('bead1', bead1.content_id)
+
+        assert bead1.archive_filename == bead.archive_filename
+        assert [('hanging', 0.1)] == timeouts
+        assert unionbox.find_bead('bead1', 'unknown content id') is None
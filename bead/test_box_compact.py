@@ -0,0 +1,101 @@
+from datetime import timedelta
+import os
+import shutil
+import zipfile
+
+from .test import TestCase, setenv
+from .box import Box
+from .workspace import Workspace
+from . import box_compact as m
+from . import tech
+
+
+class Test_compact(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('box', self.new_temp_dir())
+
+        def add_bead(name, freeze_time):
+            ws = Workspace(self.new_temp_dir() / name)
+            ws.create('test-' + name)
+            tech.fs.write_file(ws.directory / 'output/data', 'compressible data\n' * 10000)
+            with setenv('BEAD_ZIP_COMPRESSION', 'stored'):
+                box.store(ws, freeze_time)
+
+        add_bead('bead1', '20160704T000000000000+0200')
+        add_bead('bead2', '20160704T162800000000+0200')
+        add_bead('bead2', '20160704T162800000001+0200')
+        return box
+
+    def superseded(self, box):
+        path, = m.compaction_candidates(box)
+        return path
+
+    def beads(self, box):
+        def beads():
+            return sorted(
+                (bead.name, bead.content_id, bead.freeze_time_str)
+                for bead in Box(box.name, box.directory).all_beads())
+        return beads
+
+    # tests
+    def test_superseded_archives_are_candidates(self, superseded):
+        assert os.path.basename(superseded) == 'bead2_20160704T162800000000+0200.zip'
+
+    def test_old_archives_are_candidates(self, box):
+        assert 3 == len(m.compaction_candidates(box, older_than=timedelta(days=1)))
+
+    def test_compacted_archive_keeps_identity(self, superseded, beads):
+        before = beads()
+        size = os.path.getsize(superseded)
+
+        outcome, saved = m.compact_archive(superseded)
+
+        assert m.COMPACTED == outcome
+        assert size - saved == os.path.getsize(superseded)
+        assert before == beads()
+
+    def test_lzma(self, superseded, beads):
+        before = beads()
+
+        assert m.COMPACTED == m.compact_archive(superseded, m.LZMA)[0]
+        assert m.ALREADY_COMPACT == m.compact_archive(superseded, m.LZMA)[0]
+
+        with zipfile.ZipFile(superseded) as z:
+            assert {zipfile.ZIP_LZMA} == {info.compress_type for info in z.infolist()}
+        assert before == beads()
+
+    def test_compression_level_is_used(self, superseded):
+        sizes = {}
+        for level in (1, 9):
+            copy = self.new_temp_dir() / os.path.basename(superseded)
+            shutil.copy(superseded, copy)
+            m.compact_archive(copy, level=level)
+            sizes[level] = os.path.getsize(copy)
+
+        assert sizes[9] < sizes[1]
+
+    def test_member_attributes_are_kept(self, superseded):
+        def attributes():
+            with zipfile.ZipFile(superseded) as z:
+                return [(info.filename, info.external_attr) for info in z.infolist()]
+        before = attributes()
+
+        m.compact_archive(superseded)
+
+        assert before == attributes()
+
+    def test_hardlinked_archive_is_skipped(self, superseded):
+        os.link(superseded, self.new_temp_dir() / 'link')
+
+        assert (m.LINKED, 0) == m.compact_archive(superseded)
+
+    def test_invalid_archive_is_left_alone(self, box):
+        invalid = box.directory / 'broken_20160704T000000000000+0200.zip'
+        tech.fs.write_file(invalid, 'partial copy')
+
+        assert (m.INVALID, 0) == m.compact_archive(invalid)
+        assert 'partial copy' == tech.fs.read_file(invalid)
+        assert ['broken_20160704T000000000000+0200.zip'] == [
+            f for f in os.listdir(box.directory) if f.startswith(('broken', '.broken'))]
@@ -0,0 +1,78 @@
+import os
+import shutil
+
+from .test import TestCase
+from .box import Box
+from .workspace import Workspace
+from . import box_dedupe as m
+from . import tech
+
+
+FREEZE_TIME = '20160704T000000000000+0200'
+
+
+class Test_dedupe(TestCase):
+
+    # fixtures
+    def workspace(self):
+        ws = Workspace(self.new_temp_dir() / 'bead')
+        ws.create('test-bead')
+        tech.fs.write_file(ws.directory / 'output/data', 'data')
+        return ws
+
+    def box1(self, workspace):
+        box = Box('box1', self.new_temp_dir())
+        box.store(workspace, FREEZE_TIME)
+        return box
+
+    def box2(self, box1):
+        box = Box('box2', self.new_temp_dir())
+        archive, = box1.archive_paths()
+        shutil.copy(archive, box.directory)
+        tech.fs.write_file(box.directory / f'bead_{FREEZE_TIME}.xmeta', 'box2 specific')
+        return box
+
+    def archive1(self, box1):
+        archive, = box1.archive_paths()
+        return archive
+
+    def archive2(self, box2):
+        archive, = [path for path in box2.archive_paths() if path.endswith('.zip')]
+        return archive
+
+    # tests
+    def test_identical_archives_are_linked(self, box1, box2, archive1, archive2):
+        duplicate, = m.find_duplicates([box1, box2])
+        assert os.path.getsize(archive1) == duplicate.reclaimable
+
+        assert duplicate.reclaimable == m.dedupe([duplicate])
+
+        assert os.path.samefile(archive1, archive2)
+        assert 'box2 specific' == tech.fs.read_file(box2.directory / f'bead_{FREEZE_TIME}.xmeta')
+        assert [] == m.find_duplicates([box1, box2])
+
+    def test_linked_archives_are_still_beads(self, box1, box2):
+        m.dedupe(m.find_duplicates([box1, box2]))
+
+        assert 1 == len(list(box2.all_beads()))
+
+    def test_different_archive_files_are_not_linked(self, box1, workspace):
+        box3 = Box('box3', self.new_temp_dir())
+        workspace.pack(
+            box3.directory / f'bead_{FREEZE_TIME}.zip', FREEZE_TIME, comment='other comment')
+        bead1, = box1.all_beads()
+        bead3, = box3.all_beads()
+        assert bead1.content_id == bead3.content_id
+
+        assert [] == m.find_duplicates([box1, box3])
+
+    def test_link_replaces_file(self):
+        original = self.new_temp_dir() / 'original'
+        path = self.new_temp_dir() / 'path'
+        tech.fs.write_file(original, 'content')
+        tech.fs.write_file(path, 'content')
+
+        m.link(original, path)
+
+        assert os.path.samefile(original, path)
+        assert ['path'] == os.listdir(os.path.dirname(path))
@@ -0,0 +1,206 @@
+import os
+from unittest import mock
+
+from .test import TestCase
+from .archive import Archive
+from .box import Box, BY_NAME
+from .box_index import BoxIndex
+from .workspace import Workspace
+from . import layouts
+from . import spec as bead_spec
+from . import tech
+
+
+class Test_box_index(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+
+        def add_bead(name, kind, freeze_time):
+            ws = Workspace(self.new_temp_dir() / name)
+            ws.create(kind)
+            box.store(ws, freeze_time)
+
+        add_bead('bead1', 'test-bead1', '20160704T000000000000+0200')
+        add_bead('bead2', 'test-bead2', '20160704T162800000000+0200')
+        add_bead('bead2', 'test-bead2', '20160704T162800000001+0200')
+        return box
+
+    def loaded_paths(self):
+        return []
+
+    def load_archives(self, box, loaded_paths):
+        def load_archives(paths):
+            paths = list(paths)
+            loaded_paths.extend(paths)
+            return box._archives_from(paths)
+        return load_archives
+
+    # tests
+    def test_index_is_persisted_in_box(self, box):
+        list(box.all_beads())
+        assert os.path.isfile(box.directory / layouts.Box.INDEX)
+
+    def test_unchanged_archives_are_not_reopened(self, box, load_archives, loaded_paths):
+        list(box.all_beads())
+
+        index = BoxIndex(box.directory, box.name)
+        beads = list(index.beads([], load_archives))
+
+        assert [] == loaded_paths
+        assert ['bead1', 'bead2', 'bead2'] == [bead.name for bead in beads]
+        assert {'test'} == {bead.box_name for bead in beads}
+
+    def test_stored_beads_are_indexed_from_journal(self, box, load_archives, loaded_paths):
+        beads = list(BoxIndex(box.directory, box.name).beads([], load_archives))
+
+        assert [] == loaded_paths
+        assert 3 == len(beads)
+
+    def test_changed_archive_is_reopened(self, box, load_archives, loaded_paths):
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        stat = os.stat(bead1.archive_filename)
+        os.utime(bead1.archive_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        list(BoxIndex(box.directory, box.name).beads([], load_archives))
+
+        assert [bead1.archive_filename] == loaded_paths
+
+    def test_removed_archive_is_dropped(self, box):
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        os.remove(bead1.archive_filename)
+
+        assert ['bead2', 'bead2'] == [bead.name for bead in box.all_beads()]
+
+    def test_query_by_kind_and_content_id_prefix(self, box):
+        bead1, = box._beads([(bead_spec.KIND, 'test-bead1')])
+        prefix = bead1.content_id[:8]
+
+        beads = list(box._beads([(bead_spec.CONTENT_ID, prefix)]))
+
+        assert [bead1.archive_filename] == [bead.archive_filename for bead in beads]
+
+    def test_indexed_metadata_matches_archive(self, box):
+        for bead in box.all_beads():
+            ziparchive = bead.ziparchive
+            assert ziparchive.content_id == bead.content_id
+            assert ziparchive.kind == bead.kind
+            assert ziparchive.freeze_time_str == bead.freeze_time_str
+            assert ziparchive.inputs == bead.inputs
+
+    def test_invalid_archive_is_not_reopened_until_changed(
+        self, box, load_archives, loaded_paths
+    ):
+        invalid = box.directory / 'broken_20160704T000000000000+0200.zip'
+        tech.fs.write_file(invalid, 'partial copy')
+        list(box.all_beads())
+
+        list(BoxIndex(box.directory, box.name).beads([], load_archives))
+        assert [] == loaded_paths
+
+        tech.fs.write_file(invalid, 'longer partial copy')
+        list(BoxIndex(box.directory, box.name).beads([], load_archives))
+        assert [invalid] == loaded_paths
+
+    def test_invalid_archives_are_reported(self, box):
+        invalid = box.directory / 'broken_20160704T000000000000+0200.zip'
+        tech.fs.write_file(invalid, 'partial copy')
+
+        assert [invalid] == box.invalid_archives()
+
+        os.remove(invalid)
+        assert [] == box.invalid_archives()
+
+    def settle(self, box):
+        # make the box directory old enough to trust its mtime
+        stat = os.stat(box.directory)
+        old_mtime = stat.st_mtime_ns - 10 * 10**9
+        os.utime(box.directory, ns=(stat.st_atime_ns, old_mtime))
+
+    def test_content_filter_rules_out_unknown_content(self, box):
+        list(box.all_beads())
+        self.settle(box)
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+
+        assert box.index.may_contain(bead1.content_id)
+        assert not box.index.may_contain('unknown content id')
+        assert box.find_bead('bead1', 'unknown content id') is None
+
+    def test_content_filter_is_stale_after_box_change(self, box):
+        list(box.all_beads())
+        self.settle(box)
+        list(box.all_beads())
+        tech.fs.write_file(box.directory / 'new_20160704T000000000000+0200.zip', 'new')
+
+        assert box.index.may_contain('unknown content id')
+
+    def test_without_content_filter_anything_may_be_in_box(self, box):
+        assert box.index.may_contain('unknown content id')
+
+    def test_content_filter_is_stale_after_invalid_archive_is_completed(self, box):
+        partial = box.directory / 'late_20160704T000000000000+0200.zip'
+        tech.fs.write_file(partial, 'partial copy')
+        list(box.all_beads())
+        self.settle(box)
+        list(box.all_beads())
+        assert os.path.isfile(box.index.content_filter_path)
+
+        workspace = Workspace(self.new_temp_dir() / 'late')
+        workspace.create('late')
+        tech.fs.write_file(workspace.directory / 'output/data', 'late data')
+        complete = self.new_temp_dir() / 'complete.zip'
+        workspace.pack(complete, '20160704T000000000000+0200', 'comment')
+        with open(complete, 'rb') as source, open(partial, 'r+b') as target:
+            target.write(source.read())
+        content_id = Archive(complete).content_id
+
+        assert box.index.may_contain(content_id)
+        late = box.find_bead('late', content_id)
+        assert late is not None and late.archive_filename == partial
+
+        list(box.all_beads())
+        assert box.index.may_contain(content_id)
+
+
+class Test_sharded_box_index(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        box.reshard(BY_NAME)
+        for name in ('bead1', 'bead2'):
+            ws = Workspace(self.new_temp_dir() / name)
+            ws.create('test-' + name)
+            tech.fs.write_file(ws.directory / 'output/data', name)
+            box.store(ws, '20160704T000000000000+0200')
+        return box
+
+    def index(self, box):
+        return BoxIndex(box.directory, box.name, sharded=True)
+
+    def loaded_paths(self):
+        return []
+
+    load_archives = Test_box_index.load_archives
+
+    # tests
+    def test_name_query_advances_journal(self, index, load_archives):
+        query = [(bead_spec.BEAD_NAME, 'bead1')]
+        list(index.beads(query, load_archives))
+
+        with mock.patch.object(index.journal, 'read', wraps=index.journal.read) as read:
+            list(index.beads(query, load_archives))
+            offset, = read.call_args.args
+            assert ([], offset) == index.journal.read(offset)
+            assert offset == os.path.getsize(index.journal.path)
+
+    def test_journaled_beads_of_other_shards_are_not_reopened(
+        self, index, load_archives, loaded_paths
+    ):
+        list(index.beads([(bead_spec.BEAD_NAME, 'bead1')], load_archives))
+
+        beads = list(index.beads([], load_archives))
+
+        assert [] == loaded_paths
+        assert ['bead1', 'bead2'] == sorted(bead.name for bead in beads)
@@ -0,0 +1,101 @@
+import os
+
+from .test import TestCase, HttpServer
+from .box import Box
+from .http_box import HttpBox
+from .workspace import Workspace
+from . import box_sync as m
+from . import spec as bead_spec
+from . import tech
+
+
+def sync(source, destination):
+    return list(m.sync(source, destination))
+
+
+def contents(box):
+    return sorted((bead.name, bead.content_id) for bead in box.all_beads())
+
+
+class Test_sync(TestCase):
+
+    # fixtures
+    def source(self):
+        box = Box('source', self.new_temp_dir())
+
+        def add_bead(name, freeze_time):
+            ws = Workspace(self.new_temp_dir() / name)
+            ws.create('test-' + name)
+            tech.fs.write_file(ws.directory / 'output/data', freeze_time)
+            box.store(ws, freeze_time)
+
+        add_bead('bead1', '20160704T000000000000+0200')
+        add_bead('bead2', '20160704T162800000000+0200')
+        add_bead('bead2', '20160704T162800000001+0200')
+        return box
+
+    def destination(self):
+        return Box('destination', self.new_temp_dir())
+
+    def bead1(self, source):
+        bead1, = source._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        return bead1
+
+    def partial(self, destination, bead1):
+        file_name = os.path.basename(bead1.archive_filename)
+        return destination.directory / f'.{file_name}{m.PARTIAL_SUFFIX}'
+
+    # tests
+    def test_missing_beads_are_copied(self, source, destination):
+        assert 3 == len(sync(source, destination))
+        assert contents(source) == contents(destination)
+
+    def test_present_beads_are_not_copied(self, source, destination):
+        sync(source, destination)
+        os.remove(destination.archive_paths()[0])
+
+        copied, = sync(source, destination)
+        assert [] == m.missing_beads(source, destination)
+
+    def test_partial_copy_is_resumed(self, source, destination, bead1, partial):
+        with open(bead1.archive_filename, 'rb') as f:
+            content = f.read()
+        with open(partial, 'wb') as f:
+            f.write(content[:len(content) // 2])
+
+        sync(source, destination)
+
+        with open(destination.directory / os.path.basename(bead1.archive_filename), 'rb') as f:
+            assert content == f.read()
+        assert not os.path.exists(partial)
+
+    def test_stale_partial_copy_is_dropped(self, source, destination, partial):
+        tech.fs.write_file(partial, 'garbage from an other file')
+
+        failed, = [r for r in sync(source, destination) if isinstance(r, m.Failed)]
+        assert not os.path.exists(partial)
+
+        sync(source, destination)
+        assert contents(source) == contents(destination)
+
+    def test_xmeta_is_copied(self, source, destination, bead1):
+        bead1.save_cache()
+
+        sync(source, destination)
+
+        assert os.path.exists(destination.directory / os.path.basename(bead1.cache_path))
+
+    def test_copy_into_sharded_box(self, source, destination):
+        destination.reshard('by-name')
+
+        sync(source, destination)
+
+        assert contents(source) == contents(destination)
+        assert 2 == len(os.listdir(destination.directory / 'bead2'))
+
+    def test_copy_from_http_box(self, source, destination):
+        server = self.useFixture(HttpServer(source.directory))
+
+        sync(HttpBox('remote', server.url), destination)
+
+        assert contents(source) == contents(destination)
@@ -0,0 +1,54 @@
+import os
+
+from .test import TestCase
+from .archive import Archive
+from .box import Box
+from .workspace import Workspace
+from . import catalog
+from . import layouts
+from .tech import persistence
+
+
+class Test_catalog(TestCase):
+
+    # fixtures
+    def box(self):
+        box = Box('test', self.new_temp_dir())
+        ws = Workspace(self.new_temp_dir() / 'bead')
+        ws.create('test-kind')
+        box.store(ws, '20160704T000000000000+0200')
+        return box
+
+    def archive_filename(self, box):
+        bead, = box.all_beads()
+        return bead.archive_filename
+
+    def catalog_path(self, box):
+        return box.directory / layouts.Box.CATALOG
+
+    def doctored_catalog(self, box, catalog_path, archive_filename):
+        box.write_catalog()
+        # change the kind in the catalog only, to see where the metadata comes from
+        content = persistence.file_load(catalog_path)
+        entry = content[catalog.ARCHIVES][os.path.basename(archive_filename)]
+        entry[catalog.CACHE]['kind'] = 'from-catalog'
+        persistence.file_dump(content, catalog_path)
+
+    # tests
+    def test_metadata_is_read_from_catalog(self, archive_filename, doctored_catalog):
+        assert 'from-catalog' == Archive(archive_filename).kind
+
+    def test_changed_archive_is_not_read_from_catalog(self, archive_filename, doctored_catalog):
+        stat = os.stat(archive_filename)
+        os.utime(archive_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        assert 'test-kind' == Archive(archive_filename).kind
+
+    def test_malformed_catalog_is_ignored(self, archive_filename, catalog_path):
+        with open(catalog_path, 'w') as f:
+            f.write('{"version": 1, "archives": ')
+
+        assert 'test-kind' == Archive(archive_filename).kind
+
+    def test_missing_catalog(self, archive_filename):
+        assert catalog.lookup(archive_filename, 'bead') is None
@@ -0,0 +1,111 @@
+import os
+import random
+
+from .test import TestCase
+from .archive import Archive
+from .box import Box, CHUNKED, ZIP
+from .exceptions import InvalidArchive
+from .workspace import Workspace
+from . import chunk_store as m
+from . import layouts
+from . import tech
+
+
+def count_files(directory):
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+class Test_chunked_box(TestCase):
+
+    # fixtures
+    def data(self):
+        size = 2 * 1024 * 1024
+        return random.Random(0).getrandbits(8 * size).to_bytes(size, 'little')
+
+    def box(self):
+        box = Box('box', self.new_temp_dir())
+        box.set_storage(CHUNKED)
+        return box
+
+    def workspace(self, data):
+        ws = Workspace(self.new_temp_dir() / 'bead')
+        ws.create('test-bead')
+        tech.fs.write_file(ws.directory / 'output/data', data)
+        return ws
+
+    def archive(self, box, workspace):
+        return Archive(box.store(workspace, '20160704T000000000000+0200'), box.name)
+
+    # tests
+    def test_stored_archive_is_thin(self, box, archive, data):
+        assert m.is_thin(archive.archive_filename)
+        assert os.path.getsize(archive.archive_filename) < len(data) / 10
+
+    def test_thin_archive_is_valid(self, archive):
+        archive.validate()
+        assert 'test-bead' == archive.kind
+
+    def test_members_are_streamed_from_chunks(self, archive, data):
+        output = self.new_temp_dir()
+        archive.unpack_data_to(output)
+
+        with open(output / 'data', 'rb') as f:
+            assert data == f.read()
+
+    def test_versions_share_chunks(self, box, archive, workspace, data):
+        chunks = count_files(box.chunk_store.directory)
+        with open(workspace.directory / 'output/data', 'r+b') as f:
+            f.seek(len(data) // 2)
+            f.write(b'changed')
+        box.store(workspace, '20160705T000000000000+0200')
+
+        new_chunks = count_files(box.chunk_store.directory) - chunks
+        assert 0 < new_chunks < chunks / 2
+
+    def test_reconstructed_archive(self, box, archive):
+        path = self.new_temp_dir() / 'bead_20160704T000000000000+0200.zip'
+
+        m.reconstruct(archive.archive_filename, path, box.chunk_store)
+
+        reconstructed = Archive(path)
+        reconstructed.validate()
+        assert not m.is_thin(path)
+        assert archive.content_id == reconstructed.content_id
+
+    def test_missing_chunk_makes_archive_invalid(self, box, archive):
+        tech.fs.rmtree(box.directory / layouts.Box.CHUNKS)
+        tech.fs.ensure_directory(box.directory / layouts.Box.CHUNKS)
+
+        self.assertRaises(InvalidArchive, Archive(archive.archive_filename).validate)
+
+    def test_storage_conversion(self, box, archive, data):
+        box.set_storage(ZIP)
+        assert not m.is_thin(archive.archive_filename)
+        assert ZIP == Box(box.name, box.directory).storage
+
+        box.set_storage(CHUNKED)
+        converted, = box.all_beads()
+        assert m.is_thin(converted.archive_filename)
+        assert archive.content_id == converted.content_id
+        converted.validate()
+
+
+class Test_ChunkStore(TestCase):
+
+    # fixtures
+    def store(self):
+        return m.ChunkStore(self.new_temp_dir())
+
+    # tests
+    def test_chunks_are_stored_once(self, store):
+        key = store.put(b'chunk')
+
+        assert key == store.put(b'chunk')
+        assert 1 == count_files(store.directory)
+        assert b'chunk' == store.get(key)
+
+    def test_open(self, store):
+        keys = [store.put(b'chunk1'), store.put(b'chunk2'), store.put(b'chunk1')]
+
+        with store.open(keys) as f:
+            assert b'chunk1chunk2chunk1' == f.read()
@@ -0,0 +1,144 @@
+import os
+from unittest import mock
+
+from .test import TestCase, HttpServer
+from .box import Box, UnionBox, BY_NAME
+from .http_box import HttpBox, parse_listing
+from .tech.timestamp import time_from_user
+from .workspace import Workspace
+from . import spec as bead_spec
+from . import summary
+
+
+class Test_http_box(TestCase):
+
+    # fixtures
+    def local_box(self):
+        box = Box('local', self.new_temp_dir())
+
+        def add_bead(name, kind, freeze_time):
+            ws = Workspace(self.new_temp_dir() / name)
+            ws.create(kind)
+            # incompressible data, to see whether it is transferred
+            with open(ws.directory / 'output' / 'data', 'wb') as f:
+                f.write(os.urandom(1024 * 1024))
+            box.store(ws, freeze_time)
+
+        add_bead('bead1', 'test-bead1', '20160704T000000000000+0200')
+        add_bead('bead2', 'test-bead2', '20160704T162800000000+0200')
+        add_bead('bead2', 'test-bead2', '20160704T162800000001+0200')
+        return box
+
+    def server(self, local_box):
+        return self.useFixture(HttpServer(local_box.directory))
+
+    def box(self, server):
+        return HttpBox('remote', server.url)
+
+    def zip_bytes_transferred(self, server):
+        return sum(size for path, size in server.requests if path.endswith('.zip'))
+
+    def local_beads(self, local_box):
+        return [(bead.name, bead.kind, bead.content_id) for bead in local_box.all_beads()]
+
+    # tests
+    def test_all_beads(self, box, local_beads):
+        beads = [(bead.name, bead.kind, bead.content_id) for bead in box.all_beads()]
+        assert local_beads == beads
+
+    def test_metadata_is_read_without_transferring_archives(self, box, server):
+        assert 3 == len(list(box.all_beads()))
+        assert self.zip_bytes_transferred(server) < 3 * 100 * 1024
+
+    def test_catalog_is_used_instead_of_archives(self, box, local_box, server):
+        local_box.write_catalog()
+
+        assert 3 == len(list(box.all_beads()))
+        assert 0 == self.zip_bytes_transferred(server)
+
+    def test_metadata_is_read_from_archive_tail(self, box, local_box, server, local_beads):
+        for file_name in os.listdir(local_box.directory):
+            if file_name.endswith('.xmeta'):
+                os.remove(local_box.directory / file_name)
+
+        with mock.patch('bead.chunk_store.ZipArchive') as zip_archive:
+            beads = [(bead.name, bead.kind, bead.content_id) for bead in box.all_beads()]
+
+        assert local_beads == beads
+        assert not zip_archive.called
+        zip_requests = [(path, size) for path, size in server.requests if path.endswith('.zip')]
+        assert 3 == len(zip_requests)
+        # only the tail with the archive comment, not the 1MiB archives
+        assert all(size < summary.MAX_COMMENT_SIZE + 1024 for _, size in zip_requests)
+
+    def test_get_context_and_unpack(self, box, local_box):
+        timestamp = time_from_user('20160704T162800000000+0200')
+        bead = box.get_context(bead_spec.BEAD_NAME, 'bead2', timestamp).best
+        local_bead = local_box.get_context(bead_spec.BEAD_NAME, 'bead2', timestamp).best
+        bead.validate()
+
+        directory = self.new_temp_dir()
+        bead.unpack_data_to(directory / 'remote')
+        local_bead.unpack_data_to(directory / 'local')
+        with open(directory / 'remote' / 'data', 'rb') as remote:
+            with open(directory / 'local' / 'data', 'rb') as local:
+                assert local.read() == remote.read()
+
+    def test_sharded_box(self, box, local_box, local_beads):
+        local_box.reshard(BY_NAME)
+
+        beads = [(bead.name, bead.kind, bead.content_id) for bead in box.all_beads()]
+        assert sorted(local_beads) == sorted(beads)
+        bead1, = box._beads([(bead_spec.BEAD_NAME, 'bead1')])
+        assert 'test-bead1' == bead1.kind
+
+    def test_sharded_box_with_top_level_archive(self, box, local_box):
+        local_box.reshard(BY_NAME)
+        # as stored by a client not knowing about shards
+        file_name = 'bead2_20160704T162800000001+0200.zip'
+        os.rename(local_box.directory / 'bead2' / file_name, local_box.directory / file_name)
+
+        assert 2 == len(box._beads([(bead_spec.BEAD_NAME, 'bead2')]))
+        timestamp = time_from_user('20160705T000000000000+0200')
+        bead = box.get_context(bead_spec.BEAD_NAME, 'bead2', timestamp).best
+        assert '20160704T162800000001+0200' == bead.freeze_time_str
+
+    def test_union_box_find_bead(self, box, local_beads):
+        name, _, content_id = local_beads[0]
+        unionbox = UnionBox([Box('empty', self.new_temp_dir()), box])
+
+        assert content_id == unionbox.find_bead(name, content_id).content_id
+
+    def test_beads_since(self, box):
+        beads, offset = box.beads_since()
+        assert ['bead1', 'bead2', 'bead2'] == [bead.name for bead in beads]
+
+        assert ([], offset) == box.beads_since(offset)
+
+    def test_unavailable_server_is_an_empty_box(self):
+        box = HttpBox('remote', 'http://127.0.0.1:1/', timeout=1)
+
+        assert [] == list(box.all_beads())
+
+    def test_store_is_refused(self):
+        box = HttpBox('remote', 'http://127.0.0.1:1/', timeout=1)
+        ws = Workspace(self.new_temp_dir() / 'bead')
+        ws.create('kind')
+
+        self.assertRaises(ValueError, box.store, ws, '20160704T000000000000+0200')
+
+
+class Test_parse_listing(TestCase):
+
+    def test_links(self):
+        html = '''
+            <a href="bead_20160704T000000000000%2B0200.zip">bead</a>
+            <a href="shard/">shard/</a>
+            <a href=".bead-box/">.bead-box/</a>
+            <a href="/absolute">absolute</a>
+            <a href="http://example.com/other.zip">other</a>
+            <a href="../up.zip">up</a>
+        '''
+        assert (
+            (['bead_20160704T000000000000+0200.zip'], ['shard'])
+            == parse_listing(html))
@@ -0,0 +1,42 @@
+from .test import TestCase
+from .journal import Journal
+
+
+class Test_journal(TestCase):
+
+    # fixtures
+    def journal(self):
+        return Journal(self.new_temp_dir() / 'box-meta' / 'journal')
+
+    # tests
+    def test_missing_journal_is_empty(self, journal):
+        assert ([], 0) == journal.read()
+
+    def test_read_from_offset(self, journal):
+        journal.append({'n': 1})
+        records, offset = journal.read()
+        journal.append({'n': 2})
+        journal.append({'n': 3})
+
+        assert [{'n': 1}] == records
+        assert ([{'n': 2}, {'n': 3}], journal.read()[1]) == journal.read(offset)
+
+    def test_incomplete_record_is_left_for_next_read(self, journal):
+        journal.append({'n': 1})
+        with open(journal.path, 'ab') as f:
+            f.write(b'{"n": ')
+        records, offset = journal.read()
+        with open(journal.path, 'ab') as f:
+            f.write(b'2}\n')
+
+        assert [{'n': 1}] == records
+        assert [{'n': 2}] == journal.read(offset)[0]
+
+    def test_restarted_journal_is_read_from_start(self, journal):
+        journal.append({'n': 1})
+        journal.append({'n': 2})
+        _, offset = journal.read()
+        with open(journal.path, 'w') as f:
+            f.write('{"n": 3}\n')
+
+        assert [{'n': 3}] == journal.read(offset)[0]
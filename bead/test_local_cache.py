@@ -0,0 +1,178 @@
+import os
+from unittest import mock
+import zipfile
+
+from .test import TestCase
+from .archive import Archive, InvalidArchive
+from .box import Box
+from .local_cache import LocalArchiveCache
+from .tech.fs import read_file, write_file
+from .workspace import Workspace
+from . import zipopener
+
+
+def make_archive(directory, data):
+    ws = Workspace(directory / 'bead')
+    ws.create('test-kind')
+    write_file(ws.directory / 'output/data', data)
+    path = directory / 'bead_20160704T000000000000+0200.zip'
+    ws.pack(path, '20160704T000000000000+0200', 'comment')
+    return path
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class Test_LocalArchiveCache(TestCase):
+
+    # fixtures
+    def archives(self):
+        # archives of the same size, with different content
+        return [make_archive(self.new_temp_dir(), data) for data in ('data1', 'data2', 'data3')]
+
+    def content_ids(self, archives):
+        return [Archive(path).content_id for path in archives]
+
+    def cache(self, archives):
+        # has room for two archives
+        max_size = os.path.getsize(archives[0]) * 5 // 2
+        return LocalArchiveCache(self.new_temp_dir() / 'cache', max_size=max_size)
+
+    # tests
+    def test_archive_is_copied_on_first_fetch(self, cache, archives, content_ids):
+        path = cache.fetch(content_ids[0], archives[0])
+
+        assert cache.path_for(content_ids[0]) == path
+        assert read_bytes(archives[0]) == read_bytes(path)
+
+    def test_second_fetch_does_not_read_source(self, cache, archives, content_ids):
+        content = read_bytes(archives[0])
+        cache.fetch(content_ids[0], archives[0])
+        os.remove(archives[0])
+
+        assert content == read_bytes(cache.fetch(content_ids[0], archives[0]))
+
+    def test_least_recently_used_is_evicted(self, cache, archives, content_ids):
+        cache.fetch(content_ids[0], archives[0])
+        cache.fetch(content_ids[1], archives[1])
+        stat = os.stat(cache.path_for(content_ids[0]))
+        os.utime(cache.path_for(content_ids[0]), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+        cache.fetch(content_ids[1], archives[1])
+
+        cache.fetch(content_ids[2], archives[2])
+
+        assert not os.path.exists(cache.path_for(content_ids[0]))
+        assert os.path.exists(cache.path_for(content_ids[1]))
+        assert os.path.exists(cache.path_for(content_ids[2]))
+
+    def test_archive_over_max_size_is_not_cached(self, archives, content_ids):
+        cache = LocalArchiveCache(self.new_temp_dir() / 'cache', max_size=10)
+
+        assert archives[0] == cache.fetch(content_ids[0], archives[0])
+
+    def test_unusual_content_id_is_not_cached(self, cache, archives):
+        assert archives[0] == cache.fetch('../content1', archives[0])
+
+    def test_archive_with_other_content_id_is_not_cached(self, cache, archives, content_ids):
+        assert archives[1] == cache.fetch(content_ids[0], archives[1])
+        assert not os.path.exists(cache.path_for(content_ids[0]))
+
+
+class Test_archive_with_local_cache(TestCase):
+
+    # fixtures
+    def cache_dir(self):
+        cache_dir = self.new_temp_dir()
+        patcher = mock.patch.dict(os.environ, {'BEAD_ARCHIVE_CACHE': cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return cache_dir
+
+    def box(self):
+        return Box('test', self.new_temp_dir())
+
+    def bead(self, box):
+        ws = Workspace(self.new_temp_dir() / 'bead')
+        ws.create('test-kind')
+        return Archive(box.store(ws, '20160704T000000000000+0200'))
+
+    def other_bead(self, box):
+        ws = Workspace(self.new_temp_dir() / 'other')
+        ws.create('test-kind')
+        write_file(ws.directory / 'output/data', 'other data')
+        return Archive(box.store(ws, '20160705T000000000000+0200'))
+
+    # tests
+    def test_data_is_read_through_cache(self, cache_dir, bead):
+        bead.populate_cache()
+        archive = Archive(bead.archive_filename, cache=bead.cache)
+        archive.unpack_data_to(self.new_temp_dir() / 'data')
+
+        assert os.path.dirname(archive.data_ziparchive.archive_filename) == cache_dir
+        assert os.listdir(cache_dir)
+
+    def test_metadata_access_does_not_copy_archive(self, cache_dir, bead):
+        archive = Archive(bead.archive_filename, cache={})
+        archive.populate_cache()
+        archive.validate()
+
+        assert [] == os.listdir(cache_dir)
+
+    def test_damaged_cached_copy_is_replaced_by_archive(self, cache_dir, bead):
+        bead.populate_cache()
+        Archive(bead.archive_filename, cache=bead.cache).unpack_data_to(self.new_temp_dir())
+        cached, = os.listdir(cache_dir)
+        write_file(os.path.join(cache_dir, cached), 'damaged')
+        zipopener.close_all()
+
+        archive = Archive(bead.archive_filename, cache=bead.cache)
+        archive.unpack_data_to(self.new_temp_dir())
+        assert archive.data_ziparchive is archive.ziparchive
+        assert not os.path.exists(os.path.join(cache_dir, cached))
+
+    def test_stale_cache_does_not_select_copy_of_other_archive(
+        self, cache_dir, bead, other_bead
+    ):
+        other_bead.populate_cache()
+        Archive(other_bead.archive_filename).unpack_data_to(self.new_temp_dir())
+        stale_cache = dict(other_bead.cache)
+
+        archive = Archive(bead.archive_filename, cache=stale_cache)
+        self.assertRaises(InvalidArchive, archive.unpack_data_to, self.new_temp_dir())
+        assert [other_bead.content_id + '.zip'] == os.listdir(cache_dir)
+
+    def test_verified_extraction_is_read_through_cache(self, cache_dir, other_bead):
+        other_bead.populate_cache()
+        archive = Archive(other_bead.archive_filename, cache=other_bead.cache)
+        archive.validate_and_unpack_data_to(self.new_temp_dir() / 'data')
+        cached, = os.listdir(cache_dir)
+
+        archive = Archive(other_bead.archive_filename, cache=other_bead.cache)
+        directory = self.new_temp_dir() / 'data'
+        archive.validate_and_unpack_data_to(directory)
+
+        assert os.path.join(cache_dir, cached) == archive.data_ziparchive.archive_filename
+        assert 'other data' == read_file(directory / 'data')
+
+    def test_verified_extraction_falls_back_to_archive_on_damaged_copy(
+        self, cache_dir, other_bead
+    ):
+        other_bead.populate_cache()
+        Archive(other_bead.archive_filename).validate_and_unpack_data_to(self.new_temp_dir())
+        cached, = os.listdir(cache_dir)
+        cached_path = os.path.join(cache_dir, cached)
+        # same manifest (and content_id), different data
+        with zipfile.ZipFile(cached_path) as z:
+            members = [(info, z.read(info)) for info in z.infolist()]
+        with zipfile.ZipFile(cached_path, 'w') as z:
+            for info, content in members:
+                z.writestr(info, b'damaged data' if info.filename == 'data/data' else content)
+        zipopener.close_all()
+
+        directory = self.new_temp_dir() / 'data'
+        Archive(other_bead.archive_filename).validate_and_unpack_data_to(directory)
+
+        assert 'other data' == read_file(directory / 'data')
+        assert not os.path.exists(cached_path)
@@ -0,0 +1,85 @@
+import zipfile
+from unittest import mock
+
+from .test import TestCase
+from .archive import Archive, InvalidArchive
+from .workspace import Workspace
+from . import summary as m
+
+
+class Test_summary(TestCase):
+
+    # fixtures
+    def bead_summary(self):
+        return {
+            'meta_version': 'aaa947a6-1f7a-11e6-ba3a-0021cc73492e',
+            'content_id': 'content-id',
+            'kind': 'kind',
+            'freeze_time': '20200913T173910000000+0000',
+            'inputs': {},
+            'input_map': {},
+        }
+
+    # tests
+    def test_parse_encoded(self, bead_summary):
+        comment = m.add_to_comment(b'comment', bead_summary)
+
+        assert comment.startswith(b'comment')
+        assert bead_summary == m.parse(comment)
+
+    def test_no_summary(self):
+        assert m.parse(b'comment') is None
+
+    def test_bad_checksum(self, bead_summary):
+        comment = m.encode(bead_summary).replace(b'content-id', b'content-ID')
+
+        assert m.parse(comment) is None
+
+    def test_incomplete_summary(self, bead_summary):
+        del bead_summary['input_map']
+
+        assert m.parse(m.encode(bead_summary)) is None
+
+    def test_too_long_comment_has_no_summary(self, bead_summary):
+        comment = b'-' * (m.MAX_COMMENT_SIZE - 10)
+
+        assert comment == m.add_to_comment(comment, bead_summary)
+
+
+class Test_packed_archive(TestCase):
+
+    # fixtures
+    def archive_path(self):
+        workspace = Workspace(self.new_temp_dir() / 'bead')
+        workspace.create('kind')
+        path = self.new_temp_dir() / 'bead_20200913T173910000000+0000.zip'
+        workspace.pack(path, '20200913T173910000000+0000', 'comment')
+        return path
+
+    # tests
+    def test_summary_matches_archive(self, archive_path):
+        archive = Archive(archive_path, cache={})
+        archive.populate_cache()
+
+        assert archive.cache == m.read(archive_path)
+
+    def test_metadata_is_read_without_opening_the_zip(self, archive_path):
+        with mock.patch('bead.chunk_store.ZipArchive') as zip_archive:
+            archive = Archive(archive_path)
+            assert 'kind' == archive.kind
+            assert archive.content_id
+            assert () == archive.inputs
+
+        assert not zip_archive.called
+
+    def test_disagreeing_summary_is_detected_when_zip_is_opened(self, archive_path):
+        with zipfile.ZipFile(archive_path, 'a') as z:
+            forged = dict(m.parse(z.comment), kind='forged')
+            z.comment = m.encode(forged)
+
+        archive = Archive(archive_path)
+        assert 'forged' == archive.kind
+        self.assertRaises(InvalidArchive, archive.validate)
+
+    def test_missing_archive(self):
+        assert m.read(self.new_temp_dir() / 'missing.zip') is None
@@ -0,0 +1,97 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from .test import TestCase
+from .archive import Archive
+from .verification_ledger import VerificationLedger
+from .workspace import Workspace
+from .ziparchive import VERIFY_CRC, VERIFY_SAMPLED
+from .tech.fs import write_file
+
+
+class Test_VerificationLedger(TestCase):
+
+    # fixtures
+    def ledger(self):
+        return VerificationLedger(self.new_temp_dir() / 'ledger' / 'verified.json')
+
+    def archive(self):
+        workspace = Workspace(self.new_temp_dir() / 'bead')
+        workspace.create('kind')
+        path = self.new_temp_dir() / 'bead_20200913T173910000000+0000.zip'
+        workspace.pack(path, '20200913T173910000000+0000', 'comment')
+        return Archive(path)
+
+    # tests
+    def test_archive_is_validated_only_once(self, ledger, archive):
+        with mock.patch.object(Archive, 'validate') as validate:
+            assert ledger.validate(archive)
+            assert not ledger.validate(Archive(archive.archive_filename))
+
+        assert 1 == validate.call_count
+
+    def test_reverify(self, ledger, archive):
+        ledger.validate(archive)
+
+        assert ledger.validate(archive, reverify=True)
+
+    def test_changed_archive_is_validated_again(self, ledger, archive):
+        ledger.validate(archive)
+        stat = os.stat(archive.archive_filename)
+        os.utime(archive.archive_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        assert not ledger.is_verified(Archive(archive.archive_filename))
+
+    def test_old_verification_expires(self, ledger, archive):
+        ledger.validate(archive)
+
+        assert not VerificationLedger(ledger.path, max_age=timedelta(0)).is_verified(archive)
+
+    def test_invalid_archive_is_not_recorded(self, ledger, archive):
+        with mock.patch.object(Archive, 'validate', side_effect=ValueError):
+            self.assertRaises(ValueError, ledger.validate, archive)
+
+        assert not ledger.is_verified(archive)
+
+    def test_malformed_ledger_is_ignored(self, ledger, archive):
+        os.makedirs(os.path.dirname(ledger.path))
+        write_file(ledger.path, 'not json')
+
+        assert ledger.validate(archive)
+        assert ledger.is_verified(archive)
+
+    def test_only_full_verification_covers_other_modes(self, ledger, archive):
+        ledger.validate(archive, mode=VERIFY_CRC)
+
+        assert ledger.is_verified(archive, VERIFY_CRC)
+        assert not ledger.is_verified(archive, VERIFY_SAMPLED)
+        assert not ledger.is_verified(archive)
+
+        ledger.validate(archive)
+        assert ledger.is_verified(archive, VERIFY_SAMPLED)
+
+    def test_archive_changed_while_validated_is_not_recorded(self, ledger, archive):
+        def change_archive(**kwargs):
+            stat = os.stat(archive.archive_filename)
+            os.utime(archive.archive_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        with mock.patch.object(Archive, 'validate', side_effect=change_archive):
+            assert ledger.validate(archive)
+
+        assert not ledger.is_verified(archive)
+
+    def test_records_of_other_ledgers_are_kept(self, ledger, archive):
+        other_archive = Archive(self.new_temp_dir() / os.path.basename(archive.archive_filename))
+        with open(archive.archive_filename, 'rb') as f:
+            content = f.read()
+        with open(other_archive.archive_filename, 'wb') as f:
+            f.write(content)
+        # as if used by another process
+        other_ledger = VerificationLedger(ledger.path)
+
+        ledger.validate(archive)
+        other_ledger.validate(other_archive)
+
+        assert ledger.is_verified(archive)
+        assert ledger.is_verified(other_archive)
@@ -1,11 +1,14 @@
 from bead.exceptions import InvalidArchive
-from .test import TestCase, chdir
+from .test import TestCase, chdir, setenv
 from . import workspace as m
 
 import os
+import shutil
+import warnings
 import zipfile
 
 from .archive import Archive
+from .ziparchive import VERIFY_STRUCTURE, VERIFY_CRC, VERIFY_SAMPLED
 from . import layouts
 from . import tech
 
@@ -154,7 +157,8 @@ class Test_pack(TestCase):
 
     def then_archive_has_comment(self):
         with zipfile.ZipFile(self.__zipfile) as z:
-            assert self.__BEAD_COMMENT == z.comment.decode('utf-8')
+            # followed by the metadata summary
+            assert z.comment.decode('utf-8').startswith(self.__BEAD_COMMENT)
 
     def then_archive_does_not_contain_workspace_meta_and_temp_files(self):
         def does_not_contain(workspace_path):
@@ -264,6 +268,68 @@ class Test_load(TestCase):
         self._load_a_bead('bead2')
 
 
+class Test_validating_load(TestCase):
+
+    # fixtures
+    def workspace(self):
+        workspace = m.Workspace(self.new_temp_dir() / 'workspace')
+        workspace.create(A_KIND)
+        return workspace
+
+    def bead(self):
+        workspace = m.Workspace(self.new_temp_dir() / 'bead')
+        workspace.create(A_KIND)
+        write_file(workspace.directory / 'output/output1', b'data1')
+        os.makedirs(workspace.directory / 'output/sub')
+        write_file(workspace.directory / 'output/sub/output2', b'data2')
+        path = self.new_temp_dir() / 'bead.zip'
+        workspace.pack(path, timestamp(), 'no comment')
+        return Archive(path)
+
+    def hacked_bead(self, bead):
+        path = self.new_temp_dir() / 'hacked_bead.zip'
+        shutil.copy(bead.archive_filename, path)
+        with zipfile.ZipFile(path, 'a') as z:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                z.writestr(layouts.Archive.DATA / 'output1', b'HACKED')
+        return Archive(path)
+
+    # tests
+    def test_valid_bead_is_loaded(self, workspace, bead):
+        workspace.load('input1', bead, validate=True)
+
+        assert workspace.has_input('input1')
+        input_dir = workspace.directory / 'input/input1'
+        assert b'data1' == read_file(input_dir / 'output1')
+        assert b'data2' == read_file(input_dir / 'sub/output2')
+
+    def test_invalid_bead_is_not_loaded(self, workspace, hacked_bead):
+        self.assertRaises(InvalidArchive, workspace.load, 'input1', hacked_bead, validate=True)
+
+        assert not workspace.has_input('input1')
+        # no staging directory is left behind
+        assert [] == os.listdir(workspace.directory / 'input')
+
+    def test_loaded_input_is_kept_for_invalid_bead(self, workspace, bead, hacked_bead):
+        workspace.load('input1', bead)
+        self.assertRaises(InvalidArchive, workspace.load, 'input1', hacked_bead, validate=True)
+
+        assert b'data1' == read_file(workspace.directory / 'input/input1/output1')
+
+    def test_loaded_input_is_replaced(self, workspace, bead):
+        workspace.load('input1', bead)
+        workspace.load('input1', bead, validate=True)
+
+        assert ['input1'] == os.listdir(workspace.directory / 'input')
+        assert b'data1' == read_file(workspace.directory / 'input/input1/output1')
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
 class Test_input_map(TestCase):
 
     def test_default_value(self, workspace_with_input, input_nick):
@@ -393,3 +459,50 @@ class Test_is_valid(TestCase):
         zip_up(unzipped_archive_path, modified_archive_path)
 
         self.assertRaises(InvalidArchive, Archive(modified_archive_path).validate)
+
+    def test_parallel_validation_reports_first_changed_file(self, workspace, timestamp):
+        for i in range(10):
+            write_file(workspace.directory / f'output/data{i}', f'data{i}')
+        archive_path = self.archive_path(workspace, timestamp)
+        unzipped_archive_path = self.new_temp_dir()
+        unzip(archive_path, unzipped_archive_path)
+        for i in (3, 7):
+            write_file(unzipped_archive_path / layouts.Archive.DATA / f'data{i}', b'HACKED')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        archive = Archive(modified_archive_path)
+        manifest = archive.ziparchive.manifest
+        first_changed = min(
+            (layouts.Archive.DATA / f'data{i}' for i in (3, 7)), key=list(manifest).index)
+        assert first_changed == archive.ziparchive._file_with_different_content_id(4)
+        self.assertRaises(InvalidArchive, archive.validate, max_workers=4)
+
+    def test_structure_check_finds_missing_file(self, unzipped_archive_path):
+        os.remove(unzipped_archive_path / layouts.Archive.CODE / 'code1')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        self.assertRaises(
+            InvalidArchive, Archive(modified_archive_path).validate, mode=VERIFY_STRUCTURE)
+
+    def test_only_secure_hashes_find_rezipped_changes(self, unzipped_archive_path):
+        write_file(unzipped_archive_path / layouts.Archive.CODE / 'code1', b'HACKED')
+        modified_archive_path = self.new_temp_dir() / 'modified_archive.zip'
+        zip_up(unzipped_archive_path, modified_archive_path)
+
+        archive = Archive(modified_archive_path)
+        archive.validate(mode=VERIFY_STRUCTURE)
+        archive.validate(mode=VERIFY_CRC)
+        self.assertRaises(InvalidArchive, archive.validate, mode=VERIFY_SAMPLED)
+
+    def test_crc_check_finds_corrupted_file(self, workspace, timestamp):
+        write_file(workspace.directory / 'output/data1', 'data1' * 1000)
+        with setenv('BEAD_ZIP_COMPRESSION', 'stored'):
+            archive_path = self.archive_path(workspace, timestamp)
+        with open(archive_path, 'r+b') as f:
+            content = f.read()
+            f.seek(content.index(b'data1' * 100) + 100)
+            f.write(b'DATA1')
+
+        self.assertRaises(InvalidArchive, Archive(archive_path).validate, mode=VERIFY_CRC)
@@ -0,0 +1,77 @@
+import threading
+import zipfile
+
+from .test import TestCase
+from .zipopener import ZipPool, PoolStats
+
+
+class Test_ZipPool(TestCase):
+
+    # fixtures
+    def zip_paths(self):
+        directory = self.new_temp_dir()
+        paths = []
+        for i in range(3):
+            path = directory / f'{i}.zip'
+            with zipfile.ZipFile(path, 'w') as z:
+                z.writestr('member', f'content {i}' * 10000)
+            paths.append(path)
+        return paths
+
+    def pool(self):
+        pool = ZipPool(max_size=2)
+        self.addCleanup(pool.close_all)
+        return pool
+
+    # tests
+    def test_open_file_is_reused(self, pool, zip_paths):
+        path = zip_paths[0]
+
+        assert pool.open(path) is pool.open(path)
+        assert PoolStats(hits=1, misses=1, evictions=0, open=1) == pool.stats()
+
+    def test_least_recently_used_is_evicted(self, pool, zip_paths):
+        first, second, third = zip_paths
+        first_reader = pool.open(first)
+        pool.open(second)
+        pool.open(first)
+        pool.open(third)
+
+        assert first_reader is pool.open(first)
+        assert PoolStats(hits=2, misses=3, evictions=1, open=2) == pool.stats()
+
+    def test_evicted_reader_is_still_readable(self, pool, zip_paths):
+        reader = pool.open(zip_paths[0])
+        pool.open(zip_paths[1])
+        pool.open(zip_paths[2])
+
+        assert b'content 0' == reader.read('member')[:9]
+
+    def test_open_file_budget(self, zip_paths):
+        pool = ZipPool(max_size=10, max_open_files=1)
+        self.addCleanup(pool.close_all)
+        for path in zip_paths:
+            pool.open(path)
+
+        assert PoolStats(hits=0, misses=3, evictions=2, open=1) == pool.stats()
+
+    def test_concurrent_member_reads(self, pool, zip_paths):
+        path = zip_paths[0]
+        expected = b'content 0' * 10000
+        errors = []
+        pool.open(path)
+
+        def read():
+            try:
+                for _ in range(20):
+                    assert expected == pool.open(path).read('member')
+            except BaseException as e:
+                errors.append(e)
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [] == errors
+        assert 1 == pool.stats().misses
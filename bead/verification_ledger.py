@@ -0,0 +1,154 @@
+'''
+Ledger of successfully validated archives.
+
+Validating an archive reads and hashes all of its content, which takes minutes for
+big beads, yet the same archive is typically validated again and again
+(loading inputs to several workspaces, updating, developing).
+
+The ledger records the (size, mtime, content_id) of local archive files at the time
+they were found valid, and the verification mode used. An archive is not validated again
+in the same (or a less thorough, see below) mode while these are unchanged,
+until the record gets older than the maximum age (BEAD_REVERIFY_DAYS, default 30).
+
+Verification modes are not strictly ordered (a CRC check reads all members,
+a sampled one hashes only a few), only a full verification covers the others.
+
+The ledger is shared by concurrent bead processes: updates are made under an exclusive
+lock on a lock file next to it (where file locking is available).
+'''
+
+import contextlib
+from datetime import timedelta
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # not on POSIX - updates are serialized only within the process
+    fcntl = None  # type: ignore
+
+from tracelog import TRACELOG
+from . import tech
+from .ziparchive import VERIFY_FULL
+
+persistence = tech.persistence
+
+__all__ = ('VerificationLedger', 'MAX_AGE')
+
+
+MAX_AGE = timedelta(days=int(os.environ.get('BEAD_REVERIFY_DAYS', 30)))
+
+# record keys
+SIZE = 'size'
+MTIME = 'mtime'
+CONTENT_ID = 'content_id'
+VERIFIED_AT = 'verified_at'
+MODE = 'mode'
+
+
+class VerificationLedger:
+
+    def __init__(self, path, max_age: Optional[timedelta] = None):
+        self.path = path
+        self.max_age = MAX_AGE if max_age is None else max_age
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            records = persistence.file_load(self.path)
+            if isinstance(records, dict):
+                return records
+        except FileNotFoundError:
+            return {}
+        except persistence.ReadError:
+            pass
+        TRACELOG(f'Ignoring malformed verification ledger {self.path}')
+        return {}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f'{self.path}.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def snapshot(self, archive) -> Optional[Dict]:
+        '''
+        Current record for archive, None if it can not be recorded (e.g. remote or missing).
+
+        To be taken before validating archive, see `record`.
+        '''
+        if tech.http.is_url(archive.archive_filename):
+            return None
+        try:
+            stat = os.stat(archive.archive_filename)
+        except OSError:
+            return None
+        return {SIZE: stat.st_size, MTIME: stat.st_mtime_ns, CONTENT_ID: archive.content_id}
+
+    def is_verified(self, archive, mode=VERIFY_FULL) -> bool:
+        '''
+        Is archive unchanged since it was last found valid in mode, and not too long ago?
+        '''
+        current = self.snapshot(archive)
+        if current is None:
+            return False
+        key = os.path.realpath(archive.archive_filename)
+        with self._lock:
+            recorded = self._load().get(key)
+        if not isinstance(recorded, dict):
+            return False
+        verified_at = recorded.pop(VERIFIED_AT, 0)
+        recorded_mode = recorded.pop(MODE, VERIFY_FULL)
+        return (
+            recorded == current
+            and recorded_mode in (mode, VERIFY_FULL)
+            and time.time() - verified_at < self.max_age.total_seconds())
+
+    def record(self, archive, snapshot: Optional[Dict], mode=VERIFY_FULL):
+        '''
+        Record archive as just found valid in mode.
+
+        `snapshot` is the one taken before the validation started:
+        if the archive has changed since then, it is not recorded.
+        '''
+        if snapshot is None or self.snapshot(archive) != snapshot:
+            return
+        now = time.time()
+        current = dict(snapshot)
+        current[VERIFIED_AT] = now
+        current[MODE] = mode
+        key = os.path.realpath(archive.archive_filename)
+        try:
+            tech.fs.ensure_directory(os.path.dirname(os.path.abspath(self.path)))
+            with self._locked():
+                # other processes might have recorded archives since this one started
+                records = {
+                    path: record
+                    for path, record in self._load().items()
+                    if isinstance(record, dict)
+                    and now - record.get(VERIFIED_AT, 0) < self.max_age.total_seconds()}
+                records[key] = current
+                tech.fs.write_file_atomic(self.path, persistence.dumps(records))
+        except OSError as e:
+            TRACELOG(f'Could not write verification ledger {self.path}: {e}')
+
+    def validate(self, archive, reverify=False, mode=VERIFY_FULL) -> bool:
+        '''
+        Validate archive in mode, unless the ledger says it is already verified.
+
+        Raises InvalidArchive for invalid archives.
+        Returns True if the archive was actually validated.
+        '''
+        if not reverify and self.is_verified(archive, mode):
+            return False
+        snapshot = self.snapshot(archive)
+        archive.validate(mode=mode)
+        self.record(archive, snapshot, mode)
+        return True
@@ -7,6 +7,7 @@ import zipfile
 
 from . import layouts
 from . import meta
+from . import summary
 from . import tech
 from .bead import Bead
 
@@ -180,18 +181,24 @@ class Workspace(Bead):
         input_map[input_nick] = bead_name
         self.input_map = input_map
 
-    def load(self, input_nick, bead):
+    def load(self, input_nick, bead, validate=False):
         '''
         Make output data files in bead available under input directory
+
+        With validate=True the bead is fully validated while its data is extracted,
+        and the input is not changed, if it is invalid (InvalidArchive is raised).
         '''
         input_dir = self.directory / layouts.Workspace.INPUT
         fs.make_writable(input_dir)
         try:
+            destination_dir = input_dir / input_nick
+            if validate:
+                bead.validate_and_unpack_data_to(destination_dir)
+            else:
+                bead.unpack_data_to(destination_dir)
             self.add_input(
                 input_nick,
                 bead.kind, bead.content_id, bead.freeze_time_str)
-            destination_dir = input_dir / input_nick
-            bead.unpack_data_to(destination_dir)
             for f in fs.all_subpaths(destination_dir):
                 fs.make_readonly(f)
         finally:
@@ -326,4 +333,9 @@ class _ZipCreator:
 
         self.add_string_content(layouts.Archive.BEAD_META, persistence.dumps(bead_meta))
         self.add_string_content(layouts.Archive.MANIFEST, persistence.dumps(self.hashes))
-        persistence.zip_dump(workspace.input_map, self.zipfile, layouts.Archive.INPUT_MAP)
+        input_map = workspace.input_map
+        persistence.zip_dump(input_map, self.zipfile, layouts.Archive.INPUT_MAP)
+
+        content_id = self.hashes[layouts.Archive.MANIFEST]
+        self.zipfile.comment = summary.add_to_comment(
+            self.zipfile.comment, summary.of(bead_meta, content_id, input_map))
@@ -1,6 +1,8 @@
 from copy import deepcopy
 import os
+import random
 import shutil
+import tempfile
 
 from .bead import UnpackableBead
 from .exceptions import InvalidArchive
@@ -14,6 +16,29 @@ timestamp = tech.timestamp
 securehash = tech.securehash
 persistence = tech.persistence
 
+# members are hashed in parallel - hashlib and zlib release the GIL on large blocks
+HASH_WORKERS = int(os.environ.get('BEAD_HASH_WORKERS', os.cpu_count() or 1))
+
+# verification modes of ZipArchive.validate - from the fastest to the most thorough
+# manifest members are present
+VERIFY_STRUCTURE = 'structure'
+# manifest members are present and match the CRC-32 stored in the zip
+VERIFY_CRC = 'crc'
+# manifest members are present and a random sample of them match their manifest hash
+VERIFY_SAMPLED = 'sampled'
+# all manifest members match their manifest hash
+VERIFY_FULL = 'full'
+VERIFY_MODES = (VERIFY_STRUCTURE, VERIFY_CRC, VERIFY_SAMPLED, VERIFY_FULL)
+
+# members hashed by VERIFY_SAMPLED
+SAMPLE_FRACTION = 0.1
+SAMPLE_MINIMUM = 16
+
+READ_BLOCK_SIZE = 1024 ** 2
+
+# members are extracted in parallel by unpack_*_to
+EXTRACT_WORKERS = int(os.environ.get('BEAD_EXTRACT_WORKERS', os.cpu_count() or 1))
+COPY_BUFFER_SIZE = 1024 ** 2
 
 META_KEYS = (
     meta.META_VERSION,
@@ -24,6 +49,15 @@ META_KEYS = (
 )
 
 
+def manifest_content_id(zip_file) -> str:
+    '''
+    Content id of the archive open as zip_file - the hash of its manifest.
+    '''
+    zipinfo = zip_file.getinfo(layouts.Archive.MANIFEST)
+    with zip_file.open(zipinfo) as f:
+        return securehash.file(f, zipinfo.file_size)
+
+
 class ZipArchive(UnpackableBead):
 
     def __init__(self, filename, box_name=''):
@@ -39,7 +73,7 @@ class ZipArchive(UnpackableBead):
         except (zipopener.BadZipFile, OSError, IOError):
             raise InvalidArchive(self.archive_filename)
 
-    def validate(self):
+    def validate(self, max_workers=None, mode=VERIFY_FULL):
         '''
         verify, that
         - all files under code, data, meta are present in the manifest
@@ -51,15 +85,27 @@ class ZipArchive(UnpackableBead):
             - has freeze time
             - has freezed name
             - has inputs (even if empty)
+
+        Member content is checked as defined by mode (one of VERIFY_MODES),
+        by max_workers threads (default: HASH_WORKERS).
         '''
-        if not all(self._checks()):
+        assert mode in VERIFY_MODES, mode
+        if not all(self._checks(max_workers or HASH_WORKERS, mode)):
             raise InvalidArchive
 
-    def _checks(self):
+    def _checks(self, max_workers, mode):
         yield self._has_well_formed_meta()
         yield self._bead_creation_time_is_in_the_past()
         yield self._extra_file() is None
-        yield self._file_with_different_content_id() is None
+        if mode == VERIFY_STRUCTURE:
+            yield self._missing_file() is None
+        elif mode == VERIFY_CRC:
+            yield self._file_with_bad_crc(max_workers) is None
+        elif mode == VERIFY_SAMPLED:
+            yield self._missing_file() is None
+            yield self._file_with_different_content_id(max_workers, self._sample()) is None
+        else:
+            yield self._file_with_different_content_id(max_workers) is None
 
     def _has_well_formed_meta(self):
         meta = self.meta
@@ -81,7 +127,7 @@ class ZipArchive(UnpackableBead):
         code_dir_prefix = layouts.Archive.CODE + '/'
         manifest = self.manifest
         # check that there are no extra files
-        for name in self.zipfile.namelist():
+        for name in self._names():
             is_data = name.startswith(data_dir_prefix)
             is_code = name.startswith(code_dir_prefix)
             if is_data or is_code:
@@ -89,16 +135,63 @@ class ZipArchive(UnpackableBead):
                     # unexpected extra file!
                     return name
 
-    def _file_with_different_content_id(self):
-        for name, hash in self.manifest.items():
-            try:
-                info = self.zipfile.getinfo(name)
-            except KeyError:
+    def _missing_file(self):
+        names = set(self._names())
+        for name in self.manifest:
+            if name not in names:
                 return name
-            archived_hash = securehash.file(self.zipfile.open(info), info.file_size)
-            if hash != archived_hash:
+
+    def _sample(self):
+        '''
+        Random sample of manifest members, in manifest order.
+        '''
+        names = list(self.manifest)
+        sample_size = max(int(len(names) * SAMPLE_FRACTION), SAMPLE_MINIMUM)
+        if sample_size >= len(names):
+            return names
+        indices = sorted(random.sample(range(len(names)), sample_size))
+        return [names[i] for i in indices]
+
+    def _first_failing(self, names, check, max_workers):
+        for name, ok in zip(names, tech.parallel.map_bounded(check, names, max_workers)):
+            if not ok:
                 return name
 
+    def _file_with_different_content_id(self, max_workers=1, names=None):
+        '''
+        First member (in manifest order) not matching its manifest hash, None if all match.
+
+        Only names are checked, if given.
+        '''
+        manifest = self.manifest
+        return self._first_failing(
+            list(manifest) if names is None else names,
+            lambda name: self._archived_hash(name) == manifest[name],
+            max_workers)
+
+    def _archived_hash(self, name):
+        try:
+            return securehash.file(self._open_member(name), self._member_size(name))
+        except (KeyError, OSError, zipopener.BadZipFile):
+            return None
+
+    def _file_with_bad_crc(self, max_workers=1):
+        '''
+        First manifest member, that can not be read completely, None if all can.
+
+        Members read from the zip are checked against their CRC-32 at their end.
+        '''
+        return self._first_failing(list(self.manifest), self._is_readable, max_workers)
+
+    def _is_readable(self, name):
+        try:
+            with self._open_member(name) as member:
+                while member.read(READ_BLOCK_SIZE):
+                    pass
+            return True
+        except (KeyError, OSError, zipopener.BadZipFile):
+            return False
+
     @property
     def manifest(self):
         return self.zip_load(layouts.Archive.MANIFEST)
@@ -113,9 +206,7 @@ class ZipArchive(UnpackableBead):
         # there is currently only one meta version
         # and it must match the one defined in the workspace module
         assert self._meta[meta.META_VERSION] == 'aaa947a6-1f7a-11e6-ba3a-0021cc73492e'
-        zipinfo = self.zipfile.getinfo(layouts.Archive.MANIFEST)
-        with self.zipfile.open(zipinfo) as f:
-            return securehash.file(f, zipinfo.file_size)
+        return manifest_content_id(self.zipfile)
 
     @property
     def meta_version(self):
@@ -135,6 +226,20 @@ class ZipArchive(UnpackableBead):
         # harm to this Archive instance
         return deepcopy(self._meta)
 
+    # member access - overridden for archives with members stored elsewhere
+
+    def _names(self):
+        return self.zipfile.namelist()
+
+    def _names_with_prefix(self, prefix):
+        return self.zipfile.names_with_prefix(prefix)
+
+    def _member_size(self, name):
+        return self.zipfile.getinfo(name).file_size
+
+    def _open_member(self, name):
+        return self.zipfile.open(name)
+
     def zip_load(self, filename):
         return persistence.zip_load(self.zipfile, filename)
 
@@ -166,13 +271,19 @@ class ZipArchive(UnpackableBead):
         if upperdirs:
             tech.fs.ensure_directory(upperdirs)
 
-        with self.zipfile.open(zip_path) as source:
+        self._copy_member(zip_path, fs_path)
+
+    def _copy_member(self, zip_path, fs_path):
+        with self._open_member(zip_path) as source:
             with open(fs_path, 'wb') as target:
-                shutil.copyfileobj(source, target)
+                shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
 
-    def extract_dir(self, zip_dir, fs_dir):
+    def extract_dir(self, zip_dir, fs_dir, max_workers=None):
         '''
             Extract all files from zipfile under zip_dir to fs_dir.
+
+            The directory tree is created first, then files are extracted
+            by max_workers threads (default: EXTRACT_WORKERS).
         '''
 
         tech.fs.ensure_directory(fs_dir)
@@ -180,11 +291,76 @@ class ZipArchive(UnpackableBead):
         zip_dir_prefix = zip_dir + '/'
         zip_dir_prefix_len = len(zip_dir_prefix)
 
-        for zip_path in self.zipfile.namelist():
-            if not zip_path.startswith(zip_dir_prefix):
-                continue
-            fs_path = fs_dir / zip_path[zip_dir_prefix_len:]
-            self.extract_file(zip_path, fs_path)
+        paths = {
+            zip_path: os.path.normpath(os.path.join(fs_dir, zip_path[zip_dir_prefix_len:]))
+            for zip_path in self._names_with_prefix(zip_dir_prefix)}
+        file_paths = {
+            zip_path: fs_path
+            for zip_path, fs_path in paths.items()
+            if not zip_path.endswith('/')}
+        _make_directories(
+            [fs_path for zip_path, fs_path in paths.items() if zip_path.endswith('/')]
+            + [os.path.dirname(fs_path) for fs_path in file_paths.values()])
+
+        extracted = tech.parallel.map_bounded(
+            lambda zip_path: self._copy_member(zip_path, file_paths[zip_path]),
+            file_paths,
+            max_workers or EXTRACT_WORKERS,
+            ordered=False)
+        for _ in extracted:
+            pass
+
+    def validate_and_unpack_data_to(self, fs_dir, max_workers=None):
+        '''
+        Fully validate the archive while unpacking its data to fs_dir.
+
+        Data members are hashed while they are extracted, so they are read only once.
+        The data is extracted to a staging directory next to fs_dir, which is moved
+        in place of fs_dir (replacing it, if exists) only if the archive is valid.
+
+        Raises InvalidArchive, leaving fs_dir untouched.
+        '''
+        max_workers = max_workers or HASH_WORKERS
+        manifest = self.manifest
+        data_prefix = layouts.Archive.DATA + '/'
+        data_names = [name for name in manifest if name.startswith(data_prefix)]
+        other_names = [name for name in manifest if not name.startswith(data_prefix)]
+        is_valid = (
+            self._has_well_formed_meta()
+            and self._bead_creation_time_is_in_the_past()
+            and self._extra_file() is None
+            and self._file_with_different_content_id(max_workers, other_names) is None)
+        if not is_valid:
+            raise InvalidArchive(self.archive_filename)
+
+        fs_dir = os.path.abspath(fs_dir)
+        tech.fs.ensure_directory(os.path.dirname(fs_dir))
+        staging_root = tempfile.mkdtemp(
+            dir=os.path.dirname(fs_dir), prefix=f'.{os.path.basename(fs_dir)}.')
+        try:
+            # created with default permissions, unlike staging_root
+            staging = os.path.join(staging_root, 'new')
+            paths = {name: os.path.join(staging, name[len(data_prefix):]) for name in data_names}
+            _make_directories([staging] + [os.path.dirname(path) for path in paths.values()])
+
+            def extract_and_check(name):
+                return self._extract_with_hash(name, paths[name]) == manifest[name]
+            if self._first_failing(data_names, extract_and_check, max_workers) is not None:
+                raise InvalidArchive(self.archive_filename)
+
+            if os.path.exists(fs_dir):
+                tech.fs.make_writable(fs_dir)
+                os.rename(fs_dir, os.path.join(staging_root, 'old'))
+            os.rename(staging, fs_dir)
+        finally:
+            tech.fs.rmtree(staging_root)
+
+    def _extract_with_hash(self, zip_path, fs_path):
+        try:
+            with self._open_member(zip_path) as source, open(fs_path, 'wb') as target:
+                return securehash.copy(source, target, self._member_size(zip_path))
+        except (KeyError, zipopener.BadZipFile):
+            return None
 
     def unpack_code_to(self, fs_dir):
         self.extract_dir(layouts.Archive.CODE, fs_dir)
@@ -195,3 +371,9 @@ class ZipArchive(UnpackableBead):
     def unpack_meta_to(self, workspace):
         workspace.meta = self.meta
         workspace.input_map = self.input_map
+
+
+def _make_directories(directories):
+    # parents first - extracting threads need not create directories
+    for directory in sorted(set(directories)):
+        os.makedirs(directory, exist_ok=True)
@@ -1,9 +1,19 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
 import os
+import time
 
 from bead import tech
-from bead.archive import Archive
+from bead.archive import Archive, refresh_xmeta
+from bead.box import BY_NAME, LAYOUTS, STORAGES
+from bead import box_compact
+from bead import box_dedupe
+from bead import box_sync
 from .cmdparse import Command
-from .common import OPTIONAL_ENV, die
+from .common import OPTIONAL_ENV, DefaultArgSentinel, die
+from . import arg_metavar
 from .web import rewire
 
 
@@ -15,6 +25,8 @@ class CmdAdd(Command):
     def declare(self, arg):
         arg('name')
         arg('directory')
+        arg('--timeout', type=float, default=None, metavar='SECONDS',
+            help='skip the box, when it does not answer in time (e.g. unavailable network share)')
         arg(OPTIONAL_ENV)
 
     def run(self, args):
@@ -24,12 +36,15 @@ class CmdAdd(Command):
         name, directory = args.name, args.directory
         env = args.get_env()
 
-        if not os.path.isdir(directory):
+        if tech.http.is_url(directory):
+            location = directory
+        elif os.path.isdir(directory):
+            location = os.path.abspath(directory)
+        else:
             print(f'ERROR: "{directory}" is not an existing directory!')
             return
-        location = os.path.abspath(directory)
         try:
-            env.add_box(name, location)
+            env.add_box(name, location, args.timeout)
             env.save()
             print(f'Will remember box {name}')
         except ValueError as e:
@@ -49,7 +64,8 @@ class CmdList(Command):
         boxes = args.get_env().get_boxes()
 
         def print_box(box):
-            print(f'{box.name}: {box.location}')
+            timeout = '' if box.timeout is None else f' (timeout: {box.timeout}s)'
+            print(f'{box.name}: {box.location}{timeout}')
         if boxes:
             print('Boxes:')
             print('-------------')
@@ -93,6 +109,241 @@ class CmdXmeta(Command):
         print(f'Saved {archive.cache_path}')
 
 
+ALL_BOXES = DefaultArgSentinel('all boxes')
+
+
+def OPTIONAL_BOX_NAME(parser):
+    '''
+    Declare `box_name` as optional parameter, defaulting to all boxes
+    '''
+    parser.arg(
+        'box_name', nargs='?', default=ALL_BOXES, type=str,
+        metavar=arg_metavar.BOX, help='Name of box')
+
+
+def get_boxes(env, box_name):
+    '''
+    Local boxes to maintain, remote boxes are maintained where they are served from.
+    '''
+    if box_name is ALL_BOXES:
+        return [box for box in env.get_boxes() if box.is_local]
+    box = env.get_box(box_name)
+    if box is None:
+        die(f'Unknown box {box_name}')
+    if not box.is_local:
+        die(f'Box {box_name} at {box.location} is not a local directory')
+    return [box]
+
+
+def JOBS(parser):
+    parser.arg(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1,
+        help='number of parallel processes')
+
+
+class CmdRefreshXmeta(Command):
+    '''
+    Create missing and regenerate stale or damaged .xmeta files for all archives in boxes.
+
+    .xmeta files make box scans cheap, as archives need not be opened.
+    With --catalog the metadata of all archives is also collected into a single
+    box level catalog file, which is even cheaper to read than many .xmeta files.
+    '''
+
+    def declare(self, arg):
+        arg(OPTIONAL_BOX_NAME)
+        arg(JOBS)
+        arg(
+            '--catalog', dest='catalog', action='store_true', default=False,
+            help='Also write a box level catalog of archive metadata')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        for box in get_boxes(args.get_env(), args.box_name):
+            paths = [path for path in box.archive_paths() if path.endswith('.zip')]
+            start = time.perf_counter()
+            if args.jobs > 1:
+                with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                    outcomes = list(executor.map(refresh_xmeta, paths, chunksize=16))
+            else:
+                outcomes = [refresh_xmeta(path) for path in paths]
+            elapsed = time.perf_counter() - start
+            throughput = len(paths) / elapsed if elapsed else 0
+            print(
+                f'Box {box.name}: {len(paths)} archives in {elapsed:.1f}s'
+                f' ({throughput:.1f} archives/s)')
+            for outcome, count in sorted(Counter(outcomes).items()):
+                print(f'  {outcome}: {count}')
+            if args.catalog:
+                box.write_catalog()
+                print('  catalog written')
+
+
+class CmdInvalid(Command):
+    '''
+    List archives in boxes that can not be loaded, e.g. partially copied ones.
+
+    Invalid archives are ignored by other commands until they change.
+    '''
+
+    def declare(self, arg):
+        arg(OPTIONAL_BOX_NAME)
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        for box in get_boxes(args.get_env(), args.box_name):
+            for path in box.invalid_archives():
+                print(path)
+
+
+class CmdReshard(Command):
+    '''
+    Change the directory layout of a box in place.
+
+    With the by-name layout archives are stored in per bead name subdirectories,
+    so that queries for a bead need not list all archives of a very large box.
+    '''
+
+    def declare(self, arg):
+        arg('name', metavar=arg_metavar.BOX, help='Name of box')
+        arg('--layout', choices=LAYOUTS, default=BY_NAME,
+            help=f'New layout of the box (default: {BY_NAME})')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        box, = get_boxes(args.get_env(), args.name)
+        box.reshard(args.layout)
+        print(f'Box {box.name} has {args.layout} layout')
+
+
+class CmdStorage(Command):
+    '''
+    Change the storage mode of a box, converting its archives.
+
+    With chunked storage the content of archives is split into content-defined chunks,
+    stored only once per box, so successive versions of beads share the storage of
+    unchanged content.
+    '''
+
+    def declare(self, arg):
+        arg('name', metavar=arg_metavar.BOX, help='Name of box')
+        arg('storage', choices=STORAGES, help='New storage mode of the box')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        box, = get_boxes(args.get_env(), args.name)
+        box.set_storage(args.storage)
+        print(f'Box {box.name} has {args.storage} storage')
+
+
+class CmdSync(Command):
+    '''
+    Copy beads missing from a box from another box.
+
+    Beads are compared by name and content, only missing archives are copied
+    (with their .xmeta files).
+    Interrupted copies are resumed on the next run.
+    '''
+
+    def declare(self, arg):
+        arg('source', metavar=arg_metavar.BOX, help='Name of box to copy from')
+        arg('destination', metavar=arg_metavar.BOX, help='Name of local box to copy to')
+        arg('-j', '--jobs', type=int, default=box_sync.COPY_WORKERS,
+            help=f'number of parallel copy streams (default: {box_sync.COPY_WORKERS})')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        env = args.get_env()
+        source = env.get_box(args.source)
+        if source is None:
+            die(f'Unknown box {args.source}')
+        destination, = get_boxes(env, args.destination)
+
+        copied = failed = size = 0
+        for result in box_sync.sync(source, destination, max_workers=args.jobs):
+            if isinstance(result, box_sync.Failed):
+                failed += 1
+                print(f'ERROR: {result.bead.archive_filename}: {result.reason}')
+            else:
+                copied += 1
+                size += result.size
+                print(f'Copied {result.path}')
+        print(f'{copied} archives ({size} bytes) copied, {failed} failed')
+        if failed:
+            die('Some archives were not copied, try again')
+
+
+class CmdDedupe(Command):
+    '''
+    Replace identical archives in local boxes by hardlinks to a single file.
+
+    Archives are linked only when they have the same content_id, are on the same
+    file system and are identical byte-for-byte.
+    .xmeta files are not touched, so box specific input maps are kept.
+    '''
+
+    def declare(self, arg):
+        arg('box_names', nargs='*', metavar=arg_metavar.BOX,
+            help='Name of boxes to deduplicate (default: all local boxes)')
+        arg('--dry-run', dest='dry_run', action='store_true', default=False,
+            help='Only report duplicates')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        env = args.get_env()
+        if args.box_names:
+            boxes = [box for name in args.box_names for box in get_boxes(env, name)]
+        else:
+            boxes = get_boxes(env, ALL_BOXES)
+
+        duplicates = box_dedupe.find_duplicates(boxes)
+        for duplicate in duplicates:
+            print(f'{duplicate.path} -> {duplicate.original}')
+        if args.dry_run:
+            reclaimable = sum(duplicate.reclaimable for duplicate in duplicates)
+            print(f'{len(duplicates)} duplicates, {reclaimable} bytes could be reclaimed')
+            return
+        reclaimed = box_dedupe.dedupe(duplicates)
+        print(f'{len(duplicates)} duplicates linked, {reclaimed} bytes reclaimed')
+
+
+class CmdCompact(Command):
+    '''
+    Repack superseded (not the newest of their name) archives with stronger compression.
+
+    Content ids do not depend on the compression, so beads keep their identity.
+    Archives are replaced only when the verified repacked archive is smaller.
+    '''
+
+    def declare(self, arg):
+        arg(OPTIONAL_BOX_NAME)
+        arg(JOBS)
+        arg('--method', choices=sorted(box_compact.METHODS), default=box_compact.DEFLATED,
+            help=(
+                f'Compression method (default: {box_compact.DEFLATED}),'
+                ' other methods are not supported by all zip tools'))
+        arg('--level', type=int, default=9,
+            help='Compression level, not used by lzma (default: 9)')
+        arg('--older-than', dest='older_than', type=float, default=None, metavar='DAYS',
+            help='Also repack the newest archive of beads frozen more than DAYS ago')
+        arg(OPTIONAL_ENV)
+
+    def run(self, args):
+        older_than = None if args.older_than is None else timedelta(days=args.older_than)
+        compact = partial(box_compact.compact_archive, method=args.method, level=args.level)
+        for box in get_boxes(args.get_env(), args.box_name):
+            paths = box_compact.compaction_candidates(box, older_than)
+            if args.jobs > 1:
+                with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                    results = list(executor.map(compact, paths))
+            else:
+                results = [compact(path) for path in paths]
+            saved = sum(saved for _, saved in results)
+            print(f'Box {box.name}: {len(paths)} archives, {saved} bytes saved')
+            for outcome, count in sorted(Counter(outcome for outcome, _ in results).items()):
+                print(f'  {outcome}: {count}')
+
+
 class CmdRewire(Command):
     '''
     Remap inputs.
@@ -105,11 +356,7 @@ class CmdRewire(Command):
     def run(self, args):
         env = args.get_env()
         name = args.name
-        for box in env.get_boxes():
-            if box.name == name:
-                break
-        else:
-            die(f'Unknown box {name}')
+        box, = get_boxes(env, name)
         rewire_options = tech.persistence.file_load(args.rewire_options_json)
         rewire_specs = rewire_options.get(name, [])
         # This could be painfully slow, if there are many beads and their metadata
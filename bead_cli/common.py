@@ -1,13 +1,18 @@
 import os
 import sys
+from typing import Optional
 
 from bead.exceptions import InvalidArchive
 from bead.workspace import Workspace
 from bead import spec as bead_spec
 from bead.archive import Archive
 from bead import box as bead_box
+from bead import summary
+from bead import tech
 from bead.tech.fs import Path
 from bead.tech.timestamp import time_from_user, parse_iso8601
+from bead.verification_ledger import VerificationLedger
+from bead.ziparchive import VERIFY_FULL, VERIFY_MODES
 from . import arg_help
 from . import arg_metavar
 from .environment import Environment
@@ -125,22 +130,91 @@ def BEAD_REF_BASE_defaulting_to(name):
 BEAD_REF_BASE = arg_bead_ref_base(nargs=None, default=None)
 
 
+def warn_box_timeout(box, timeout):
+    warning(f'Box "{box.name}" did not answer in {timeout} seconds - skipped')
+
+
+def get_unionbox(env):
+    '''
+    All boxes of the environment, reporting unresponsive ones.
+    '''
+    return bead_box.UnionBox(env.get_boxes(), on_timeout=warn_box_timeout)
+
+
 def resolve_bead(env, bead_ref_base, time):
     # prefer exact file name over box search
     if os.path.isfile(bead_ref_base):
         return Archive(bead_ref_base)
+    if tech.http.is_url(bead_ref_base):
+        # no local .xmeta - metadata is read from the summary at the end of the archive
+        return Archive(bead_ref_base, cache=summary.read(bead_ref_base) or {})
 
     # not a file - try box search
-    unionbox = bead_box.UnionBox(env.get_boxes())
+    unionbox = get_unionbox(env)
 
     return unionbox.get_at(bead_spec.BEAD_NAME, bead_ref_base, time)
 
 
-def verify_with_feedback(archive: Archive):
-    print(f'Verifying archive {archive.archive_filename} ...', end='', flush=True)
+def VERIFICATION(parser):
+    parser.arg(
+        '--verify', dest='verify_mode', choices=VERIFY_MODES,
+        # checked by verifier() - argparse does not check defaults against choices
+        default=os.environ.get('BEAD_VERIFY', VERIFY_FULL),
+        help='How thoroughly to verify the bead:'
+        + ' presence of members, their zip CRC-32, secure hash of a sample or of all of them'
+        + ' (default: %(default)s)')
+    parser.arg(
+        '--reverify', dest='reverify', default=False, action='store_true',
+        help='Verify the bead, even if it was verified recently and has not changed since')
+
+
+def verify_with_feedback(
+    archive: Archive,
+    ledger: Optional[VerificationLedger] = None,
+    reverify=False,
+    mode=VERIFY_FULL,
+):
+    mode_info = '' if mode == VERIFY_FULL else f' ({mode})'
+    print(f'Verifying archive {archive.archive_filename}{mode_info} ...', end='', flush=True)
     try:
-        archive.validate()
-        print(' OK', flush=True)
+        if ledger is None:
+            archive.validate(mode=mode)
+            print(' OK', flush=True)
+        elif ledger.validate(archive, reverify, mode):
+            print(' OK', flush=True)
+        else:
+            print(' OK (verified earlier)', flush=True)
     except InvalidArchive:
         print(' DAMAGED!', flush=True)
         raise
+
+
+class Verifier:
+    '''
+    Archive verification as requested by VERIFICATION args, using a verification ledger.
+
+    Call it to verify an archive with feedback.
+    '''
+
+    def __init__(self, ledger: VerificationLedger, reverify=False, mode=VERIFY_FULL):
+        self.ledger = ledger
+        self.reverify = reverify
+        self.mode = mode
+
+    def __call__(self, archive: Archive):
+        verify_with_feedback(archive, self.ledger, self.reverify, self.mode)
+
+    def needs_full_verification(self, archive: Archive) -> bool:
+        '''
+        Is a full verification needed - which can be done while loading the data.
+        '''
+        return self.mode == VERIFY_FULL and (
+            self.reverify or not self.ledger.is_verified(archive))
+
+
+def verifier(args, env) -> Verifier:
+    if args.verify_mode not in VERIFY_MODES:
+        die(
+            f'Invalid BEAD_VERIFY={args.verify_mode!r} in the environment,'
+            + f' expected one of {", ".join(VERIFY_MODES)}')
+    return Verifier(env.get_verification_ledger(), args.reverify, args.verify_mode)
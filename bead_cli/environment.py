@@ -3,19 +3,32 @@ User specific environment
 '''
 
 from bead.box import Box
-from bead.tech import persistence
+from bead.http_box import HttpBox
+from bead.verification_ledger import VerificationLedger
+from bead.tech import http, persistence
 import os
 
 ENV_BOXES = 'boxes'
 BOX_NAME = 'name'
 BOX_LOCATION = 'directory'
+BOX_TIMEOUT = 'timeout'
+
+
+def make_box(name, location, timeout=None):
+    '''
+    Box for location, which is either a local directory or an HTTP(S) URL.
+    '''
+    if http.is_url(location):
+        return HttpBox(name, location, timeout)
+    return Box(name, location, timeout)
 
 
 class Environment:
     """
     I am responsible for storing/retrieving user specific data.
 
-    Currently includes just the list of boxes and their definitions.
+    Currently includes the list of boxes and their definitions,
+    and the ledger of already verified archives next to it.
     """
 
     def __init__(self, filename):
@@ -36,22 +49,30 @@ class Environment:
         with open(self.filename, 'w') as f:
             persistence.dump(self._content, f)
 
+    def get_verification_ledger(self):
+        return VerificationLedger(
+            os.path.join(os.path.dirname(os.path.abspath(self.filename)), 'verified.json'))
+
     def get_boxes(self):
         def box(box_spec):
-            return Box(
+            return make_box(
                 box_spec.get(BOX_NAME),
-                box_spec.get(BOX_LOCATION))
+                box_spec.get(BOX_LOCATION),
+                box_spec.get(BOX_TIMEOUT))
         return [box(spec) for spec in self._content.get(ENV_BOXES, ())]
 
     def set_boxes(self, boxes):
-        self._content[ENV_BOXES] = [
-            {
+        def box_spec(box):
+            spec = {
                 BOX_NAME: box.name,
                 BOX_LOCATION: box.location
             }
-            for box in boxes]
+            if box.timeout is not None:
+                spec[BOX_TIMEOUT] = box.timeout
+            return spec
+        self._content[ENV_BOXES] = [box_spec(box) for box in boxes]
 
-    def add_box(self, name, directory):
+    def add_box(self, name, directory, timeout=None):
         boxes = self.get_boxes()
         # check unique box
         for box in boxes:
@@ -61,7 +82,7 @@ class Environment:
                 raise ValueError(
                     f'Box with location {box.location} already exists')
 
-        self.set_boxes(boxes + [Box(name, directory)])
+        self.set_boxes(boxes + [make_box(name, directory, timeout)])
 
     def forget_box(self, name):
         self.set_boxes(
@@ -6,13 +6,13 @@ from .cmdparse import Command
 from . import arg_metavar
 from . import arg_help
 from .common import (
-    OPTIONAL_WORKSPACE, OPTIONAL_ENV,
+    OPTIONAL_WORKSPACE, OPTIONAL_ENV, VERIFICATION,
     DefaultArgSentinel, assert_valid_workspace,
-    verify_with_feedback,
+    Verifier, verifier,
     die, warning
 )
 from .common import BEAD_REF_BASE_defaulting_to, BEAD_OFFSET, BEAD_TIME, resolve_bead, TIME_LATEST
-from bead.box import UnionBox
+from .common import get_unionbox
 from bead.meta import BeadName
 import bead.spec as bead_spec
 from bead.workspace import Workspace
@@ -55,6 +55,7 @@ class CmdAdd(Command):
         arg(BEAD_TIME)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         input_nick = args.input_nick
@@ -73,7 +74,8 @@ class CmdAdd(Command):
         except LookupError:
             die(f'Not a known bead name: {bead_ref_base}')
 
-        _check_load_with_feedback(workspace, args.input_nick, bead)
+        _check_load_with_feedback(
+            workspace, args.input_nick, bead, verifier(args, env))
 
 
 class CmdMap(Command):
@@ -132,6 +134,7 @@ class CmdUpdate(Command):
         arg(BEAD_OFFSET)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         if args.input_nick is ALL_INPUTS:
@@ -144,7 +147,7 @@ class CmdUpdate(Command):
         assert not args.bead_offset, "--next, --prev can not be specified when updating all inputs"
         workspace = get_workspace(args)
         env = args.get_env()
-        unionbox = UnionBox(env.get_boxes())
+        unionbox = get_unionbox(env)
         for input in workspace.inputs:
             bead_name = workspace.get_input_bead_name(input.name)
             try:
@@ -160,7 +163,7 @@ class CmdUpdate(Command):
                 else:
                     warning(f'Could not find bead for "{input.name}" with name "{bead_name}"')
             else:
-                _update_input(workspace, input, bead)
+                _update_input(workspace, input, bead, verifier(args, env))
         print('All inputs are up to date.')
 
     def update_one_input(self, args):
@@ -174,7 +177,7 @@ class CmdUpdate(Command):
                 ' - did you want to add it as a new one?')
         if bead_ref_base is SAME_BEAD_NEWEST_VERSION:
             def get_context(time):
-                unionbox = UnionBox(env.get_boxes())
+                unionbox = get_unionbox(env)
                 bead_name = workspace.get_input_bead_name(input.name)
                 try:
                     return unionbox.get_context(
@@ -200,12 +203,12 @@ class CmdUpdate(Command):
             assert args.bead_offset == 0
             bead = resolve_bead(env, bead_ref_base, args.bead_time)
         if bead:
-            _update_input(workspace, input, bead)
+            _update_input(workspace, input, bead, verifier(args, env))
         else:
             die('Can not find matching bead')
 
 
-def _update_input(workspace, input, bead):
+def _update_input(workspace, input, bead, verify):
     if workspace.is_loaded(input.name) and input.content_id == bead.content_id:
         assert input.kind == bead.kind
         assert input.freeze_time == bead.freeze_time
@@ -215,7 +218,7 @@ def _update_input(workspace, input, bead):
     else:
         if input.kind != bead.kind:
             warning(f'Updating input "{input.name}" with a bead of different kind')
-        _check_load_with_feedback(workspace, input.name, bead)
+        _check_load_with_feedback(workspace, input.name, bead, verify)
 
 
 class CmdLoad(Command):
@@ -227,46 +230,47 @@ class CmdLoad(Command):
         arg(OPTIONAL_INPUT_NICK)
         arg(OPTIONAL_WORKSPACE)
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         input_nick = args.input_nick
         workspace = get_workspace(args)
         env = args.get_env()
+        verify = verifier(args, env)
         if input_nick is ALL_INPUTS:
             inputs = workspace.inputs
             if inputs:
                 for input in inputs:
-                    _load(env, workspace, input)
+                    _load(env, workspace, input, verify)
             else:
                 warning('No inputs defined to load.')
         else:
             if not workspace.has_input(input_nick):
                 die(f'No input with name {input_nick}')
-            _load(env, workspace, workspace.get_input(input_nick))
+            _load(env, workspace, workspace.get_input(input_nick), verify)
 
 
-def _load(env, workspace, input):
+def _load(env, workspace, input, verify):
     assert input is not None
     if not workspace.is_loaded(input.name):
         name = workspace.get_input_bead_name(input.name)
         content_id = input.content_id
-        bead = None
-        for box in env.get_boxes():
-            bead = box.find_bead(name, content_id)
-            if bead:
-                break
+        bead = get_unionbox(env).find_bead(name, content_id)
         if bead is None:
             warning(
                 f'Could not find archive named "{name}" for input "{input.name}" - not loaded!')
             return
-        _check_load_with_feedback(workspace, input.name, bead)
+        _check_load_with_feedback(workspace, input.name, bead, verify)
     else:
         print(f'"{input.name}" is already loaded - skipping')
 
 
-def _check_load_with_feedback(workspace: Workspace, input_nick, bead):
+def _check_load_with_feedback(workspace: Workspace, input_nick, bead, verify: Verifier):
+    if verify.needs_full_verification(bead):
+        _verified_load_with_feedback(workspace, input_nick, bead, verify)
+        return
     try:
-        verify_with_feedback(bead)
+        verify(bead)
     except InvalidArchive:
         warning(f'Bead for {input_nick} is found but damaged - not loading.')
     else:
@@ -279,6 +283,23 @@ def _check_load_with_feedback(workspace: Workspace, input_nick, bead):
         print(' Done')
 
 
+def _verified_load_with_feedback(workspace: Workspace, input_nick, bead, verify: Verifier):
+    # the archive is read only once: verified while its data is extracted
+    print(
+        f'Verifying archive {bead.archive_filename} while loading its data to {input_nick} ...',
+        end='', flush=True)
+    snapshot = verify.ledger.snapshot(bead)
+    try:
+        workspace.load(input_nick, bead, validate=True)
+    except InvalidArchive:
+        print(' DAMAGED!', flush=True)
+        warning(f'Bead for {input_nick} is found but damaged - not loading.')
+    else:
+        verify.ledger.record(bead, snapshot)
+        workspace.set_input_bead_name(input_nick, bead.name)
+        print(' Done')
+
+
 class CmdUnload(Command):
     '''
     Remove input data.
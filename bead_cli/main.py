@@ -124,7 +124,35 @@ def make_argument_parser(defaults):
 
             'rewire',
             box.CmdRewire,
-            'Remap inputs.'))
+            'Remap inputs.',
+
+            'xmeta',
+            box.CmdRefreshXmeta,
+            'Create missing and regenerate stale .xmeta files in boxes.',
+
+            'invalid',
+            box.CmdInvalid,
+            'List archives that can not be loaded.',
+
+            'reshard',
+            box.CmdReshard,
+            'Change the directory layout of a box.',
+
+            'storage',
+            box.CmdStorage,
+            'Change the storage mode of a box.',
+
+            'sync',
+            box.CmdSync,
+            'Copy beads missing from a box from another box.',
+
+            'dedupe',
+            box.CmdDedupe,
+            'Replace identical archives by hardlinks.',
+
+            'compact',
+            box.CmdCompact,
+            'Repack old archives with stronger compression.'))
 
     return parser
 
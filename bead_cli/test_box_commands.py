@@ -1,7 +1,7 @@
 from glob import glob
 import os
 
-from bead.test import TestCase
+from bead.test import TestCase, HttpServer, setenv
 
 from .test_robot import Robot
 
@@ -97,6 +97,117 @@ class Test_box_commands(TestCase):
         assert 'dir1' in robot.stdout
         assert 'dir2' in robot.stdout
 
+    def test_add_with_timeout(self, robot, dir1):
+        robot.cli('box', 'add', '--timeout', '2.5', 'name1', 'dir1')
+
+        robot.cli('box', 'list')
+        assert 'timeout: 2.5s' in robot.stdout
+        with robot.environment as env:
+            assert 2.5 == env.get_box('name1').timeout
+
+    def test_invalid_lists_broken_archives(self, robot, dir1):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.write_file('dir1/broken_20160704T000000000000+0200.zip', 'partial copy')
+
+        robot.cli('box', 'invalid')
+        assert 'broken_20160704T000000000000+0200.zip' in robot.stdout
+
+    def test_reshard(self, robot, dir1):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.cli('save')
+        robot.cd('..')
+
+        robot.cli('box', 'reshard', 'name1')
+
+        assert 'by-name' in robot.stdout
+        assert glob(robot.cwd / 'dir1' / 'bead' / 'bead_*.zip')
+        robot.cli('develop', 'bead', 'bead2')
+        assert os.path.isdir(robot.cwd / 'bead2')
+
+    def test_chunked_storage(self, robot, dir1):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.cli('box', 'storage', 'name1', 'chunked')
+        assert 'chunked' in robot.stdout
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('README', 'chunked bead')
+        robot.cli('save')
+        robot.cd('..')
+
+        robot.cli('develop', 'bead', 'developed')
+
+        assert 'chunked bead' == robot.read_file('developed/README')
+
+    def test_develop_from_http_box(self, robot, dir1):
+        robot.cli('box', 'add', 'local', 'dir1')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('README', 'remote bead')
+        robot.cli('save')
+        robot.cd('..')
+        robot.cli('box', 'forget', 'local')
+        server = self.useFixture(HttpServer(robot.cwd / 'dir1'))
+
+        robot.cli('box', 'add', 'remote', server.url)
+        robot.cli('develop', 'bead', 'developed')
+
+        assert 'remote bead' == robot.read_file('developed/README')
+        robot.cd('developed')
+        self.assertRaises(SystemExit, robot.cli, 'save', 'remote')
+        assert 'read only' in robot.stderr
+
+    def test_sync(self, robot, dir1, dir2):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.cli('box', 'add', 'name2', 'dir2')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.cli('save', 'name1')
+        robot.cd('..')
+
+        robot.cli('box', 'sync', 'name1', 'name2')
+        assert '1 archives' in robot.stdout
+        assert glob(robot.cwd / 'dir2' / 'bead_*.zip')
+
+        robot.cli('box', 'sync', 'name1', 'name2')
+        assert '0 archives' in robot.stdout
+
+    def test_dedupe(self, robot, dir1, dir2):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.cli('box', 'add', 'name2', 'dir2')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.cli('save', 'name1')
+        robot.cd('..')
+        robot.cli('box', 'sync', 'name1', 'name2')
+
+        robot.cli('box', 'dedupe', '--dry-run')
+        assert '1 duplicates' in robot.stdout
+        robot.cli('box', 'dedupe')
+        assert '1 duplicates linked' in robot.stdout
+
+        archive1, = glob(robot.cwd / 'dir1' / 'bead_*.zip')
+        archive2, = glob(robot.cwd / 'dir2' / 'bead_*.zip')
+        assert os.path.samefile(archive1, archive2)
+
+    def test_compact(self, robot, dir1):
+        robot.cli('box', 'add', 'name1', 'dir1')
+        robot.cli('new', 'bead')
+        robot.cd('bead')
+        robot.write_file('data', 'compressible data\n' * 10000)
+        with setenv('BEAD_ZIP_COMPRESSION', 'stored'):
+            robot.cli('save')
+            robot.cli('save')
+        robot.cd('..')
+
+        robot.cli('box', 'compact', '-j', '1', '--method', 'lzma')
+
+        assert '1 archives' in robot.stdout
+        assert 'compacted: 1' in robot.stdout
+        robot.cli('develop', 'bead', 'developed')
+        assert 'compressible data\n' * 10000 == robot.read_file('developed/data')
+
     def test_add_with_same_name_fails(self, robot, dir1, dir2):
         robot.cli('box', 'add', 'name', 'dir1')
         assert 'ERROR' not in robot.stdout
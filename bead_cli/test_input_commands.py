@@ -1,4 +1,4 @@
-from bead.test import TestCase
+from bead.test import TestCase, setenv
 
 import os
 from bead.workspace import Workspace
@@ -124,6 +124,46 @@ class Test_input_commands(TestCase, fixtures.RobotAndBeads):
         self.assert_loaded(robot, 'intelligence', bead_a)
         assert 'WARNING' in robot.stderr
 
+    def test_verified_bead_is_not_verified_again(self, robot, bead_a):
+        robot.cli('develop', bead_a)
+        assert 'verified earlier' not in robot.stdout
+        robot.cd(bead_a)
+
+        robot.cli('input', 'add', 'input1', bead_a)
+        assert 'verified earlier' in robot.stdout
+
+        robot.cli('input', 'add', 'input2', bead_a, '--reverify')
+        assert 'verified earlier' not in robot.stdout
+
+    def test_verification_mode(self, robot, bead_a):
+        robot.cli('develop', bead_a)
+        robot.cd(bead_a)
+        robot.cli('input', 'add', 'input1', bead_a, '--verify', 'crc')
+
+        assert '(crc)' in robot.stdout
+        # full verification by develop covers it
+        assert 'verified earlier' in robot.stdout
+        self.assert_loaded(robot, 'input1', bead_a)
+
+    def test_invalid_verification_mode_in_environment(self, robot, bead_a):
+        robot.cli('develop', bead_a)
+        robot.cd(bead_a)
+        with setenv('BEAD_VERIFY', 'bogus'):
+            self.assertRaises(SystemExit, robot.cli, 'input', 'add', 'input1', bead_a)
+
+        assert 'BEAD_VERIFY' in robot.stderr
+
+    def test_invalid_verification_mode_does_not_break_other_commands(self, robot, bead_a):
+        robot.cli('develop', bead_a)
+        robot.cd(bead_a)
+        with setenv('BEAD_VERIFY', 'bogus'):
+            robot.cli('status')
+            robot.cli('box', 'list')
+            robot.cli('input', 'add', 'input1', bead_a, '--verify', 'full')
+
+        assert 'BEAD_VERIFY' not in robot.stderr
+        self.assert_loaded(robot, 'input1', bead_a)
+
     def test_update_to_next_version(self, robot, bead_with_history):
         robot.cli('new', 'test-workspace')
         robot.cd('test-workspace')
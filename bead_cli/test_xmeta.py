@@ -1,4 +1,8 @@
+import os
+
 from bead.archive import Archive
+from bead import layouts
+from bead.tech import persistence
 from bead.tech.fs import read_file, write_file
 from bead.test import TestCase
 
@@ -33,3 +37,52 @@ class Test_xmeta(TestCase, fixtures.RobotAndBeads):
 
         xmeta_archive = Archive(archive_filename)
         assert archive_attributes == get_meta(xmeta_archive)
+
+
+class Test_box_xmeta(TestCase, fixtures.RobotAndBeads):
+
+    # fixtures
+    def archives(self, robot, bead_with_inputs, beads):
+        return list(beads.values())
+
+    # tests
+    def test_creates_missing_xmeta_files(self, robot, archives):
+        robot.cli('box', 'xmeta', '--jobs', '2')
+
+        assert 'created: 3' in robot.stdout
+        for archive in archives:
+            assert os.path.exists(archive.cache_path)
+
+    def test_up_to_date_xmeta_files_are_kept(self, robot, archives):
+        robot.cli('box', 'xmeta', 'box', '-j', '1')
+        robot.cli('box', 'xmeta', 'box', '-j', '1')
+
+        assert 'up to date: 3' in robot.stdout
+
+    def test_disagreeing_xmeta_is_regenerated_keeping_input_map(self, robot, archives):
+        robot.cli('box', 'xmeta', '-j', '1')
+        archive = archives[0]
+        cache = persistence.loads(read_file(archive.cache_path))
+        cache['kind'] = 'a wrong kind'
+        cache['input_map'] = {'rewired': 'input'}
+        write_file(archive.cache_path, persistence.dumps(cache))
+
+        robot.cli('box', 'xmeta', '-j', '1')
+
+        assert 'regenerated: 1' in robot.stdout
+        regenerated = Archive(archive.archive_filename)
+        assert archive.kind == regenerated.kind
+        assert {'rewired': 'input'} == regenerated.input_map
+
+    def test_invalid_archives_are_reported(self, robot, box, archives):
+        write_file(box.directory / 'broken_20150901T151015000001+0200.zip', 'not a zip')
+
+        robot.cli('box', 'xmeta', '-j', '1')
+
+        assert 'invalid archive: 1' in robot.stdout
+
+    def test_catalog_is_written_on_request(self, robot, box, archives):
+        robot.cli('box', 'xmeta', '-j', '1', '--catalog')
+
+        assert 'catalog written' in robot.stdout
+        assert os.path.isfile(box.directory / layouts.Box.CATALOG)
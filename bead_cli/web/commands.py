@@ -8,7 +8,7 @@ import webbrowser
 from bead import tech
 from bead.box import UnionBox
 
-from ..common import OPTIONAL_ENV, die
+from ..common import OPTIONAL_ENV, die, warn_box_timeout
 from ..cmdparse import Command
 from .io import read_beads, write_beads
 from .sketch import Sketch
@@ -290,14 +290,22 @@ SUBCOMMANDS = {
 }
 
 
-def load_all_beads(boxes):
+def load_all_beads(boxes, max_workers=None, ordered=True):
+    '''
+    Load metadata of all beads in boxes.
+
+    New or changed archives are opened by max_workers threads per box,
+    see Box.all_beads.
+    '''
     columns = int(os.environ.get('COLUMNS', 80))
     all_beads = []
     import time
     load_start = time.perf_counter()
     # This UnionBox.all_beads is the meat, the rest is just user feedback for big/slow
     # environments
-    for n, bead in enumerate(UnionBox(boxes).all_beads()):
+    unionbox = UnionBox(boxes, on_timeout=warn_box_timeout)
+    beads = unionbox.all_beads(max_workers=max_workers, ordered=ordered)
+    for n, bead in enumerate(beads):
         load_end = time.perf_counter()
 
         msg = f"\rLoaded bead {n+1} ({bead.archive_filename})"[:columns]
@@ -10,9 +10,9 @@ import bead.spec as bead_spec
 from .cmdparse import Command
 from .common import assert_valid_workspace, die, warning
 from .common import DefaultArgSentinel
-from .common import OPTIONAL_WORKSPACE, OPTIONAL_ENV
+from .common import OPTIONAL_WORKSPACE, OPTIONAL_ENV, VERIFICATION
 from .common import BEAD_REF_BASE, BEAD_TIME, resolve_bead
-from .common import verify_with_feedback
+from .common import verifier
 from . import arg_metavar
 from . import arg_help
 
@@ -107,6 +107,8 @@ class CmdSave(Command):
             box = env.get_box(box_name)
             if box is None:
                 die(f'Unknown box: {box_name}')
+        if not box.is_local:
+            die(f'Box {box.name} at {box.location} is read only')
         location = box.store(workspace, timestamp())
         print(f'Successfully stored bead at {location}.')
 
@@ -130,6 +132,7 @@ class CmdDevelop(Command):
             default=False, action='store_true',
             help='Extract output data as well (normally it is not needed!).')
         arg(OPTIONAL_ENV)
+        arg(VERIFICATION)
 
     def run(self, args):
         extract_output = args.extract_output
@@ -139,7 +142,7 @@ class CmdDevelop(Command):
         except LookupError:
             die('Bead not found!')
         try:
-            verify_with_feedback(bead)
+            verifier(args, env)(bead)
         except InvalidArchive:
             die('Bead is damaged')
         if args.workspace is DERIVE_FROM_BEAD_NAME: